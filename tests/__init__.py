@@ -123,6 +123,16 @@ def require_fixed_html5(reason='requires fixed HTML5 support '
     return unittest.skipUnless(support, reason)
 
 
+def require_numpy(reason='requires NumPy'):
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        support = False
+    else:
+        support = True
+    return unittest.skipUnless(support, reason)
+
+
 @contextmanager
 def test_file_cleanup(*paths):
     """Call os.remove() afterwards for given paths.
@@ -1832,6 +1832,10 @@ class TestConfig(TestActions):
                             'tree_dir': WSB_DIR + '/tree',
                             'index': WSB_DIR + '/tree/map.html',
                             'no_tree': False,
+                            'tree_journal': False,
+                            'tree_snapshot': False,
+                            'compact_meta': False,
+                            'fulltext_index': False,
                             'new_at_top': False,
                             'inclusive_frames': True,
                             'static_index': False,
@@ -1867,6 +1871,7 @@ class TestConfig(TestActions):
                         {'text': 'comment:', 'value': 'comment:'},
                         {'text': 'content:', 'value': 'content:'},
                         {'text': 'source:', 'value': 'source:'},
+                        {'text': 'site:', 'value': 'site:'},
                         {'text': 'icon:', 'value': 'icon:'},
                         {'text': 'type:', 'value': 'type:'},
                         {'text': 'create:', 'value': 'create:'},
@@ -5541,7 +5546,7 @@ class TestCache(TestActions):
             })
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 book_items={
                     '': ['_item1', '_item2', 'item1', 'item2'],
                     'book1': ['book1_item1', 'book1_item2', 'item1', 'item2'],
@@ -5579,7 +5584,7 @@ class TestCache(TestActions):
             })
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 book_items={
                     '': ['_item1', '_item2', 'item1', 'item2'],
                     'book1': ['book1_item1', 'book1_item2', 'item1', 'item2'],
@@ -5616,7 +5621,7 @@ class TestCache(TestActions):
             }, buffered=True)
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 book_items={
                     '': ['_item1', '_item2', 'item1', 'item2'],
                     'book1': ['book1_item1', 'book1_item2', 'item1', 'item2'],
@@ -5688,7 +5693,7 @@ class TestCheck(TestActions):
             })
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 book_ids=['', 'id1'],
                 lock='',
                 backup=False,
@@ -5733,7 +5738,7 @@ class TestCheck(TestActions):
             })
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 book_ids=['', 'id1'],
                 lock='',
                 backup=False,
@@ -5777,7 +5782,7 @@ class TestCheck(TestActions):
             }, buffered=True)
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 book_ids=['', 'id1'],
                 lock='',
                 backup=False,
@@ -5935,7 +5940,7 @@ tree_dir = tree
             })
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config), mock.ANY,
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache), mock.ANY,
                 book_id='',
                 items=items,
                 scheme=wsb_app.wsb_exporter.SCHEME_ROOT_INDEXES,
@@ -5975,7 +5980,7 @@ tree_dir = tree
             })
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config), mock.ANY,
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache), mock.ANY,
                 book_id='b2',
                 items=items,
                 scheme=wsb_app.wsb_exporter.SCHEME_ROOT_INDEXES,
@@ -6073,7 +6078,7 @@ tree_dir = tree
             })
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 [os.path.join(wsb_app.host.root, 'scrapbook1', 'tree', 'exports', '11.wsba')],
                 book_id='',
                 target_id=None,
@@ -6103,7 +6108,7 @@ tree_dir = tree
             })
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 [
                     os.path.join(wsb_app.host.root, 'scrapbook2', 'tree', 'exports', '21.wsba'),
                     os.path.join(wsb_app.host.root, 'scrapbook2', 'tree', 'exports', '22.wsba'),
@@ -6226,7 +6231,7 @@ no_tree = true
             })
 
             mock_cls.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 [query],
                 None,
                 lock='',
@@ -6258,7 +6263,7 @@ no_tree = true
             })
 
             mock_cls.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 [query],
                 None,
                 lock='',
@@ -6300,7 +6305,7 @@ no_tree = true
             })
 
             mock_cls.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 [query1, query2],
                 None,
                 lock='',
@@ -6439,7 +6444,7 @@ no_tree = false
             })
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 query='book: book:b2 ipsum',
                 lock='',
                 context={
@@ -6449,6 +6454,11 @@ no_tree = false
                     'comment': 200,
                     'source': 100,
                 },
+                cache=wsb_app.host.search_cache,
+                executor=None,
+                offset=0,
+                size=-1,
+                explain={},
             )
             self.assertEqual(r.status_code, 200)
             self.assertEqual(r.headers['Content-Type'], 'text/event-stream; charset=utf-8')
@@ -6515,7 +6525,7 @@ no_tree = false
             })
 
             mock_func.assert_called_once_with(
-                (wsb_app.host.root, wsb_app.host.config),
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
                 query='book: book:b2 ipsum',
                 lock='',
                 context={
@@ -6525,6 +6535,11 @@ no_tree = false
                     'comment': 200,
                     'source': 100,
                 },
+                cache=wsb_app.host.search_cache,
+                executor=None,
+                offset=0,
+                size=-1,
+                explain={},
             )
             self.assertEqual(r.status_code, 200)
             self.assertEqual(r.headers['Content-Type'], 'application/json')
@@ -6564,6 +6579,475 @@ no_tree = false
             c.post('/', data={'a': 'search', 'f': 'json', 'q': 'sort:unknown'})
             mock_abort.assert_called_once_with(400, 'Invalid sort: unknown')
 
+    def test_paging_json(self):
+        with self.app.test_client() as c:
+            r = c.post('/', data={'a': 'search', 'f': 'json', 'q': 'ipsum', 'size': 1})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json, {
+                'data': {
+                    '': [
+                        {'id': '20000101000000002', 'file': 'index.html', 'context': mock.ANY},
+                    ],
+                },
+                'meta': {'next': 1},
+            })
+
+            r = c.post('/', data={'a': 'search', 'f': 'json', 'q': 'ipsum', 'size': 1, 'offset': 1})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json, {
+                'data': {
+                    'b2': [
+                        {'id': '20200101000000001', 'file': 'index.html', 'context': mock.ANY},
+                    ],
+                },
+                'meta': {'next': None},
+            })
+
+            r = c.post('/', data={'a': 'search', 'f': 'json', 'q': 'ipsum', 'size': 1, 'offset': 2})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json, {
+                'data': {},
+                'meta': {'next': None},
+            })
+
+    @mock.patch('webscrapbook.app.wsb_search.search', wraps=wsb_app.wsb_search.search)
+    @mock.patch('webscrapbook.app.abort', wraps=wsb_app.abort)
+    def test_paging_bad_size(self, mock_abort, mock_func):
+        """Reject a size that never advances the page."""
+        for size in (0, -2):
+            with self.subTest(size=size), self.app.test_client() as c:
+                mock_abort.reset_mock()
+                r = c.post('/', data={'a': 'search', 'f': 'json', 'q': 'ipsum', 'size': size})
+                self.assertEqual(r.status_code, 400)
+                mock_abort.assert_called_once_with(400, f'Invalid size: {size}')
+        mock_func.assert_not_called()
+
+    def test_paging_sse(self):
+        with self.app.test_client() as c:
+            r = c.get('/', query_string={'a': 'search', 'f': 'sse', 'q': 'ipsum', 'offset': 1})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(self.parse_sse_objects(r.data.decode('UTF-8')), [
+                ('message', {
+                    'type': 'info',
+                    'msg': '',
+                    'data': {
+                        'book_id': 'b2',
+                        'id': '20200101000000001',
+                        'file': 'index.html',
+                        'context': mock.ANY,
+                    },
+                }),
+                ('complete', None),
+            ])
+
+    def test_basic_ndjson(self):
+        with self.app.test_client() as c:
+            r = c.post('/', data={
+                'a': 'search', 'f': 'ndjson',
+                'q': 'book: book:b2 ipsum',
+                'fulltext': 300,
+            })
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.headers['Content-Type'], 'application/x-ndjson')
+            self.assertEqual(r.headers['Cache-Control'], 'no-store')
+            self.assertEqual([json.loads(line) for line in r.data.decode('UTF-8').splitlines()], [
+                {
+                    'data': {
+                        'book_id': '',
+                        'id': '20000101000000002',
+                        'file': 'index.html',
+                        'context': {
+                            'title': 'Item 1',
+                            'file': 'index.html',
+                            'fulltext': 'Lorem <mark class="kw0">ipsum</mark> dolor sit amet, consectetur adipiscing elit.',
+                        },
+                    },
+                },
+                {
+                    'data': {
+                        'book_id': 'b2',
+                        'id': '20200101000000001',
+                        'file': 'index.html',
+                        'context': {
+                            'title': 'item 1',
+                            'file': 'index.html',
+                            'fulltext': 'Lorem <mark class="kw0">ipsum</mark> dolor sit amet. 郹姎伅醏搋燀扤，嗍軵亍枑挔慅姇氕亍枘嵺祋巿呾。',
+                        },
+                    },
+                },
+            ])
+
+    def test_paging_ndjson(self):
+        with self.app.test_client() as c:
+            r = c.post('/', data={'a': 'search', 'f': 'ndjson', 'q': 'ipsum', 'size': 1})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual([json.loads(line) for line in r.data.decode('UTF-8').splitlines()], [
+                {
+                    'data': {
+                        'book_id': '',
+                        'id': '20000101000000002',
+                        'file': 'index.html',
+                        'context': mock.ANY,
+                    },
+                },
+                {'meta': {'next': 1}},
+            ])
+
+            r = c.post('/', data={'a': 'search', 'f': 'ndjson', 'q': 'ipsum', 'size': 5, 'offset': 1})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual([json.loads(line) for line in r.data.decode('UTF-8').splitlines()], [
+                {
+                    'data': {
+                        'book_id': 'b2',
+                        'id': '20200101000000001',
+                        'file': 'index.html',
+                        'context': mock.ANY,
+                    },
+                },
+                {'meta': {'next': None}},
+            ])
+
+    def test_explain_json(self):
+        with self.app.test_client() as c:
+            r = c.post('/', data={'a': 'search', 'f': 'json', 'q': 'explain: ipsum', 'size': 1})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json['meta'], {'next': 1, 'explain': mock.ANY})
+            self.assertEqual(set(r.json['meta']['explain']['books']), {'', 'b2'})
+
+            r = c.post('/', data={'a': 'search', 'f': 'json', 'q': 'explain: ipsum'})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json['meta'], {'explain': mock.ANY})
+            self.assertEqual(r.json['meta']['explain']['results'], 2)
+
+    def test_explain_ndjson(self):
+        with self.app.test_client() as c:
+            r = c.post('/', data={'a': 'search', 'f': 'ndjson', 'q': 'explain: ipsum'})
+            self.assertEqual(r.status_code, 200)
+            lines = [json.loads(line) for line in r.data.decode('UTF-8').splitlines()]
+            self.assertEqual(len(lines), 3)
+            self.assertEqual(lines[-1], {'meta': {'explain': mock.ANY}})
+            self.assertEqual(lines[-1]['meta']['explain']['results'], 2)
+
+    def test_bad_query_ndjson(self):
+        with self.app.test_client() as c:
+            r = c.post('/', data={'a': 'search', 'f': 'ndjson', 'q': 'sort:unknown'})
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.headers['Content-Type'], 'application/x-ndjson')
+            self.assertEqual([json.loads(line) for line in r.data.decode('UTF-8').splitlines()], [
+                {'error': {'status': 400, 'message': 'Invalid sort: unknown'}},
+            ])
+
+    def test_method_check_ndjson(self):
+        with self.app.test_client() as c:
+            r = c.get('/', query_string={'a': 'search', 'f': 'ndjson', 'q': 'ipsum'})
+            self.assertEqual(r.status_code, 405)
+            self.assertEqual(r.headers['Content-Type'], 'application/x-ndjson')
+            self.assertEqual(json.loads(r.data.decode('UTF-8')), {
+                'error': {'status': 405, 'message': mock.ANY},
+            })
+
+    def test_tree_cache(self):
+        """Tree files should be parsed only once across requests."""
+        with self.app.app_context(), self.app.test_client() as c:
+            wsb_app.host.tree_cache.clear()
+            wsb_app.host.search_cache.clear()
+
+            with mock.patch('webscrapbook.scrapbook.book.Book.load_tree_file',
+                            autospec=True, side_effect=wsb_app.wsb_host.book.Book.load_tree_file) as mock_func:
+                r = c.post('/', data={'a': 'search', 'f': 'json', 'q': 'ipsum'})
+                self.assertEqual(r.status_code, 200)
+                self.assertEqual(mock_func.call_count, 6)
+
+                r2 = c.post('/', data={'a': 'search', 'f': 'json', 'q': 'ipsum'})
+                self.assertEqual(r2.json, r.json)
+                self.assertEqual(mock_func.call_count, 6)
+
+    def test_tree_cache_no_content(self):
+        """Fulltext files should not be loaded for a search not needing the content."""
+        with self.app.app_context(), self.app.test_client() as c:
+            wsb_app.host.tree_cache.clear()
+            wsb_app.host.search_cache.clear()
+
+            with mock.patch('webscrapbook.scrapbook.book.Book.load_tree_file',
+                            autospec=True, side_effect=wsb_app.wsb_host.book.Book.load_tree_file) as mock_func:
+                r = c.post('/', data={'a': 'search', 'f': 'json', 'q': 'title:item'})
+                self.assertEqual(r.status_code, 200)
+                self.assertEqual(len(r.json['data']), 2)
+                self.assertEqual(
+                    sorted(os.path.basename(call.args[1]) for call in mock_func.call_args_list),
+                    ['meta.js', 'meta.js', 'toc.js', 'toc.js'],
+                )
+
+    def test_search_cache(self):
+        """Search results should be reused across requests."""
+        with self.app.app_context(), self.app.test_client() as c:
+            wsb_app.host.search_cache.clear()
+
+            with mock.patch('webscrapbook.scrapbook.search.SearchEngine.search',
+                            autospec=True, wraps=wsb_app.wsb_search.SearchEngine.search) as mock_func:
+                r = c.post('/', data={'a': 'search', 'f': 'json', 'q': 'ipsum'})
+                self.assertEqual(r.status_code, 200)
+                self.assertEqual(mock_func.call_count, 1)
+
+                r2 = c.post('/', data={'a': 'search', 'f': 'json', 'q': 'ipsum'})
+                self.assertEqual(r2.json, r.json)
+                self.assertEqual(mock_func.call_count, 1)
+
+
+class TestCompactMeta(TestActions):
+    """Actions should work for books loading meta as CompactMetaData."""
+    @classmethod
+    def setUpClass(cls):
+        cls.maxDiff = 8192
+
+        # init an app for the class
+        cls.root = tempfile.mkdtemp(dir=tmpdir)
+        cls.init_host(cls.root, config="""\
+[book ""]
+name = scrapbook1
+top_dir = scrapbook1
+data_dir = data
+tree_dir = tree
+compact_meta = true
+""")
+
+        cls.app = wsb_app.make_app(cls.root)
+        cls.app.testing = True
+
+    def setUp(self):
+        book = self.init_book(
+            self.root,
+            book_id='',
+            meta={
+                '20000101000000001': {
+                    'type': 'folder',
+                    'title': 'Folder 1',
+                },
+                '20000101000000002': {
+                    'title': 'Item 1',
+                    'index': '20000101000000002.htm',
+                    'create': '20000101000000002',
+                },
+            },
+            toc={
+                'root': [
+                    '20000101000000001',
+                ],
+                '20000101000000001': [
+                    '20000101000000002',
+                ],
+            },
+        )
+        os.makedirs(book.data_dir, exist_ok=True)
+        with open(os.path.join(book.data_dir, '20000101000000002.htm'), 'w', encoding='UTF-8') as fh:
+            fh.write('Lorem ipsum dolor sit amet.')
+
+    def tearDown(self):
+        try:
+            shutil.rmtree(os.path.join(self.root, WSB_DIR, 'server'))
+        except FileNotFoundError:
+            pass
+        try:
+            shutil.rmtree(os.path.join(self.root, WSB_DIR, 'locks'))
+        except FileNotFoundError:
+            pass
+        try:
+            shutil.rmtree(os.path.join(self.root, 'scrapbook1'))
+        except FileNotFoundError:
+            pass
+
+    def test_query_get_item(self):
+        with self.app.app_context(), self.app.test_client() as c:
+            r = c.post('/', data={
+                'token': token(c),
+                'a': 'query',
+                'f': 'json',
+                'q': json.dumps({
+                    'book': '',
+                    'cmd': 'get_item',
+                    'args': ['20000101000000002', True],
+                }),
+                'details': 1,
+            })
+
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json, {
+                'data': [{
+                    'meta': {
+                        'title': 'Item 1',
+                        'index': '20000101000000002.htm',
+                        'create': '20000101000000002',
+                    },
+                    'parents': [['20000101000000001', 0]],
+                }],
+            })
+
+    def test_query_update_item(self):
+        with self.app.app_context(), self.app.test_client() as c:
+            r = c.post('/', data={
+                'token': token(c),
+                'a': 'query',
+                'f': 'json',
+                'q': json.dumps({
+                    'book': '',
+                    'cmd': 'update_item',
+                    'kwargs': {
+                        'item': {
+                            'id': '20000101000000001',
+                            'title': 'Folder 1 modified',
+                        },
+                        'auto_modify': False,
+                    },
+                }),
+                'details': 1,
+            })
+
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json, {
+                'data': [{
+                    '20000101000000001': {
+                        'type': 'folder',
+                        'title': 'Folder 1 modified',
+                    },
+                }],
+            })
+
+    def test_search(self):
+        with self.app.app_context(), self.app.test_client() as c:
+            r = c.post('/', data={
+                'a': 'search', 'f': 'json',
+                'q': 'title:item sort:title',
+            })
+
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json, {
+                'data': {
+                    '': [{
+                        'id': '20000101000000002',
+                        'file': '',
+                        'context': {
+                            'title': '<mark class="kw0">Item</mark> 1',
+                            'file': '',
+                        },
+                    }],
+                },
+            })
+
+    @mock.patch('webscrapbook.scrapbook.exporter._id_now', lambda: '20230101000000001')
+    def test_export(self):
+        with self.app.app_context(), self.app.test_client() as c:
+            r = c.post('/', data={
+                'a': 'export', 'token': token(c),
+                'items': json.dumps([['20000101000000001', 0]]),
+            })
+
+            self.assertEqual(r.status_code, 200)
+            with zipfile.ZipFile(io.BytesIO(r.data)) as zh:
+                self.assertEqual(json.loads(zh.read('20230101000000001/meta.json').decode('UTF-8')), {
+                    'id': '20000101000000002',
+                    'title': 'Item 1',
+                    'index': '20000101000000002.htm',
+                    'create': '20000101000000002',
+                })
+                self.assertEqual(
+                    zh.read('20230101000000001/data/20000101000000002.htm').decode('UTF-8'),
+                    'Lorem ipsum dolor sit amet.',
+                )
+
+
+class TestStats(TestActions):
+    @classmethod
+    def setUpClass(cls):
+        cls.maxDiff = 8192
+
+        # init an app for the class
+        cls.root = tempfile.mkdtemp(dir=tmpdir)
+        cls.init_book(
+            cls.root,
+            meta={
+                '20000101000000001': {
+                    'type': 'folder',
+                    'title': 'Folder 1',
+                    'create': '20000101000000001',
+                },
+                '20000101000000002': {
+                    'type': '',
+                    'title': 'Item 1',
+                    'create': '20000201000000002',
+                    'modify': '20000201000000002',
+                    'source': 'https://example.com/',
+                    'charset': 'UTF-8',
+                    'marked': True,
+                },
+            },
+        )
+
+        cls.app = wsb_app.make_app(cls.root)
+        cls.app.testing = True
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        try:
+            shutil.rmtree(os.path.join(self.root, WSB_DIR, 'locks'))
+        except FileNotFoundError:
+            pass
+
+    @mock.patch('webscrapbook.app.abort', wraps=wsb_app.abort)
+    def test_format_check(self, mock_abort):
+        """Require format"""
+        with self.app.test_client() as c:
+            c.post('/', data={'a': 'stats'})
+            mock_abort.assert_called_once_with(400, 'Action not supported.')
+
+    def test_method_check(self):
+        """Require POST."""
+        with self.app.test_client() as c:
+            r = c.get('/', query_string={'a': 'stats', 'f': 'json'})
+            self.assertEqual(r.status_code, 405)
+
+    @mock.patch('webscrapbook.app.wsb_search.stats', wraps=wsb_app.wsb_search.stats)
+    def test_basic(self, mock_func):
+        with self.app.app_context(), self.app.test_client() as c:
+            r = c.post('/', data={'a': 'stats', 'f': 'json', 'lock': ''})
+
+            mock_func.assert_called_once_with(
+                (wsb_app.host.root, wsb_app.host.config, wsb_app.host.tree_cache),
+                book_id='',
+                lock='',
+            )
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.headers['Cache-Control'], 'no-store')
+            self.assertEqual(r.json, {
+                'data': {
+                    'count': 2,
+                    'marked': 1,
+                    'locked': 0,
+                    'location': 0,
+                    'type': {'': 1, 'folder': 1},
+                    'charset': {'': 1, 'UTF-8': 1},
+                    'source_host': {'': 1, 'example.com': 1},
+                    'create': {'200001': 1, '200002': 1},
+                    'modify': {'200002': 1},
+                },
+            })
+
+    @mock.patch('webscrapbook.app.abort', wraps=wsb_app.abort)
+    def test_book_nonexist(self, mock_abort):
+        with self.app.test_client() as c:
+            c.post('/', data={'a': 'stats', 'f': 'json', 'book': 'nonexist'})
+            mock_abort.assert_called_once_with(404, 'Book does not exist.')
+
+    @mock.patch('webscrapbook.app.abort', wraps=wsb_app.abort)
+    @mock.patch('webscrapbook.app.wsb_search.stats', side_effect=KeyError('type'))
+    def test_error(self, mock_func, mock_abort):
+        """Other errors should not be taken as a nonexistent book."""
+        with self.app.test_client() as c:
+            with self.assertRaises(KeyError):
+                c.post('/', data={'a': 'stats', 'f': 'json'})
+            mock_abort.assert_not_called()
+
 
 class TestUnknown(TestActions):
     @mock.patch('webscrapbook.app.abort', wraps=wsb_app.abort)
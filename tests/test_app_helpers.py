@@ -4,6 +4,7 @@ import shutil
 import tempfile
 import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 
 from flask import current_app, request
@@ -666,6 +667,36 @@ class TestWebHost(Test):
                 self.assertFalse(wsbapp.WebHost.check_permission('read', action))
                 self.assertTrue(wsbapp.WebHost.check_permission('all', action))
 
+    def test_search_executor(self):
+        handler = wsbapp.WebHost(self.root)
+        self.assertIsNone(handler.search_executor)
+
+        handler = wsbapp.WebHost(self.root)
+        handler.config['app']['search_jobs'] = 2
+        with mock.patch('webscrapbook.scrapbook.search.create_executor', autospec=True) as mocked, \
+             mock.patch('webscrapbook.app.atexit.register') as mock_register:
+            self.assertIs(handler.search_executor, mocked.return_value)
+            self.assertIs(handler.search_executor, mocked.return_value)
+        mocked.assert_called_once_with(handler, 2, wsbapp.WebHost.TREE_CACHE_MAX_SIZE)
+        mock_register.assert_called_once_with(mocked.return_value.shutdown)
+
+    def test_search_executor_concurrent(self):
+        """Should create only one pool for concurrent first searches."""
+        def create_executor(*args, **kwargs):
+            time.sleep(0.1)
+            return mock.Mock()
+
+        handler = wsbapp.WebHost(self.root)
+        handler.config['app']['search_jobs'] = 2
+        with mock.patch('webscrapbook.scrapbook.search.create_executor', side_effect=create_executor) as mocked, \
+             mock.patch('webscrapbook.app.atexit.register') as mock_register:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(lambda _: handler.search_executor, range(4)))
+        mocked.assert_called_once()
+        mock_register.assert_called_once()
+        for result in results:
+            self.assertIs(result, results[0])
+
 
 class TestFilesystemHelpers(unittest.TestCase):
     def test_file_info(self):
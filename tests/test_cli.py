@@ -550,6 +550,7 @@ class TestCache(Test):
             item_ids_list=None,
             fulltext=True,
             recreate=False,
+            jobs=None,
             static_site=False,
             static_index=None,
             rss=None,
@@ -562,6 +563,7 @@ class TestCache(Test):
             {},
             fulltext=True,
             recreate=False,
+            jobs=None,
             static_site=False,
             static_index=None,
             rss=None,
@@ -578,6 +580,7 @@ class TestCache(Test):
             '--item', 'item11', 'item12', '--item', '--item', 'item31', 'item32',
             '--no-fulltext',
             '--recreate',
+            '--jobs', '4',
             '--static-site',
             '--static-index',
             '--rss',
@@ -590,6 +593,7 @@ class TestCache(Test):
             item_ids_list=[['item11', 'item12'], [], ['item31', 'item32']],
             fulltext=False,
             recreate=True,
+            jobs=4,
             static_site=True,
             static_index=True,
             rss=True,
@@ -607,6 +611,7 @@ class TestCache(Test):
             },
             fulltext=False,
             recreate=True,
+            jobs=4,
             static_site=True,
             static_index=True,
             rss=True,
@@ -1402,6 +1407,8 @@ class TestSearch(Test):
             fulltext=None,
             comment=None,
             source=None,
+            jobs=None,
+            explain=False,
         ))
 
         mock_func.assert_called_once_with(
@@ -1414,6 +1421,8 @@ class TestSearch(Test):
                 comment=None,
                 source=None,
             ),
+            jobs=None,
+            explain={},
         )
 
     @mock.patch('webscrapbook.scrapbook.search.search', autospec=True)
@@ -1432,6 +1441,8 @@ class TestSearch(Test):
             '--fulltext', '120',
             '--comment', '100',
             '--source', '80',
+            '--jobs', '2',
+            '--explain',
         ])
 
         mock_handler.assert_called_once_with(dict(
@@ -1442,11 +1453,13 @@ class TestSearch(Test):
             fulltext=120,
             comment=100,
             source=80,
+            jobs=2,
+            explain=True,
         ))
 
         mock_func.assert_called_once_with(
             self.root,
-            'book: mc: foo bar -baz',
+            'book: mc: foo bar -baz\nexplain:',
             context={
                 'title': 50,
                 'file': 30,
@@ -1454,6 +1467,8 @@ class TestSearch(Test):
                 'comment': 100,
                 'source': 80,
             },
+            jobs=2,
+            explain={},
         )
 
     @mock.patch('sys.stderr', new_callable=io.StringIO)
@@ -1474,11 +1489,29 @@ class TestSearch(Test):
             fulltext=None,
             comment=None,
             source=None,
+            jobs=None,
+            explain=False,
         ))
 
         self.assertEqual(cm.exception.code, 1)
         self.assertEqual(mock_stderr.getvalue(), 'Error: Invalid sort: unknown\n')
 
+    @mock.patch('sys.stdout', new_callable=io.StringIO)
+    @mock.patch('sys.stdin', io.StringIO('explain: foo'))
+    def test_explain(self, mock_stdout):
+        with mock.patch('webscrapbook.scrapbook.search.search', autospec=True) as mock_func:
+            def search(root, query, explain, **kwargs):
+                explain['results'] = 0
+                yield from ()
+
+            mock_func.side_effect = search
+            cli.main([
+                '--root', self.root,
+                'search',
+            ])
+
+        self.assertEqual(mock_stdout.getvalue(), '{"explain": {"results": 0}}\n')
+
 
 class TestHelp(Test):
     def test_basic(self):
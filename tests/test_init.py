@@ -47,6 +47,7 @@ class TestClassConfig(unittest.TestCase):
             ('allowed_x_host', 0),
             ('allowed_x_port', 0),
             ('allowed_x_prefix', 0),
+            ('search_jobs', 0),
         ]))
         self.assertDictEqual(conf['server'], OrderedDict([
             ('port', 9999),
@@ -71,6 +72,10 @@ class TestClassConfig(unittest.TestCase):
                 ('tree_dir', 'tree'),
                 ('index', 'tree/map.html'),
                 ('no_tree', False),
+                ('tree_journal', False),
+                ('tree_snapshot', False),
+                ('compact_meta', False),
+                ('fulltext_index', False),
                 ('new_at_top', True),
                 ('inclusive_frames', False),
                 ('static_index', True),
@@ -84,6 +89,10 @@ class TestClassConfig(unittest.TestCase):
                 ('tree_dir', '.wsb/tree'),
                 ('index', '.wsb/tree/map.html'),
                 ('no_tree', True),
+                ('tree_journal', False),
+                ('tree_snapshot', False),
+                ('compact_meta', False),
+                ('fulltext_index', False),
                 ('new_at_top', False),
                 ('inclusive_frames', True),
                 ('static_index', False),
@@ -97,6 +106,10 @@ class TestClassConfig(unittest.TestCase):
                 ('tree_dir', 'tree'),
                 ('index', 'tree/map.html'),
                 ('no_tree', True),
+                ('tree_journal', False),
+                ('tree_snapshot', False),
+                ('compact_meta', False),
+                ('fulltext_index', False),
                 ('new_at_top', False),
                 ('inclusive_frames', True),
                 ('static_index', False),
@@ -130,6 +143,7 @@ class TestClassConfig(unittest.TestCase):
             ('allowed_x_host', 0),
             ('allowed_x_port', 0),
             ('allowed_x_prefix', 0),
+            ('search_jobs', 0),
         ]))
         with self.assertRaises(KeyError):
             conf['book']['book2']
@@ -240,6 +254,7 @@ allowed_x_proto = 1
 allowed_x_host = 0
 allowed_x_port = 0
 allowed_x_prefix = 0
+search_jobs = 0
 
 [server]
 port = 9999
@@ -263,6 +278,10 @@ data_dir = data
 tree_dir = tree
 index = tree/map.html
 no_tree = false
+tree_journal = false
+tree_snapshot = false
+compact_meta = false
+fulltext_index = false
 new_at_top = true
 inclusive_frames = false
 static_index = true
@@ -276,6 +295,10 @@ data_dir =
 tree_dir = .wsb/tree
 index = .wsb/tree/map.html
 no_tree = on
+tree_journal = false
+tree_snapshot = false
+compact_meta = false
+fulltext_index = false
 new_at_top = false
 inclusive_frames = true
 static_index = false
@@ -289,6 +312,10 @@ data_dir = data
 tree_dir = tree
 index = tree/map.html
 no_tree = on
+tree_journal = false
+tree_snapshot = false
+compact_meta = false
+fulltext_index = false
 new_at_top = false
 inclusive_frames = true
 static_index = false
@@ -324,6 +351,7 @@ permission = all
                     ('allowed_x_host', 0),
                     ('allowed_x_port', 0),
                     ('allowed_x_prefix', 0),
+                    ('search_jobs', 0),
                 ])),
                 ('server', OrderedDict([
                     ('port', 9999),
@@ -348,6 +376,10 @@ permission = all
                         ('tree_dir', 'tree'),
                         ('index', 'tree/map.html'),
                         ('no_tree', False),
+                        ('tree_journal', False),
+                        ('tree_snapshot', False),
+                        ('compact_meta', False),
+                        ('fulltext_index', False),
                         ('new_at_top', True),
                         ('inclusive_frames', False),
                         ('static_index', True),
@@ -361,6 +393,10 @@ permission = all
                         ('tree_dir', '.wsb/tree'),
                         ('index', '.wsb/tree/map.html'),
                         ('no_tree', True),
+                        ('tree_journal', False),
+                        ('tree_snapshot', False),
+                        ('compact_meta', False),
+                        ('fulltext_index', False),
                         ('new_at_top', False),
                         ('inclusive_frames', True),
                         ('static_index', False),
@@ -374,6 +410,10 @@ permission = all
                         ('tree_dir', 'tree'),
                         ('index', 'tree/map.html'),
                         ('no_tree', True),
+                        ('tree_journal', False),
+                        ('tree_snapshot', False),
+                        ('compact_meta', False),
+                        ('fulltext_index', False),
                         ('new_at_top', False),
                         ('inclusive_frames', True),
                         ('static_index', False),
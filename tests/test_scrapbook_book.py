@@ -8,7 +8,8 @@ from unittest import mock
 from webscrapbook import WSB_DIR, util
 from webscrapbook._polyfill import zipfile
 from webscrapbook.scrapbook import book as wsb_book
-from webscrapbook.scrapbook.book import Book
+from webscrapbook.scrapbook import host as wsb_host
+from webscrapbook.scrapbook.book import Book, CompactMetaData, TreeData
 from webscrapbook.scrapbook.host import Host
 
 from . import DUMMY_BYTES, TEMP_DIR, glob_files
@@ -39,6 +40,217 @@ def tearDownModule():
         mocking.stop()
 
 
+class TestTreeData(unittest.TestCase):
+    def test_init(self):
+        data = TreeData({
+            'item1': {'title': 'Title 1'},
+            'item2': ['sub1'],
+        })
+        self.assertEqual(data, {
+            'item1': {'title': 'Title 1'},
+            'item2': ['sub1'],
+        })
+        self.assertEqual(data.dirty, {})
+        self.assertFalse(data.has_untracked)
+
+    def test_set(self):
+        data = TreeData({'item1': {'title': 'Title 1'}, 'item2': 1})
+        version = data.version
+
+        # unchanged scalar value
+        data['item2'] = 1
+        self.assertEqual(data.version, version)
+        self.assertEqual(data.dirty, {})
+
+        data['item2'] = 2
+        self.assertNotEqual(data.version, version)
+        self.assertEqual(list(data.dirty), ['item2'])
+        self.assertFalse(data.has_untracked)
+
+        data['item3'] = {'title': 'Title 3'}
+        self.assertEqual(list(data.dirty), ['item2', 'item3'])
+        self.assertTrue(data.has_untracked)
+
+    def test_delete(self):
+        data = TreeData({'item1': 1, 'item2': 2, 'item3': 3, 'item4': 4})
+        del data['item1']
+        data.pop('item2')
+        data.pop('nonexist', None)
+        data.clear()
+        self.assertEqual(list(data.dirty), ['item1', 'item2', 'item3', 'item4'])
+
+    def test_nested_dict(self):
+        data = TreeData({'item1': {'title': 'Title 1'}, 'item2': {}})
+        data['item1']['title'] = 'Title 1'
+        self.assertEqual(data.dirty, {})
+
+        data['item1']['title'] = 'Title 1 rev'
+        data['item2'].setdefault('comment', 'Comment 2')
+        self.assertEqual(list(data.dirty), ['item1', 'item2'])
+        self.assertFalse(data.has_untracked)
+
+    def test_nested_dict_deep(self):
+        data = TreeData({'item1': {'index.html': {'content': 'abc'}}})
+        data['item1']['index.html']['content'] = 'def'
+        self.assertEqual(list(data.dirty), ['item1'])
+
+    def test_nested_list(self):
+        data = TreeData({
+            'item1': ['a'], 'item2': ['a'], 'item3': ['b', 'a'], 'item4': ['a'], 'item5': ['a'],
+        })
+        data['item1'].append('b')
+        data['item2'] += ['b']
+        data['item3'].sort()
+        data['item4'][0:1] = ['b']
+        self.assertEqual(list(data.dirty), ['item1', 'item2', 'item3', 'item4'])
+
+        with self.assertRaises(ValueError):
+            data['item5'].remove('x')
+        self.assertNotIn('item5', data.dirty)
+
+    def test_moved_value(self):
+        """A value moved to another item is taken as not tracked."""
+        data = TreeData({'item1': ['a']})
+        data['item2'] = data.pop('item1')
+        self.assertEqual(list(data.dirty), ['item1', 'item2'])
+        self.assertTrue(data.has_untracked)
+
+    def test_mark_clean(self):
+        data = TreeData({'item1': {'title': 'Title 1'}})
+        sub = {'title': 'Title 2'}
+        data['item2'] = sub
+        data.mark_clean()
+        self.assertEqual(data.dirty, {})
+        self.assertFalse(data.has_untracked)
+
+        # the value is now tracked
+        data['item2']['title'] = 'Title 2 rev'
+        self.assertEqual(list(data.dirty), ['item2'])
+
+    def test_discard_unchanged(self):
+        data = TreeData({'item1': {'title': 'Title 1'}, 'item2': ['a'], 'item3': 3})
+        data['item1']['title'] = 'Title 1 rev'
+        data['item1']['title'] = 'Title 1'
+        data['item2'].append('b')
+        data['item2'].pop()
+        data['item3'] = 4
+        data['item4'] = 4
+        del data['item4']
+        self.assertEqual(list(data.dirty), ['item1', 'item2', 'item3', 'item4'])
+
+        self.assertTrue(data.discard_unchanged())
+        self.assertEqual(list(data.dirty), ['item3'])
+
+        data['item3'] = 3
+        self.assertFalse(data.discard_unchanged())
+        self.assertEqual(data.dirty, {})
+
+        # a value of another type is changed
+        data['item3'] = 3.0
+        self.assertTrue(data.discard_unchanged())
+        self.assertEqual(list(data.dirty), ['item3'])
+
+    def test_discard_unchanged_untracked(self):
+        data = TreeData({'item1': {'title': 'Title 1'}})
+        sub = {'title': 'Title 1'}
+        data['item1'] = sub
+        self.assertTrue(data.discard_unchanged())
+        self.assertEqual(list(data.dirty), ['item1'])
+
+    def test_copy(self):
+        data = TreeData({'item1': {'title': 'Title 1'}, 'item2': ['a']})
+        for data2 in (copy.copy(data), copy.deepcopy(data)):
+            self.assertIs(type(data2), dict)
+            self.assertEqual(data2, data)
+        data2 = copy.deepcopy(data)
+        self.assertIs(type(data2['item1']), dict)
+        self.assertIs(type(data2['item2']), list)
+        data2['item1']['title'] = 'Title 1 rev'
+        self.assertEqual(data.dirty, {})
+
+
+class TestCompactMetaData(unittest.TestCase):
+    def test_init(self):
+        data = CompactMetaData({
+            'item1': {'title': 'Title 1', 'type': 'folder'},
+            'item2': {'title': 'Title 2', 'type': 'folder'},
+        })
+        self.assertEqual(data, {
+            'item1': {'title': 'Title 1', 'type': 'folder'},
+            'item2': {'title': 'Title 2', 'type': 'folder'},
+        })
+        self.assertEqual(list(data['item1']), ['title', 'type'])
+        self.assertEqual(len(data['item1']), 2)
+        self.assertNotIsInstance(data['item1'], dict)
+        self.assertEqual(data.dirty, {})
+
+        # keys are shared and enumerated values are interned
+        self.assertIs(data['item1']._shape, data['item2']._shape)
+        self.assertIs(data['item1']['type'], data['item2']['type'])
+
+    def test_init_share_id(self):
+        key = ''.join(['2020', '0101000000000'])
+        data = CompactMetaData({key: {'create': '20200101000000000'}})
+        self.assertIs(data[key]['create'], key)
+
+    def test_access(self):
+        data = CompactMetaData({'item1': {'title': 'Title 1'}})
+        item = data['item1']
+        self.assertEqual(item['title'], 'Title 1')
+        self.assertEqual(item.get('title'), 'Title 1')
+        self.assertIsNone(item.get('type'))
+        self.assertEqual(item.get('type', ''), '')
+        self.assertIn('title', item)
+        self.assertNotIn('type', item)
+        with self.assertRaises(KeyError):
+            item['type']
+        self.assertEqual({**item, 'type': 'note'}, {'title': 'Title 1', 'type': 'note'})
+
+    def test_set(self):
+        data = CompactMetaData({'item1': {'title': 'Title 1'}})
+        version = data.version
+
+        # unchanged scalar value
+        data['item1']['title'] = 'Title 1'
+        self.assertEqual(data.version, version)
+        self.assertEqual(data.dirty, {})
+
+        data['item1']['title'] = 'Title 1 rev'
+        data['item1']['type'] = 'note'
+        self.assertNotEqual(data.version, version)
+        self.assertEqual(list(data.dirty), ['item1'])
+        self.assertEqual(data['item1'], {'title': 'Title 1 rev', 'type': 'note'})
+        self.assertFalse(data.has_untracked)
+
+    def test_delete(self):
+        data = CompactMetaData({'item1': {'title': 'Title 1', 'type': 'note', 'comment': ''}})
+        del data['item1']['type']
+        self.assertEqual(list(data['item1']), ['title', 'comment'])
+        self.assertEqual(data['item1'].pop('comment'), '')
+        self.assertEqual(data['item1'], {'title': 'Title 1'})
+        self.assertEqual(list(data.dirty), ['item1'])
+
+    def test_mark_clean(self):
+        data = CompactMetaData({'item1': {'title': 'Title 1'}})
+        data['item2'] = {'title': 'Title 2'}
+        self.assertTrue(data.has_untracked)
+        data.mark_clean()
+        self.assertFalse(data.has_untracked)
+        self.assertNotIsInstance(data['item2'], dict)
+
+        # the value is now tracked
+        data['item2']['title'] = 'Title 2 rev'
+        self.assertEqual(list(data.dirty), ['item2'])
+
+    def test_copy(self):
+        data = CompactMetaData({'item1': {'title': 'Title 1'}})
+        data2 = copy.deepcopy(data)
+        self.assertIs(type(data2), dict)
+        self.assertIs(type(data2['item1']), dict)
+        self.assertEqual(data2, data)
+        self.assertIs(type(data['item1'].copy()), dict)
+
+
 class TestBook(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -328,6 +540,53 @@ scrapbook.meta({
         book = Book(Host(self.test_root))
         self.assertEqual(book.load_tree_file(os.path.join(self.test_root, 'meta.js')), {})
 
+    def test_load_tree_file07(self):
+        """Test malformed JSON (extra data)"""
+        self.create_general_config()
+        with open(os.path.join(self.test_root, 'meta.js'), 'w', encoding='UTF-8') as fh:
+            fh.write("""scrapbook.meta({
+  "20200101000000000": {
+    "title": "Dummy"
+  }
+}, [])""")
+
+        book = Book(Host(self.test_root))
+        with self.assertRaises(wsb_book.TreeFileMalformedJsonError):
+            book.load_tree_file(os.path.join(self.test_root, 'meta.js'))
+
+    def test_load_tree_file08(self):
+        """Test malformed wrapping (malformed JSON without closing part)"""
+        self.create_general_config()
+        with open(os.path.join(self.test_root, 'meta.js'), 'w', encoding='UTF-8') as fh:
+            fh.write("""scrapbook.meta({
+  "20200101000000000": {
+    "title": "Dummy"
+  },
+""")
+
+        book = Book(Host(self.test_root))
+        with self.assertRaises(wsb_book.TreeFileMalformedWrappingError):
+            book.load_tree_file(os.path.join(self.test_root, 'meta.js'))
+
+    def test_load_tree_file09(self):
+        """Test trailing comments and semicolons"""
+        self.create_general_config()
+        with open(os.path.join(self.test_root, 'meta.js'), 'w', encoding='UTF-8') as fh:
+            fh.write("""/* (comment) */
+scrapbook.meta(
+  {
+    "20200101000000000": {
+      "title": "Dummy"
+    }
+  }
+) /* (comment) */;
+""")
+
+        book = Book(Host(self.test_root))
+        self.assertEqual(book.load_tree_file(os.path.join(self.test_root, 'meta.js')), {
+            '20200101000000000': {'title': 'Dummy'},
+        })
+
     def test_load_tree_files01(self):
         """Test normal loading
 
@@ -421,6 +680,181 @@ scrapbook.meta({
         book = Book(Host(self.test_root))
         self.assertEqual(book.load_tree_files('meta'), {})
 
+    def test_load_tree_files03(self):
+        """Reuse parsed data from the tree cache of the host."""
+        self.create_general_config()
+        os.makedirs(os.path.join(self.test_root, 'tree'))
+        with open(os.path.join(self.test_root, 'tree', 'meta.js'), 'w', encoding='UTF-8') as fh:
+            fh.write("""scrapbook.meta({
+  "20200101000000000": {
+    "title": "Dummy"
+  }
+})""")
+
+        cache = wsb_host.TreeCache(1024 * 1024)
+        book = Book(Host(self.test_root, tree_cache=cache))
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dummy'},
+        })
+        self.assertEqual(len(cache), 1)
+
+        book = Book(Host(self.test_root, tree_cache=cache))
+        with mock.patch.object(book, 'load_tree_file') as mock_func:
+            meta = book.load_tree_files('meta')
+        mock_func.assert_not_called()
+        self.assertEqual(meta, {
+            '20200101000000000': {'title': 'Dummy'},
+        })
+
+        # modifying the loaded data should not pollute the cache
+        meta['20200101000000000']['title'] = 'Modified'
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dummy'},
+        })
+
+    def test_load_tree_files04(self):
+        """Reload from disk when the tree file is changed."""
+        self.create_general_config()
+        os.makedirs(os.path.join(self.test_root, 'tree'))
+        cache = wsb_host.TreeCache(1024 * 1024)
+        book = Book(Host(self.test_root, tree_cache=cache))
+
+        book.meta = {'20200101000000000': {'title': 'Dummy'}}
+        book.save_meta_files()
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dummy'},
+        })
+
+        book.meta = {'20200101000000000': {'title': 'Dumm2'}}
+        book.save_meta_files()
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dumm2'},
+        })
+
+    def test_load_tree_files05(self):
+        """Loaded data is a TreeData with no change."""
+        self.create_general_config()
+        os.makedirs(os.path.join(self.test_root, 'tree'))
+        with open(os.path.join(self.test_root, 'tree', 'meta.js'), 'w', encoding='UTF-8') as fh:
+            fh.write("""scrapbook.meta({
+  "20200101000000000": {
+    "title": "Dummy"
+  }
+})""")
+
+        book = Book(Host(self.test_root))
+        meta = book.load_tree_files('meta')
+        self.assertIsInstance(meta, TreeData)
+        self.assertEqual(meta.dirty, {})
+
+    def create_snapshot_config(self):
+        with open(self.test_config, 'w', encoding='UTF-8') as fh:
+            fh.write("""[book ""]
+top_dir =
+data_dir = data
+tree_dir = tree
+tree_snapshot = true
+""")
+
+    def test_load_tree_files_snapshot01(self):
+        """Load from the snapshot if the tree file is unchanged."""
+        self.create_snapshot_config()
+        os.makedirs(os.path.join(self.test_root, 'tree'))
+        with open(os.path.join(self.test_root, 'tree', 'meta.js'), 'w', encoding='UTF-8') as fh:
+            fh.write("""scrapbook.meta({
+  "20200101000000000": {
+    "title": "Dummy"
+  }
+})""")
+
+        book = Book(Host(self.test_root))
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dummy'},
+        })
+        self.assertTrue(os.path.isfile(os.path.join(self.test_root, 'tree', 'snapshots', 'meta.js.bin')))
+
+        book = Book(Host(self.test_root))
+        with mock.patch.object(book, 'load_tree_file') as mock_func:
+            meta = book.load_tree_files('meta')
+        mock_func.assert_not_called()
+        self.assertEqual(meta, {
+            '20200101000000000': {'title': 'Dummy'},
+        })
+
+    def test_load_tree_files_snapshot02(self):
+        """Regenerate the snapshot if the tree file is changed."""
+        self.create_snapshot_config()
+        book = Book(Host(self.test_root))
+        book.meta = {'20200101000000000': {'title': 'Dummy'}}
+        book.save_meta_files()
+        book.load_tree_files('meta')
+
+        book.meta = {'20200101000000000': {'title': 'Dumm2'}}
+        book.save_meta_files()
+        self.assertFalse(os.path.exists(os.path.join(self.test_root, 'tree', 'snapshots', 'meta.js.bin')))
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dumm2'},
+        })
+
+        # a snapshot with different signature is ignored
+        with open(os.path.join(self.test_root, 'tree', 'meta.js'), 'a', encoding='UTF-8') as fh:
+            fh.write('\n')
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dumm2'},
+        })
+
+    def test_load_tree_files_snapshot03(self):
+        """Ignore a broken snapshot."""
+        self.create_snapshot_config()
+        book = Book(Host(self.test_root))
+        book.meta = {'20200101000000000': {'title': 'Dummy'}}
+        book.save_meta_files()
+        book.load_tree_files('meta')
+
+        with open(os.path.join(self.test_root, 'tree', 'snapshots', 'meta.js.bin'), 'wb') as fh:
+            fh.write(b'\x00broken')
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dummy'},
+        })
+
+    def test_load_tree_files_snapshot04(self):
+        """Don't take snapshot if not enabled."""
+        self.create_general_config()
+        book = Book(Host(self.test_root))
+        book.meta = {'20200101000000000': {'title': 'Dummy'}}
+        book.save_meta_files()
+        book.load_tree_files('meta')
+        self.assertFalse(os.path.exists(os.path.join(self.test_root, 'tree', 'snapshots')))
+
+    def test_get_tree_state01(self):
+        """A TreeData is compared by version."""
+        book = Book(Host(self.test_root))
+        book.meta = TreeData({'20200101000000000': {'title': 'Dummy'}})
+        with mock.patch.object(Book, 'checksum') as mock_func:
+            state = book.get_tree_state(book.meta)
+            self.assertEqual(book.get_tree_state(book.meta), state)
+
+            book.meta['20200101000000000']['title'] = 'Dummy rev'
+            self.assertNotEqual(book.get_tree_state(book.meta), state)
+        mock_func.assert_not_called()
+
+    def test_get_tree_state02(self):
+        """A TreeData with an untracked value is always taken as changed."""
+        book = Book(Host(self.test_root))
+        book.meta = TreeData()
+        book.meta['20200101000000000'] = {'title': 'Dummy'}
+        self.assertNotEqual(book.get_tree_state(book.meta), book.get_tree_state(book.meta))
+
+    def test_get_tree_state03(self):
+        """Fall back to checksum for a plain dict."""
+        book = Book(Host(self.test_root))
+        book.meta = {'20200101000000000': {'title': 'Dummy'}}
+        state = book.get_tree_state(book.meta)
+        self.assertEqual(book.get_tree_state(book.meta), state)
+
+        book.meta['20200101000000000']['title'] = 'Dummy rev'
+        self.assertNotEqual(book.get_tree_state(book.meta), state)
+
     @mock.patch('webscrapbook.scrapbook.book.Book.load_tree_files')
     def test_load_meta_files01(self, mock_func):
         book = Book(Host(self.test_root))
@@ -441,6 +875,43 @@ scrapbook.meta({
         book.load_meta_files(refresh=True)
         mock_func.assert_called_once_with('meta')
 
+    def test_load_meta_files04(self):
+        """Load as CompactMetaData if compact_meta is set."""
+        with open(self.test_config, 'w', encoding='UTF-8') as fh:
+            fh.write("""[book ""]
+top_dir =
+data_dir = data
+tree_dir = tree
+compact_meta = true
+""")
+        os.makedirs(os.path.join(self.test_root, 'tree'))
+        with open(os.path.join(self.test_root, 'tree', 'meta.js'), 'w', encoding='UTF-8') as fh:
+            fh.write("""scrapbook.meta({
+  "20200101000000000": {
+    "title": "Dummy",
+    "type": "note"
+  }
+})""")
+
+        book = Book(Host(self.test_root))
+        book.load_meta_files()
+        self.assertIsInstance(book.meta, CompactMetaData)
+        self.assertEqual(book.meta, {
+            '20200101000000000': {'title': 'Dummy', 'type': 'note'},
+        })
+
+        # should be saved as is
+        book.meta['20200101000000000']['title'] = 'Dummy rev'
+        book.save_meta_files()
+        with open(os.path.join(self.test_root, 'tree', 'meta.js'), encoding='UTF-8') as fh:
+            self.assertEqual(fh.read(), """/* Feel free to edit this file, but keep data code valid JSON format. */
+scrapbook.meta({
+  "20200101000000000": {
+    "title": "Dummy rev",
+    "type": "note"
+  }
+})""")
+
     @mock.patch('webscrapbook.scrapbook.book.Book.load_tree_files')
     def test_load_toc_files01(self, mock_func):
         book = Book(Host(self.test_root))
@@ -598,6 +1069,173 @@ scrapbook.meta({
   }
 })""")
 
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_META_THRESHOLD', 3)
+    def test_save_meta_files05(self):
+        """Rewrite only the tree files with a changed item."""
+        self.create_general_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+            '20200101000000001': {'title': 'Dummy 2'},
+            '20200101000000002': {'title': 'Dummy 3'},
+            '20200101000000003': {'title': 'Dummy 4'},
+        }
+        book.save_meta_files()
+        with open(os.path.join(self.test_root, 'tree', 'meta.js'), encoding='UTF-8') as fh:
+            meta_js = fh.read()
+
+        book.load_meta_files(refresh=True)
+        book.meta['20200101000000002']['title'] = 'Dummy 3 rev'
+        with mock.patch.object(book, 'save_tree_file', wraps=book.save_tree_file) as mock_func:
+            book.save_meta_files()
+        self.assertEqual([c.args[:2] for c in mock_func.call_args_list], [('meta', 1)])
+
+        with open(os.path.join(self.test_root, 'tree', 'meta.js'), encoding='UTF-8') as fh:
+            self.assertEqual(fh.read(), meta_js)
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dummy 1'},
+            '20200101000000001': {'title': 'Dummy 2'},
+            '20200101000000002': {'title': 'Dummy 3 rev'},
+            '20200101000000003': {'title': 'Dummy 4'},
+        })
+
+        # no change
+        with mock.patch.object(book, 'save_tree_file', wraps=book.save_tree_file) as mock_func:
+            book.save_meta_files()
+        mock_func.assert_not_called()
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_META_THRESHOLD', 3)
+    def test_save_meta_files06(self):
+        """Append new items to the last tree file and then new ones."""
+        self.create_general_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+            '20200101000000001': {'title': 'Dummy 2'},
+            '20200101000000002': {'title': 'Dummy 3'},
+        }
+        book.save_meta_files()
+
+        book.load_meta_files(refresh=True)
+        book.meta['20200101000000003'] = {'title': 'Dummy 4'}
+        book.meta['20200101000000004'] = {'title': 'Dummy 5'}
+        book.meta['20200101000000005'] = {'title': 'Dummy 6'}
+        book.meta['20200101000000006'] = {'title': 'Dummy 7'}
+        del book.meta['20200101000000002']
+        with mock.patch.object(book, 'save_tree_file', wraps=book.save_tree_file) as mock_func:
+            book.save_meta_files()
+        self.assertEqual([c.args[:2] for c in mock_func.call_args_list], [('meta', 1), ('meta', 2)])
+
+        self.assertEqual(book.load_tree_file(os.path.join(self.test_root, 'tree', 'meta1.js')), {
+            '20200101000000003': {'title': 'Dummy 4'},
+            '20200101000000004': {'title': 'Dummy 5'},
+            '20200101000000005': {'title': 'Dummy 6'},
+        })
+        self.assertEqual(book.load_tree_file(os.path.join(self.test_root, 'tree', 'meta2.js')), {
+            '20200101000000006': {'title': 'Dummy 7'},
+        })
+        self.assertEqual(book.meta.shard_count, 3)
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_META_THRESHOLD', 3)
+    def test_save_meta_files07(self):
+        """Repack if a tree file gets empty."""
+        self.create_general_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+            '20200101000000001': {'title': 'Dummy 2'},
+            '20200101000000002': {'title': 'Dummy 3'},
+            '20200101000000003': {'title': 'Dummy 4'},
+        }
+        book.save_meta_files()
+
+        book.load_meta_files(refresh=True)
+        del book.meta['20200101000000000']
+        del book.meta['20200101000000001']
+        book.save_meta_files()
+
+        self.assertEqual(glob_files(os.path.join(self.test_root, 'tree')), {
+            os.path.join(self.test_root, 'tree', 'meta.js'),
+        })
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000002': {'title': 'Dummy 3'},
+            '20200101000000003': {'title': 'Dummy 4'},
+        })
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_META_THRESHOLD', 3)
+    def test_save_meta_files08(self):
+        """Repack if the tree files have been changed since loaded."""
+        self.create_general_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+            '20200101000000001': {'title': 'Dummy 2'},
+            '20200101000000002': {'title': 'Dummy 3'},
+        }
+        book.save_meta_files()
+
+        book.load_meta_files(refresh=True)
+        os.remove(os.path.join(self.test_root, 'tree', 'meta1.js'))
+        book.meta['20200101000000000']['title'] = 'Dummy 1 rev'
+        book.save_meta_files()
+
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dummy 1 rev'},
+            '20200101000000001': {'title': 'Dummy 2'},
+            '20200101000000002': {'title': 'Dummy 3'},
+        })
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_META_THRESHOLD', 3)
+    def test_save_meta_files08_same_count(self):
+        """Repack if the tree files have been repacked since loaded, even if
+        the number of files is not changed."""
+        self.create_general_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+            '20200101000000001': {'title': 'Dummy 2'},
+            '20200101000000002': {'title': 'Dummy 3'},
+        }
+        book.save_meta_files()
+
+        book.load_meta_files(refresh=True)
+        book2 = Book(Host(self.test_root))
+        book2.save_tree_file('meta', 0, book2._gen_meta_file({
+            '20200101000000000': {'title': 'Dummy 1'},
+        }))
+        book2.save_tree_file('meta', 1, book2._gen_meta_file({
+            '20200101000000001': {'title': 'Dummy 2'},
+            '20200101000000002': {'title': 'Dummy 3'},
+        }))
+
+        book.meta['20200101000000000']['title'] = 'Dummy 1 rev'
+        book.save_meta_files()
+
+        self.assertEqual(book.load_tree_file(os.path.join(self.test_root, 'tree', 'meta.js')), {
+            '20200101000000000': {'title': 'Dummy 1 rev'},
+            '20200101000000001': {'title': 'Dummy 2'},
+        })
+        self.assertEqual(book.load_tree_file(os.path.join(self.test_root, 'tree', 'meta1.js')), {
+            '20200101000000002': {'title': 'Dummy 3'},
+        })
+
+    def test_save_meta_files09(self):
+        """Don't rewrite the tree files if the changed items are restored."""
+        self.create_general_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+        }
+        book.save_meta_files()
+
+        book.load_meta_files(refresh=True)
+        book.meta['20200101000000000']['title'] = 'Dummy 1 rev'
+        book.meta['20200101000000000']['title'] = 'Dummy 1'
+        with mock.patch.object(book, 'save_tree_file', wraps=book.save_tree_file) as mock_func:
+            book.save_meta_files()
+        mock_func.assert_not_called()
+        self.assertEqual(book.meta.dirty, {})
+
     def test_save_toc_files01(self):
         self.create_general_config()
         book = Book(Host(self.test_root))
@@ -760,6 +1398,204 @@ scrapbook.toc({
   ]
 })""")
 
+    def create_journal_config(self):
+        with open(self.test_config, 'w', encoding='UTF-8') as fh:
+            fh.write("""[book ""]
+top_dir =
+data_dir = data
+tree_dir = tree
+tree_journal = true
+""")
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_JOURNAL_MAX_RATIO', 100)
+    def test_save_meta_files_journal01(self):
+        """Append only changed and deleted items as a journal file."""
+        self.create_journal_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+            '20200101000000001': {'title': 'Dummy 2'},
+            '20200101000000002': {'title': 'Dummy 3'},
+        }
+        book.save_meta_files()
+        with open(os.path.join(self.test_root, 'tree', 'meta.js'), encoding='UTF-8') as fh:
+            meta_js = fh.read()
+
+        book.load_meta_files(refresh=True)
+        book.meta['20200101000000000']['title'] = 'Dummy 1 rev'
+        del book.meta['20200101000000001']
+        book.meta['20200101000000003'] = {'title': 'Dummy 4'}
+        book.save_meta_files()
+
+        with open(os.path.join(self.test_root, 'tree', 'meta.js'), encoding='UTF-8') as fh:
+            self.assertEqual(fh.read(), meta_js)
+        with open(os.path.join(self.test_root, 'tree', 'meta1.js'), encoding='UTF-8') as fh:
+            self.assertEqual(fh.read(), """\
+/* Journal of changes to the preceding files. Do not edit. */
+scrapbook.meta({
+  "20200101000000000": {
+    "title": "Dummy 1 rev"
+  },
+  "20200101000000003": {
+    "title": "Dummy 4"
+  },
+  "20200101000000001": null
+})""")
+        self.assertTrue(book.is_tree_journal_file(os.path.join(self.test_root, 'tree', 'meta1.js')))
+        self.assertFalse(book.is_tree_journal_file(os.path.join(self.test_root, 'tree', 'meta.js')))
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dummy 1 rev'},
+            '20200101000000002': {'title': 'Dummy 3'},
+            '20200101000000003': {'title': 'Dummy 4'},
+        })
+
+    def test_save_meta_files_journal02(self):
+        """Don't write a journal file if nothing is changed."""
+        self.create_journal_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+        }
+        book.save_meta_files()
+        book.save_meta_files()
+
+        self.assertEqual(glob_files(os.path.join(self.test_root, 'tree')), {
+            os.path.join(self.test_root, 'tree', 'meta.js'),
+        })
+
+    def test_save_meta_files_journal02_restored(self):
+        """Don't write a journal file if the changed items are restored."""
+        self.create_journal_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+        }
+        book.save_meta_files()
+
+        book.load_meta_files(refresh=True)
+        book.meta['20200101000000000']['title'] = 'Dummy 1 rev'
+        book.meta['20200101000000000']['title'] = 'Dummy 1'
+        book.meta['20200101000000001'] = {'title': 'Dummy 2'}
+        del book.meta['20200101000000001']
+        book.save_meta_files()
+
+        self.assertEqual(glob_files(os.path.join(self.test_root, 'tree')), {
+            os.path.join(self.test_root, 'tree', 'meta.js'),
+        })
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_JOURNAL_MAX_FILES', 2)
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_JOURNAL_MAX_RATIO', 100)
+    def test_save_meta_files_journal03(self):
+        """Compact the journal files when reaching the threshold."""
+        self.create_journal_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+            '20200101000000001': {'title': 'Dummy 2'},
+        }
+        book.save_meta_files()
+
+        book.meta['20200101000000000']['title'] = 'Dummy 1 rev'
+        book.save_meta_files()
+        book.meta['20200101000000001']['title'] = 'Dummy 2 rev'
+        book.save_meta_files()
+        self.assertTrue(os.path.exists(os.path.join(self.test_root, 'tree', 'meta2.js')))
+
+        book.meta['20200101000000001']['title'] = 'Dummy 2 rev2'
+        book.save_meta_files()
+
+        self.assertEqual(glob_files(os.path.join(self.test_root, 'tree')), {
+            os.path.join(self.test_root, 'tree', 'meta.js'),
+        })
+        with open(os.path.join(self.test_root, 'tree', 'meta.js'), encoding='UTF-8') as fh:
+            self.assertEqual(fh.read(), """\
+/* Feel free to edit this file, but keep data code valid JSON format. */
+scrapbook.meta({
+  "20200101000000000": {
+    "title": "Dummy 1 rev"
+  },
+  "20200101000000001": {
+    "title": "Dummy 2 rev2"
+  }
+})""")
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_JOURNAL_MAX_RATIO', 0)
+    def test_save_meta_files_journal04(self):
+        """Compact the journal files when they get too large."""
+        self.create_journal_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+        }
+        book.save_meta_files()
+
+        book.meta['20200101000000000']['title'] = 'Dummy 1 rev'
+        book.save_meta_files()
+        self.assertTrue(os.path.exists(os.path.join(self.test_root, 'tree', 'meta1.js')))
+
+        book.meta['20200101000000000']['title'] = 'Dummy 1 rev2'
+        book.save_meta_files()
+        self.assertFalse(os.path.exists(os.path.join(self.test_root, 'tree', 'meta1.js')))
+        self.assertEqual(book.load_tree_files('meta'), {
+            '20200101000000000': {'title': 'Dummy 1 rev2'},
+        })
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_JOURNAL_MAX_RATIO', 100)
+    def test_save_meta_files_journal05(self):
+        """Take changes from the tracking of a TreeData."""
+        self.create_journal_config()
+        book = Book(Host(self.test_root))
+        book.meta = {
+            '20200101000000000': {'title': 'Dummy 1'},
+            '20200101000000001': {'title': 'Dummy 2'},
+        }
+        book.save_meta_files()
+
+        book.load_meta_files(refresh=True)
+        book.meta['20200101000000001']['title'] = 'Dummy 2 rev'
+        with mock.patch.object(book, 'load_tree_files') as mock_func:
+            book.save_meta_files()
+        mock_func.assert_not_called()
+        self.assertEqual(book.meta.dirty, {})
+
+        with open(os.path.join(self.test_root, 'tree', 'meta1.js'), encoding='UTF-8') as fh:
+            self.assertEqual(fh.read(), """\
+/* Journal of changes to the preceding files. Do not edit. */
+scrapbook.meta({
+  "20200101000000001": {
+    "title": "Dummy 2 rev"
+  }
+})""")
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_JOURNAL_MAX_RATIO', 100)
+    def test_save_toc_files_journal01(self):
+        self.create_journal_config()
+        book = Book(Host(self.test_root))
+        book.toc = {
+            'root': ['20200101000000000', '20200101000000001'],
+            '20200101000000000': ['20200101000000002'],
+        }
+        book.save_toc_files()
+
+        book.toc['root'].append('20200101000000003')
+        del book.toc['20200101000000000']
+        book.save_toc_files()
+
+        with open(os.path.join(self.test_root, 'tree', 'toc1.js'), encoding='UTF-8') as fh:
+            self.assertEqual(fh.read(), """\
+/* Journal of changes to the preceding files. Do not edit. */
+scrapbook.toc({
+  "root": [
+    "20200101000000000",
+    "20200101000000001",
+    "20200101000000003"
+  ],
+  "20200101000000000": null
+})""")
+        self.assertEqual(book.load_tree_files('toc'), {
+            'root': ['20200101000000000', '20200101000000001', '20200101000000003'],
+        })
+
     def test_save_fulltext_files01(self):
         self.create_general_config()
         book = Book(Host(self.test_root))
@@ -1298,6 +2134,12 @@ scrapbook.fulltext({
         book.load_meta_files()
         book.load_toc_files()
         book.load_fulltext_files()
+        for id in book.meta:
+            book.meta[id]['title'] = 'Dummy rev'
+        for id in book.toc:
+            book.toc[id].append('20200101000000005')
+        for id in book.fulltext:
+            book.fulltext[id]['index.html']['content'] = 'dummy text rev'
         book.save_meta_files()
         book.save_toc_files()
         book.save_fulltext_files()
@@ -1452,6 +2294,104 @@ scrapbook.fulltext({
             ['item0', 'root', 'item1', 'item2'],
         )
 
+    def test_get_reachable_items_deep(self):
+        """Should not hit the recursion limit for a deep tree."""
+        book = Book(Host(self.test_root))
+        book.toc = {f'item{i}': [f'item{i + 1}'] for i in range(5000)}
+        self.assertEqual(len(book.get_reachable_items('item0')), 5001)
+
+        book.toc = TreeData(book.toc)
+        for _ in range(2):
+            self.assertEqual(len(book.get_reachable_items('item0')), 5001)
+            self.assertTrue(book.is_reachable('item5000', 'item0'))
+        self.assertIsNotNone(book._reach_index)
+
+    def test_get_reachable_items_index(self):
+        """The index gives the same result as a traversal."""
+        toc = {
+            'root': ['item1', 'item2', 'item3'],
+            'hidden': ['item5'],
+            'recycle': ['item6'],
+            'item1': ['item1-1', 'item1-2'],
+            'item1-1': ['item1-1-1'],
+            'item2': ['item1-1', 'item2-1'],
+            'item3': ['item3-1'],
+            'item3-1': ['item3-1-1'],
+            'item3-1-1': ['item3'],
+            'item5': ['item5-1', 'item5-1'],
+            'item7': ['item7-1'],
+        }
+        book = Book(Host(self.test_root))
+        book.toc = toc
+        ids = {id for k, v in toc.items() for id in (k, *v)} | {'nonexist'}
+        expected = {id: list(book.get_reachable_items(id)) for id in ids}
+        expected_multi = list(book.get_reachable_items(['item2', 'item1', 'item3-1']))
+        expected_dict = list(book.get_reachable_items('item1', {'item1-1-1': True}))
+
+        book.toc = TreeData(toc)
+        book.get_reachable_items('root')
+        book.get_reachable_items('root')
+        self.assertIsNotNone(book._reach_index)
+        for id in ids:
+            with self.subTest(id=id):
+                self.assertEqual(list(book.get_reachable_items(id)), expected[id])
+                for id2 in ids:
+                    self.assertEqual(book.is_reachable(id2, id), id2 in expected[id])
+        self.assertEqual(list(book.get_reachable_items(['item2', 'item1', 'item3-1'])), expected_multi)
+        self.assertEqual(list(book.get_reachable_items('item1', {'item1-1-1': True})), expected_dict)
+
+    def test_get_reachable_items_index_invalidate(self):
+        """The index is rebuilt after the TOC is changed."""
+        book = Book(Host(self.test_root))
+        book.toc = TreeData({
+            'root': ['item1', 'item2'],
+        })
+        book.get_reachable_items('root')
+        book.get_reachable_items('root')
+        index = book._reach_index
+        self.assertFalse(book.is_reachable('item3', 'item1'))
+
+        book.toc['item1'] = ['item3']
+        self.assertTrue(book.is_reachable('item3', 'item1'))
+        self.assertEqual(list(book.get_reachable_items('root')), ['root', 'item1', 'item3', 'item2'])
+        self.assertIsNot(book._reach_index, index)
+
+    def test_get_reachable_items_index_tree_cache(self):
+        """The index is built on first use and shared by books of the same
+        TOC files."""
+        self.create_general_config()
+        cache = wsb_host.TreeCache(1024 * 1024)
+        book = Book(Host(self.test_root, tree_cache=cache))
+        book.toc = TreeData({
+            'root': ['item1', 'item2'],
+            'item1': ['item3'],
+        })
+        book.save_toc_files()
+
+        book = Book(Host(self.test_root, tree_cache=cache))
+        book.load_toc_files()
+        self.assertTrue(book.is_reachable('item3', 'root'))
+        index = book._reach_index
+        self.assertIsNotNone(index)
+
+        with mock.patch('webscrapbook.scrapbook.book._ReachIndex.__init__') as mock_func:
+            book = Book(Host(self.test_root, tree_cache=cache))
+            book.load_toc_files()
+            self.assertEqual(list(book.get_reachable_items('root')), ['root', 'item1', 'item3', 'item2'])
+            self.assertIs(book._reach_index, index)
+        mock_func.assert_not_called()
+
+        # not shared for a changed TOC
+        book.toc['item2'] = ['item4']
+        self.assertTrue(book.is_reachable('item4', 'root'))
+        self.assertTrue(book.is_reachable('item4', 'item2'))
+        self.assertIsNot(book._reach_index, index)
+
+        book = Book(Host(self.test_root, tree_cache=cache))
+        book.load_toc_files()
+        self.assertFalse(book.is_reachable('item4', 'root'))
+        self.assertIs(book._reach_index, index)
+
     def test_get_unique_id(self):
         self.create_general_config()
         host = Host(self.test_root)
@@ -1502,6 +2442,95 @@ scrapbook.fulltext({
         }
         self.assertEqual(book.get_unique_id('20220101000059999'), '20220101000100003')
 
+    def test_get_unique_id_data_names01(self):
+        """Data dir should be scanned only once if not changed."""
+        self.create_general_config()
+        host = Host(self.test_root)
+        book = Book(host)
+        book.meta = {}
+        util.fs.mkdir(os.path.join(book.data_dir, '20200101000000000'))
+        util.fs.save(os.path.join(book.data_dir, '20200101000000001.html'), b'')
+        util.fs.save(os.path.join(book.data_dir, '20200101000000002.tar.gz'), b'')
+
+        with mock.patch('webscrapbook.scrapbook.book.os.scandir', side_effect=os.scandir) as mocker:
+            self.assertEqual(book.get_unique_id('20200101000000000'), '20200101000000003')
+            self.assertEqual(book.get_unique_id('20200101000000000'), '20200101000000003')
+            self.assertEqual(mocker.call_count, 1)
+
+        self.assertEqual(book._data_names, {
+            '20200101000000000',
+            '20200101000000001.html',
+            '20200101000000001',
+            '20200101000000002.tar.gz',
+            '20200101000000002.tar',
+            '20200101000000002',
+        })
+
+    def test_get_unique_id_data_names02(self):
+        """Data dir should be rescanned if modified externally."""
+        self.create_general_config()
+        host = Host(self.test_root)
+        book = Book(host)
+        book.meta = {}
+        util.fs.mkdir(book.data_dir)
+
+        self.assertEqual(book.get_unique_id('20200101000000000'), '20200101000000000')
+
+        util.fs.save(os.path.join(book.data_dir, '20200101000000000.htz'), b'')
+        self.assertEqual(book.get_unique_id('20200101000000000'), '20200101000000001')
+
+    def test_get_unique_id_data_names03(self):
+        """Data dir should not be rescanned for files created through
+        creating_data_file()."""
+        self.create_general_config()
+        host = Host(self.test_root)
+        book = Book(host)
+        book.meta = {}
+        util.fs.mkdir(book.data_dir)
+
+        with mock.patch('webscrapbook.scrapbook.book.os.scandir', side_effect=os.scandir) as mocker:
+            for i in range(50):
+                item_id = book.get_unique_id('20200101000000000')
+                self.assertEqual(item_id, str(20200101000000000 + i))
+                file = os.path.join(book.data_dir, item_id, 'index.html')
+                with book.creating_data_file(file):
+                    util.fs.save(file, b'')
+            self.assertEqual(mocker.call_count, 1)
+
+    def test_get_unique_id_data_names04(self):
+        """Data dir should be rescanned if modified externally after a file
+        is marked."""
+        self.create_general_config()
+        host = Host(self.test_root)
+        book = Book(host)
+        book.meta = {}
+        util.fs.mkdir(book.data_dir)
+
+        self.assertEqual(book.get_unique_id('20200101000000000'), '20200101000000000')
+        file = os.path.join(book.data_dir, '20200101000000000', 'index.html')
+        util.fs.save(file, b'')
+        util.fs.save(os.path.join(book.data_dir, '20200101000000001.htz'), b'')
+        book.mark_data_file(file)
+
+        self.assertEqual(book.get_unique_id('20200101000000000'), '20200101000000002')
+
+    def test_get_unique_id_data_names05(self):
+        """Data dir should be rescanned if modified externally before a file
+        is created through creating_data_file()."""
+        self.create_general_config()
+        host = Host(self.test_root)
+        book = Book(host)
+        book.meta = {}
+        util.fs.mkdir(book.data_dir)
+
+        self.assertEqual(book.get_unique_id('20200101000000000'), '20200101000000000')
+        util.fs.save(os.path.join(book.data_dir, '20200101000000001.htz'), b'')
+        file = os.path.join(book.data_dir, '20200101000000000', 'index.html')
+        with book.creating_data_file(file):
+            util.fs.save(file, b'')
+
+        self.assertEqual(book.get_unique_id('20200101000000000'), '20200101000000002')
+
 
 class TestGetTemplate(TestBook):
     def test_note_html(self):
@@ -1820,6 +2849,137 @@ class TestGetItems(TestBook):
         })
 
 
+class TestGetParents(TestBook):
+    def test_basic(self):
+        book = Book(Host(self.test_root))
+        book.toc = {
+            'root': ['item1', 'item2', 'item1'],
+            'hidden': ['item1'],
+            'item2': ['item3'],
+        }
+        self.assertEqual(book.get_parents('item1'), [('root', 0), ('root', 2), ('hidden', 0)])
+        self.assertEqual(book.get_parents('item3'), [('item2', 0)])
+        self.assertEqual(book.get_parents('root'), [])
+
+        # rebuilt for a plain dict TOC
+        book.toc['item3'] = ['item1']
+        self.assertEqual(book.get_parents('item1'), [('root', 0), ('root', 2), ('hidden', 0), ('item3', 0)])
+
+    def test_incremental(self):
+        """The index is updated along with the item methods."""
+        book = Book(Host(self.test_root))
+        book.meta = {
+            'item1': {},
+            'item2': {},
+            'item3': {},
+        }
+        book.toc = TreeData({
+            'root': ['item1', 'item2'],
+            'item2': ['item3'],
+        })
+        self.assertEqual(book.get_parents('item3'), [('item2', 0)])
+
+        with mock.patch('webscrapbook.scrapbook.book._ParentIndex.__init__') as mock_func:
+            book.move_item('item2', 0, 'item1')
+            self.assertEqual(book.get_parents('item3'), [('item1', 0)])
+
+            book.link_item('item1', 0, 'root', 0)
+            self.assertEqual(book.get_parents('item3'), [('root', 0), ('item1', 0)])
+
+            book.sort_item('root', 'id', reverse=True)
+            self.assertEqual(book.get_parents('item3'), [('root', 0), ('item1', 0)])
+            self.assertEqual(book.get_parents('item2'), [('root', 1)])
+
+            book.recycle_item('root', 0)
+            self.assertEqual(book.get_parents('item3'), [('item1', 0)])
+
+            book.delete_item('root', 1)
+            self.assertEqual(book.get_parents('item3'), [])
+            self.assertEqual(book.get_parents('item1'), [])
+        mock_func.assert_not_called()
+
+    def test_rebuild(self):
+        """The index is rebuilt if the TOC is changed otherwise."""
+        book = Book(Host(self.test_root))
+        book.toc = TreeData({
+            'root': ['item1', 'item2'],
+        })
+        self.assertEqual(book.get_parents('item2'), [('root', 1)])
+
+        book.toc['root'].insert(0, 'item3')
+        self.assertEqual(book.get_parents('item2'), [('root', 2)])
+        self.assertEqual(book.get_parents('item3'), [('root', 0)])
+
+        book.toc = TreeData({
+            'hidden': ['item2'],
+        })
+        self.assertEqual(book.get_parents('item2'), [('hidden', 0)])
+
+    def test_toc_order(self):
+        """Parents are in TOC order, including a parent newly added."""
+        book = Book(Host(self.test_root))
+        book.meta = {
+            'item1': {},
+            'item2': {},
+            'item3': {},
+        }
+        book.toc = TreeData({
+            'item2': ['item3'],
+            'root': ['item1', 'item2', 'item3'],
+            'item1': ['item3'],
+        })
+        self.assertEqual(book.get_parents('item3'), [('item2', 0), ('root', 2), ('item1', 0)])
+
+        book.recycle_item('item2', 0)
+        book.link_item('root', 2, 'item2', 0)
+        self.assertEqual(book.get_parents('item3'), [('root', 2), ('item1', 0), ('item2', 0)])
+
+    def test_tree_cache(self):
+        """The index is shared by books of the same TOC files."""
+        self.create_general_config()
+        cache = wsb_host.TreeCache(1024 * 1024)
+        book = Book(Host(self.test_root, tree_cache=cache))
+        book.meta = {
+            'item1': {},
+            'item2': {},
+            'item3': {},
+        }
+        book.toc = TreeData({
+            'root': ['item1', 'item2'],
+            'item2': ['item3'],
+        })
+        book.save_meta_files()
+        book.save_toc_files()
+
+        book = Book(Host(self.test_root, tree_cache=cache))
+        book.load_meta_files()
+        book.load_toc_files()
+        self.assertEqual(book.get_parents('item3'), [('item2', 0)])
+
+        with mock.patch('webscrapbook.scrapbook.book._ParentIndex.__init__') as mock_func:
+            book2 = Book(Host(self.test_root, tree_cache=cache))
+            book2.load_meta_files()
+            book2.load_toc_files()
+            self.assertEqual(book2.get_parents('item3'), [('item2', 0)])
+            self.assertIs(book2._parent_index, book._parent_index)
+        mock_func.assert_not_called()
+
+        # changes of a book don't pollute the shared index
+        book2.move_item('item2', 0, 'item1')
+        self.assertEqual(book2.get_parents('item3'), [('item1', 0)])
+        self.assertEqual(book.get_parents('item3'), [('item2', 0)])
+
+        # the index updated along with the changes is shared for the saved files
+        book2.save_toc_files()
+        with mock.patch('webscrapbook.scrapbook.book._ParentIndex.__init__') as mock_func:
+            book3 = Book(Host(self.test_root, tree_cache=cache))
+            book3.load_meta_files()
+            book3.load_toc_files()
+            self.assertEqual(book3.get_parents('item3'), [('item1', 0)])
+            self.assertIs(book3._parent_index, book2._parent_index)
+        mock_func.assert_not_called()
+
+
 class TestAddItem(TestBook):
     def test_basic(self):
         host = Host(self.test_root)
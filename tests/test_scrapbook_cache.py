@@ -10,6 +10,7 @@ from lxml import etree
 from webscrapbook import WSB_DIR
 from webscrapbook._polyfill import zipfile
 from webscrapbook.scrapbook import cache as wsb_cache
+from webscrapbook.scrapbook.fulltext import FulltextIndex
 
 from . import TEMP_DIR, TestBookMixin
 
@@ -131,13 +132,13 @@ class TestFuncGenerate(TestCache):
             pass
 
         self.assertListEqual(mock_cls.mock_calls, [
-            mock.call(mock.ANY, recreate=False),  # book ''
+            mock.call(mock.ANY, recreate=False, jobs=None),  # book ''
             mock.call().run(['item01', 'item02']),
             mock.ANY,  # iter
-            mock.call(mock.ANY, recreate=False),  # book 'b1'
+            mock.call(mock.ANY, recreate=False, jobs=None),  # book 'b1'
             mock.call().run(None),
             mock.ANY,  # iter
-            mock.call(mock.ANY, recreate=False),  # book 'b2'
+            mock.call(mock.ANY, recreate=False, jobs=None),  # book 'b2'
             mock.call().run(['item21']),
             mock.ANY,  # iter
         ])
@@ -171,6 +172,14 @@ no_tree = true
 
         mock_cls.assert_not_called()
 
+    @mock.patch('webscrapbook.scrapbook.cache.FulltextCacheGenerator')
+    def test_param_jobs(self, mock_cls):
+        """Check jobs is passed to the generator"""
+        for _info in wsb_cache.generate(self.test_root, jobs=2):
+            pass
+
+        mock_cls.assert_called_once_with(mock.ANY, recreate=False, jobs=2)
+
     @mock.patch('webscrapbook.scrapbook.cache.StaticSiteGenerator')
     def test_param_static_site01(self, mock_cls):
         for _info in wsb_cache.generate(self.test_root, static_site=True):
@@ -481,6 +490,87 @@ Page content 2.
             },
         })
 
+    def test_jobs(self):
+        """Parallel generation should get the same cache and logs as the
+        sequential one."""
+        def init_book(root):
+            os.makedirs(os.path.join(root, WSB_DIR, 'tree'))
+            book = self.init_book(
+                root,
+                meta={
+                    '20200101000000001': {
+                        'index': '20200101000000001/index.html',
+                    },
+                    '20200101000000002': {
+                        'index': '20200101000000002/index.html',
+                    },
+                    '20200101000000003': {
+                        'index': '20200101000000003/index.html',
+                    },
+                    '20200101000000004': {
+                        'index': '20200101000000004/index.html',
+                    },
+                },
+                fulltext={
+                    '20200101000000002': {
+                        'index.html': {'content': 'old page 2'},
+                        'deleted.html': {'content': 'old deleted'},
+                    },
+                    '20200101000000003': {
+                        'index.html': {'content': 'cached page 3'},
+                    },
+                    '20200101000000005': {
+                        'index.html': {'content': 'stale'},
+                    },
+                },
+            )
+            os.utime(os.path.join(root, WSB_DIR, 'tree', 'fulltext.js'), (1000, 1000))
+            files = {
+                '20200101000000001/index.html': '<a href="linked.html">link</a><iframe src="frame.html"></iframe>',
+                '20200101000000001/linked.html': 'Linked page.',
+                '20200101000000001/frame.html': 'Frame page.',
+                '20200101000000002/index.html': 'Page 2 <a href="linked.html">link</a>',
+                '20200101000000002/linked.html': 'Linked page 2.',
+                '20200101000000003/index.html': 'Page 3',
+            }
+            for path, content in files.items():
+                file = os.path.join(root, path)
+                os.makedirs(os.path.dirname(file), exist_ok=True)
+                with open(file, 'w', encoding='UTF-8') as fh:
+                    fh.write(f'<!DOCTYPE html><html><body>{content}</body></html>')
+                os.utime(file, (2000, 2000))
+            os.utime(os.path.join(root, '20200101000000003', 'index.html'), (500, 500))
+            return book
+
+        book1 = init_book(os.path.join(self.test_root, 'book1'))
+        book2 = init_book(os.path.join(self.test_root, 'book2'))
+
+        generator = wsb_cache.FulltextCacheGenerator(book1)
+        infos1 = list(generator.run())
+
+        with mock.patch('webscrapbook.scrapbook.cache.FulltextCacheGenerator.PENDING_PER_JOB', 1):
+            generator = wsb_cache.FulltextCacheGenerator(book2, jobs=2)
+            infos2 = list(generator.run())
+
+        self.assertEqual(book2.fulltext, {
+            '20200101000000001': {
+                'index.html': {'content': 'link Frame page.'},
+                'linked.html': {'content': 'Linked page.'},
+            },
+            '20200101000000002': {
+                'index.html': {'content': 'Page 2 link'},
+                'linked.html': {'content': 'Linked page 2.'},
+            },
+            '20200101000000003': {
+                'index.html': {'content': 'cached page 3'},
+            },
+        })
+        self.assertEqual(book2.fulltext, book1.fulltext)
+        self.assertEqual(
+            [(info.type, info.msg.replace('book1', 'book2')) for info in infos1],
+            [(info.type, info.msg) for info in infos2],
+        )
+
     def test_update01(self):
         """Update if no cache"""
         book = self.init_book(
@@ -3040,6 +3130,106 @@ Text file content
             },
         })
 
+    def general_config_fulltext_index(self):
+        return """\
+[book ""]
+fulltext_index = true
+"""
+
+    def test_fulltext_index01(self):
+        """Build the index if not exist."""
+        book = self.init_book(
+            self.test_root,
+            config=self.general_config_fulltext_index(),
+            meta=self.general_meta(),
+        )
+        with open(self.test_file, 'w', encoding='UTF-8') as fh:
+            fh.write("""<!DOCTYPE html>
+<html>
+<body>
+Page content.
+</body>
+</html>
+""")
+
+        generator = wsb_cache.FulltextCacheGenerator(book)
+        for _info in generator.run():
+            pass
+
+        index = FulltextIndex.load(book)
+        self.assertEqual(index.get_candidates('content'), {'20200101000000000'})
+
+    def test_fulltext_index02(self):
+        """Update the index for changed items only."""
+        book = self.init_book(
+            self.test_root,
+            config=self.general_config_fulltext_index(),
+            meta={
+                '20200101000000001': {
+                    'index': '20200101000000001/index.html',
+                    'title': 'Dummy1',
+                    'type': '',
+                },
+                '20200101000000002': {
+                    'index': '20200101000000002/index.html',
+                    'title': 'Dummy2',
+                    'type': '',
+                },
+            },
+        )
+        for i in (1, 2):
+            test_file = os.path.join(self.test_root, f'2020010100000000{i}', 'index.html')
+            os.makedirs(os.path.dirname(test_file), exist_ok=True)
+            with open(test_file, 'w', encoding='UTF-8') as fh:
+                fh.write(f'<!DOCTYPE html><html><body>Page content {i}.</body></html>')
+
+        generator = wsb_cache.FulltextCacheGenerator(book)
+        for _info in generator.run():
+            pass
+        self.assertEqual(FulltextIndex.load(book).get_candidates('1'), {'20200101000000001'})
+
+        test_file = os.path.join(self.test_root, '20200101000000001', 'index.html')
+        with open(test_file, 'w', encoding='UTF-8') as fh:
+            fh.write('<!DOCTYPE html><html><body>Page content 3.</body></html>')
+        os.utime(test_file, (4102444800, 4102444800))
+
+        book = self.init_book(self.test_root)
+        generator = wsb_cache.FulltextCacheGenerator(book)
+        with mock.patch('webscrapbook.scrapbook.fulltext.FulltextIndex.add',
+                        autospec=True, side_effect=FulltextIndex.add) as mocked:
+            for _info in generator.run():
+                pass
+        mocked.assert_called_once_with(mock.ANY, '20200101000000001', mock.ANY)
+
+        index = FulltextIndex.load(book)
+        self.assertEqual(index.get_candidates('1'), set())
+        self.assertEqual(index.get_candidates('3'), {'20200101000000001'})
+        self.assertEqual(index.get_candidates('2'), {'20200101000000002'})
+
+    def test_fulltext_index03(self):
+        """Revalidate the index if nothing changed."""
+        book = self.init_book(
+            self.test_root,
+            config=self.general_config_fulltext_index(),
+            meta=self.general_meta(),
+        )
+        with open(self.test_file, 'w', encoding='UTF-8') as fh:
+            fh.write('<!DOCTYPE html><html><body>Page content.</body></html>')
+
+        generator = wsb_cache.FulltextCacheGenerator(book)
+        for _info in generator.run():
+            pass
+
+        book = self.init_book(self.test_root)
+        generator = wsb_cache.FulltextCacheGenerator(book)
+        with mock.patch('webscrapbook.scrapbook.fulltext.FulltextIndex.save') as mocked:
+            for _info in generator.run():
+                pass
+        mocked.assert_not_called()
+
+        index = FulltextIndex.load(book)
+        self.assertEqual(index.get_candidates('content'), {'20200101000000000'})
+
 
 class TestStaticSiteGenerator(TestCache):
     def test_update01(self):
@@ -0,0 +1,212 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from webscrapbook.scrapbook import columns
+from webscrapbook.scrapbook.columns import MetaColumns, get_stats
+from webscrapbook.scrapbook.host import Host, TreeCache
+
+from . import TEMP_DIR, TestBookMixin, require_numpy
+
+
+def setUpModule():
+    # set up a temp directory for testing
+    global _tmpdir, tmpdir
+    _tmpdir = tempfile.TemporaryDirectory(prefix='columns-', dir=TEMP_DIR)
+    tmpdir = os.path.realpath(_tmpdir.name)
+
+    # mock out user config
+    global mockings
+    mockings = (
+        mock.patch('webscrapbook.Config.user_config_dir', return_value=os.devnull),
+        mock.patch('webscrapbook.Config.user_config', return_value=os.devnull),
+    )
+    for mocking in mockings:
+        mocking.start()
+
+
+def tearDownModule():
+    # cleanup the temp directory
+    _tmpdir.cleanup()
+
+    # stop mock
+    for mocking in mockings:
+        mocking.stop()
+
+
+META = {
+    'item1': {
+        'type': 'folder',
+        'create': '20200101000000000',
+        'modify': '20200301000000000',
+        'marked': True,
+    },
+    'item2': {
+        'type': '',
+        'create': '20200102000000000',
+        'modify': '20200102000000000',
+        'charset': 'UTF-8',
+        'source': 'https://example.com/page.html',
+        'locked': True,
+    },
+    'item3': {
+        'type': 'note',
+        'create': '20200215000000000',
+        'source': 'https://user@Example.com:8080/',
+        'location': {'latitude': 0, 'longitude': 0},
+    },
+    'item4': {
+        'create': 'invalid',
+        'source': 'about:blank',
+    },
+}
+
+STATS = {
+    'count': 4,
+    'marked': 1,
+    'locked': 1,
+    'location': 1,
+    'type': {'': 2, 'folder': 1, 'note': 1},
+    'charset': {'': 3, 'UTF-8': 1},
+    'source_host': {'': 2, 'example.com': 2},
+    'create': {'202001': 2, '202002': 1},
+    'modify': {'202001': 1, '202003': 1},
+}
+
+
+@require_numpy()
+class TestMetaColumns(unittest.TestCase):
+    def test_build(self):
+        index = MetaColumns.build(dict(META, item5=None))
+        self.assertEqual(index.ids, ['item1', 'item2', 'item3', 'item4'])
+        self.assertEqual(index.dates['create'].tolist(), [
+            20200101000000000, 20200102000000000, 20200215000000000, MetaColumns.DATE_IRREGULAR])
+        self.assertEqual(index.dates['modify'].tolist(), [
+            20200301000000000, 20200102000000000, MetaColumns.DATE_MISSING, MetaColumns.DATE_MISSING])
+        self.assertEqual(index.flags['marked'].tolist(), [True, False, False, False])
+        self.assertEqual(index.flags['location'].tolist(), [False, False, True, False])
+        self.assertEqual(list(index.categories['type']), ['folder', '', 'note'])
+        self.assertEqual(index.codes['type'].tolist(), [0, 1, 2, 1])
+
+    def test_build_empty(self):
+        index = MetaColumns.build({})
+        self.assertEqual(index.ids, [])
+        self.assertEqual(index.get_ids(), set())
+        self.assertEqual(index.get_stats()['count'], 0)
+
+    def test_get_date_mask(self):
+        index = MetaColumns.build(META)
+        self.assertEqual(
+            index.get_ids(index.get_date_mask(
+                'create', [('20200101000000000', '20200131235959999')], [])),
+            {'item1', 'item2', 'item4'},
+        )
+        self.assertEqual(
+            index.get_ids(index.get_date_mask(
+                'create', [], [('20200102000000000', '20200102000000000')])),
+            {'item1', 'item3', 'item4'},
+        )
+        self.assertEqual(
+            index.get_ids(index.get_date_mask(
+                'modify', [('20200101000000000', '20200131235959999'),
+                           ('20200301000000000', '20200301000000000')], [])),
+            {'item1', 'item2'},
+        )
+
+    def test_get_flag_mask(self):
+        index = MetaColumns.build(META)
+        self.assertEqual(index.get_ids(index.get_flag_mask('marked', True, None)), {'item1'})
+        self.assertEqual(index.get_ids(index.get_flag_mask('marked', None, True)), {'item2', 'item3', 'item4'})
+
+    def test_get_category_mask(self):
+        index = MetaColumns.build(dict(META, item5={'type': 1}))
+        matcher = mock.Mock(side_effect=lambda value: value in ('', 'note'))
+        self.assertEqual(
+            index.get_ids(index.get_category_mask('type', matcher)),
+            {'item2', 'item3', 'item4', 'item5'},
+        )
+
+        # called once for each category other than a non-text one
+        self.assertEqual(matcher.call_args_list, [mock.call('folder'), mock.call(''), mock.call('note')])
+
+    def test_update(self):
+        index = MetaColumns.build(META)
+        meta = dict(META)
+        meta['item1'] = {'type': 'bookmark', 'create': '20200105000000000'}
+        meta['item5'] = {'type': 'note', 'marked': True}
+        del meta['item2']
+        index2 = index.update(meta, ['item1', 'item2', 'item5'])
+        self.assertIs(index2, index)
+        self.assertEqual(index.ids, ['item1', 'item2', 'item3', 'item4', 'item5'])
+        self.assertEqual(index.get_ids(), {'item1', 'item3', 'item4', 'item5'})
+        self.assertEqual(
+            index.get_ids(index.get_flag_mask('marked', True, None)),
+            {'item5'},
+        )
+        self.assertEqual(index.get_stats(), columns._get_meta_stats(meta))
+
+        # re-added
+        meta['item2'] = {'type': 'folder'}
+        index.update(meta, ['item2'])
+        self.assertEqual(index.ids, ['item1', 'item2', 'item3', 'item4', 'item5'])
+        self.assertEqual(index.get_stats(), columns._get_meta_stats(meta))
+
+    def test_copy(self):
+        index = MetaColumns.build(META)
+        stats = index.get_stats()
+        meta = dict(META)
+        meta['item1'] = {'type': 'bookmark', 'marked': True}
+        meta['item5'] = {'type': 'note'}
+        index2 = index.copy()
+        index2.update(meta, ['item1', 'item5'])
+        self.assertEqual(index2.get_stats(), columns._get_meta_stats(meta))
+        self.assertEqual(index.ids, ['item1', 'item2', 'item3', 'item4'])
+        self.assertEqual(index.get_stats(), stats)
+
+    def test_update_rebuild(self):
+        index = MetaColumns.build(META)
+        with mock.patch.object(MetaColumns, 'UPDATE_MAX', 1):
+            index2 = index.update(META, ['item1', 'item2'])
+        self.assertIsNot(index2, index)
+
+    def test_get_stats(self):
+        self.assertEqual(MetaColumns.build(META).get_stats(), STATS)
+
+
+class TestGetStats(TestBookMixin, unittest.TestCase):
+    def setUp(self):
+        self.test_root = tempfile.mkdtemp(dir=tmpdir)
+        self.init_book(self.test_root, meta=META)
+
+    def test_no_tree_cache(self):
+        book = Host(self.test_root).books['']
+        self.assertEqual(get_stats(book), STATS)
+
+    @require_numpy()
+    def test_tree_cache(self):
+        tree_cache = TreeCache(1024 * 1024)
+        book = Host(self.test_root, tree_cache=tree_cache).books['']
+        with mock.patch.object(MetaColumns, 'get_stats', autospec=True,
+                               side_effect=MetaColumns.get_stats) as mocked:
+            self.assertEqual(get_stats(book), STATS)
+        mocked.assert_called_once()
+
+        # updated for the saved files
+        book = Host(self.test_root, tree_cache=tree_cache).books['']
+        book.load_meta_files()
+        book.meta['item1']['marked'] = False
+        book.save_meta_files()
+
+        book = Host(self.test_root, tree_cache=tree_cache).books['']
+        self.assertEqual(get_stats(book), dict(STATS, marked=0))
+
+    def test_tree_cache_no_numpy(self):
+        tree_cache = TreeCache(1024 * 1024)
+        book = Host(self.test_root, tree_cache=tree_cache).books['']
+        with mock.patch('webscrapbook.scrapbook.columns.np', None):
+            self.assertEqual(get_stats(book), STATS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,845 @@
+import os
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+from webscrapbook import WSB_DIR
+from webscrapbook.scrapbook.fulltext import (
+    BloomFilter,
+    DateIndex,
+    ExactIndex,
+    FulltextIndex,
+    FulltextShards,
+    FulltextSummary,
+    TrigramIndex,
+    get_literal_trigrams,
+    get_regex_literals,
+    get_term_tokens,
+    get_tokens,
+    iter_tokens,
+    split_site,
+)
+from webscrapbook.scrapbook.host import Host, TreeCache
+
+from . import TEMP_DIR, TestBookMixin
+
+CONFIG_FULLTEXT_INDEX = """\
+[book ""]
+fulltext_index = true
+"""
+
+
+def setUpModule():
+    # set up a temp directory for testing
+    global _tmpdir, tmpdir
+    _tmpdir = tempfile.TemporaryDirectory(prefix='fulltext-', dir=TEMP_DIR)
+    tmpdir = os.path.realpath(_tmpdir.name)
+
+    # mock out user config
+    global mockings
+    mockings = (
+        mock.patch('webscrapbook.Config.user_config_dir', return_value=os.devnull),
+        mock.patch('webscrapbook.Config.user_config', return_value=os.devnull),
+    )
+    for mocking in mockings:
+        mocking.start()
+
+
+def tearDownModule():
+    # cleanup the temp directory
+    _tmpdir.cleanup()
+
+    # stop mock
+    for mocking in mockings:
+        mocking.stop()
+
+
+class TestIterTokens(unittest.TestCase):
+    def test_words(self):
+        self.assertEqual(
+            list(iter_tokens('Hello, World! foo_bar 123')),
+            ['hello', 'world', 'foo_bar', '123'],
+        )
+
+    def test_cjk(self):
+        self.assertEqual(
+            list(iter_tokens('中文字串 字 ひらがな')),
+            ['中文', '文字', '字串', '字', 'ひら', 'らが', 'がな'],
+        )
+
+    def test_mixed(self):
+        self.assertEqual(
+            list(iter_tokens('abc中文def')),
+            ['abc', '中文', 'def'],
+        )
+
+    def test_fold(self):
+        """Chars matching an ASCII letter case-insensitively are folded."""
+        self.assertEqual(
+            list(iter_tokens('İSTANBUL ſun')),
+            ['istanbul', 'sun'],
+        )
+
+
+class TestGetTokens(unittest.TestCase):
+    def test_basic(self):
+        text = 'Hello, World! 中文字串 字 abc中文def hello'
+        self.assertEqual(get_tokens(text), set(iter_tokens(text)))
+
+
+class TestGetTermTokens(unittest.TestCase):
+    def test_basic(self):
+        self.assertEqual(get_term_tokens('lorem ipsum dolor'), {'ipsum'})
+        self.assertEqual(get_term_tokens(' Lorem ipsum '), {'lorem', 'ipsum'})
+        self.assertEqual(get_term_tokens('ipsum'), set())
+
+    def test_cjk(self):
+        self.assertEqual(get_term_tokens('中文字'), {'中文', '文字'})
+
+
+class TestGetLiteralTrigrams(unittest.TestCase):
+    def test_basic(self):
+        self.assertEqual(get_literal_trigrams('Hello'), {'hel', 'ell', 'llo'})
+        self.assertEqual(get_literal_trigrams('ab'), set())
+
+    def test_case(self):
+        # chars that may match a non-folded char are skipped
+        self.assertEqual(get_literal_trigrams('aΣbcd'), {'bcd'})
+        self.assertEqual(get_literal_trigrams('aΣbcd', ignorecase=False), {'aσb', 'σbc', 'bcd'})
+
+
+class TestGetRegexLiterals(unittest.TestCase):
+    def check(self, pattern, expected, flags=0):
+        self.assertEqual(get_regex_literals(re.compile(pattern, flags)), expected)
+
+    def test_literal(self):
+        self.check(r'abc', ['abc'])
+        self.check(r'a\.b\+c', ['a.b+c'])
+        self.check(r'a{b', ['a{b'])
+
+    def test_unknown_parts(self):
+        self.check(r'ab.cd', ['ab', 'cd'])
+        self.check(r'^ab\dcd$', ['ab', 'cd'])
+        self.check(r'\bab\x41cd\b', ['ab', 'cd'])
+        self.check(r'ab[c\]d]ef', ['ab', 'ef'])
+        self.check(r'ab(c|d)ef', ['ab', 'ef'])
+        self.check(r'ab(?:[)]|d)ef', ['ab', 'ef'])
+
+    def test_quantifier(self):
+        self.check(r'ab*cd', ['a', 'cd'])
+        self.check(r'ab?cd', ['a', 'cd'])
+        self.check(r'ab*?cd', ['a', 'cd'])
+        self.check(r'ab{0,2}cd', ['a', 'cd'])
+        self.check(r'ab{,2}cd', ['a', 'cd'])
+        self.check(r'ab+cd', ['ab', 'cd'])
+        self.check(r'ab{2}cd', ['ab', 'cd'])
+        self.check(r'ab(cd)*ef', ['ab', 'ef'])
+
+    def test_flags(self):
+        self.check(r'(?i)abc', ['abc'])
+        self.check(r'(?x)abc', None)
+        self.check(r'abc', None, re.X)
+
+    def test_alternation(self):
+        self.check(r'ab|cd', None)
+
+
+class TestFulltextIndex(unittest.TestCase):
+    def build_index(self):
+        return FulltextIndex.build({
+            'item1': {
+                'index.html': {'content': 'Hello world. 中文字串'},
+            },
+            'item2': {
+                'index.html': {'content': 'Yellow words'},
+                'frame.html': {'content': '字串測試'},
+            },
+            'item3': {
+                'index.html': {'content': ''},
+            },
+            'item4': {},
+        })
+
+    def test_build(self):
+        index = self.build_index()
+        self.assertEqual(index.ids, ['item1', 'item2'])
+        self.assertEqual(index.docs, {'item1': 0, 'item2': 1})
+        self.assertEqual(list(index.postings['hello']), [0])
+        self.assertEqual(list(index.postings['字串']), [0, 1])
+
+    def test_get_candidates_word(self):
+        index = self.build_index()
+
+        # complete word
+        self.assertEqual(index.get_candidates(' hello '), {'item1'})
+        self.assertEqual(index.get_candidates(' ello '), set())
+
+        # partial word
+        self.assertEqual(index.get_candidates('ello'), {'item1', 'item2'})
+        self.assertEqual(index.get_candidates('hello'), {'item1'})
+        self.assertEqual(index.get_candidates(' wor'), {'item1', 'item2'})
+        self.assertEqual(index.get_candidates('rld '), {'item1'})
+        self.assertEqual(index.get_candidates('ld '), {'item1'})
+
+        # multiple words
+        self.assertEqual(index.get_candidates('ello wor'), {'item1'})
+        self.assertEqual(index.get_candidates('llow wor'), {'item2'})
+        self.assertEqual(index.get_candidates('lo world'), {'item1'})
+        self.assertEqual(index.get_candidates('llow world'), set())
+
+    def test_get_candidates_cjk(self):
+        index = self.build_index()
+        self.assertEqual(index.get_candidates('字串'), {'item1', 'item2'})
+        self.assertEqual(index.get_candidates('文字串'), {'item1'})
+        self.assertEqual(index.get_candidates('測'), {'item2'})
+        self.assertEqual(index.get_candidates('串測'), {'item2'})
+        self.assertEqual(index.get_candidates('串文'), set())
+
+    def test_get_candidates_case(self):
+        index = self.build_index()
+        self.assertEqual(index.get_candidates('HELLO'), {'item1'})
+        self.assertEqual(index.get_candidates('Hello'), {'item1'})
+
+    def test_get_candidates_unknown(self):
+        """Return None if the term has nothing to look up."""
+        index = self.build_index()
+        self.assertIsNone(index.get_candidates(''))
+        self.assertIsNone(index.get_candidates(' - '))
+
+        # chars that may match a non-folded char are not looked up
+        self.assertIsNone(index.get_candidates('Σ'))
+        self.assertEqual(index.get_candidates('Σ hello'), {'item1'})
+
+    @mock.patch('webscrapbook.scrapbook.fulltext.FulltextIndex.PARTIAL_TOKENS_MAX', 1)
+    def test_get_candidates_unselective(self):
+        """Skip a partial word matching too many tokens."""
+        index = self.build_index()
+        self.assertIsNone(index.get_candidates('o'))
+        self.assertEqual(index.get_candidates('o hello'), {'item1'})
+
+    def test_update(self):
+        index = self.build_index()
+        fulltext = {
+            'item1': {
+                'index.html': {'content': 'Goodbye world.'},
+            },
+            'item2': {
+                'index.html': {'content': 'Yellow words'},
+                'frame.html': {'content': '字串測試'},
+            },
+            'item5': {
+                'index.html': {'content': 'hello again'},
+            },
+        }
+        index = index.update(fulltext, ['item1', 'item5'])
+        self.assertEqual(index.ids, [None, 'item2', 'item1', 'item5'])
+        self.assertEqual(index.get_candidates('hello'), {'item5'})
+        self.assertEqual(index.get_candidates('goodbye'), {'item1'})
+        self.assertEqual(index.get_candidates('world'), {'item1'})
+
+        # removed
+        del fulltext['item5']
+        index = index.update(fulltext, ['item5'])
+        self.assertEqual(index.get_candidates('hello'), set())
+
+    def test_update_compact(self):
+        """Rebuild if too many removed documents are left."""
+        index = self.build_index()
+        fulltext = {
+            'item1': {
+                'index.html': {'content': 'Goodbye world.'},
+            },
+        }
+        index2 = index.update(fulltext, ['item1', 'item2'])
+        self.assertIsNot(index2, index)
+        self.assertEqual(index2.ids, ['item1'])
+        self.assertEqual(index2.get_candidates('world'), {'item1'})
+
+
+class TestTrigramIndex(unittest.TestCase):
+    def build_index(self):
+        return TrigramIndex.build({
+            'item1': {'title': 'Hello world', 'source': 'http://example.com/'},
+            'item2': {'title': 'Yellow', 'comment': 'Hello there'},
+            'item3': {'title': ''},
+            'item4': {},
+        })
+
+    def test_build(self):
+        index = self.build_index()
+        self.assertEqual(index.ids, ['item1', 'item2'])
+        self.assertEqual(list(index.postings['title']['llo']), [0, 1])
+        self.assertEqual(list(index.postings['comment']['llo']), [1])
+
+    def test_get_candidates(self):
+        index = self.build_index()
+        self.assertEqual(index.get_candidates('title', ['llo']), {'item1', 'item2'})
+        self.assertEqual(index.get_candidates('title', ['hello']), {'item1'})
+        self.assertEqual(index.get_candidates('title', ['HELLO']), {'item1'})
+        self.assertEqual(index.get_candidates('title', ['hel', 'wor']), {'item1'})
+        self.assertEqual(index.get_candidates('title', ['hello', 'yel']), set())
+        self.assertEqual(index.get_candidates('comment', ['hello']), {'item2'})
+        self.assertEqual(index.get_candidates('source', ['example.com']), {'item1'})
+        self.assertEqual(index.get_candidates('source', ['foo']), set())
+
+    def test_get_candidates_unknown(self):
+        """Return None if the literals have no trigram to look up."""
+        index = self.build_index()
+        self.assertIsNone(index.get_candidates('title', []))
+        self.assertIsNone(index.get_candidates('title', ['he', 'lo']))
+        self.assertEqual(index.get_candidates('title', ['he', 'wor']), {'item1'})
+
+    def test_update(self):
+        index = self.build_index()
+        meta = {
+            'item1': {'title': 'Goodbye world'},
+            'item2': {'title': 'Yellow', 'comment': 'Hello there'},
+            'item5': {'title': 'Hello again'},
+        }
+        index = index.update(meta, ['item1', 'item5'])
+        self.assertEqual(index.ids, [None, 'item2', 'item1', 'item5'])
+        self.assertEqual(index.get_candidates('title', ['hello']), {'item5'})
+        self.assertEqual(index.get_candidates('title', ['world']), {'item1'})
+        self.assertEqual(index.get_candidates('source', ['example']), set())
+
+    def test_copy(self):
+        index = self.build_index()
+        index2 = index.copy()
+        index2.update({'item1': {'title': 'Hello again'}}, ['item1', 'item2'])
+        self.assertEqual(index2.get_candidates('title', ['again']), {'item1'})
+        self.assertEqual(index2.get_candidates('title', ['yellow']), set())
+        self.assertEqual(index.ids, ['item1', 'item2'])
+        self.assertEqual(index.get_candidates('title', ['again']), set())
+        self.assertEqual(index.get_candidates('title', ['yellow']), {'item2'})
+
+    def test_update_compact(self):
+        """Rebuild if too many removed documents are left."""
+        index = self.build_index()
+        meta = {'item1': {'title': 'Goodbye world'}}
+        index2 = index.update(meta, ['item1', 'item2'])
+        self.assertIsNot(index2, index)
+        self.assertEqual(index2.ids, ['item1'])
+
+
+class TestTrigramIndexCache(TestBookMixin, unittest.TestCase):
+    def setUp(self):
+        self.test_root = tempfile.mkdtemp(dir=tmpdir)
+        self.init_book(self.test_root, meta={
+            'item1': {'title': 'Hello world'},
+            'item2': {'title': 'Yellow'},
+        })
+        self.tree_cache = TreeCache(1024 * 1024)
+
+    def get_book(self):
+        book = Host(self.test_root, tree_cache=self.tree_cache).books['']
+        book.load_meta_files()
+        return book
+
+    def test_load(self):
+        book = self.get_book()
+        index = TrigramIndex.load(book)
+        self.assertEqual(index.get_candidates('title', ['hello']), {'item1'})
+
+        # shared through the tree cache
+        self.assertIs(TrigramIndex.load(self.get_book()), index)
+
+    def test_load_no_cache(self):
+        book = Host(self.test_root).books['']
+        book.load_meta_files()
+        self.assertIsNone(TrigramIndex.load(book))
+
+    def test_load_dirty(self):
+        """Don't build an index from changed meta."""
+        book = self.get_book()
+        book.meta['item1']['title'] = 'Goodbye'
+        self.assertIsNone(TrigramIndex.load(book))
+
+    def test_load_outdated(self):
+        index = TrigramIndex.load(self.get_book())
+
+        book = self.get_book()
+        book.meta['item1']['title'] = 'Goodbye'
+        book.save_meta_files()
+
+        # a copy is updated for the saved files, and the shared one is kept
+        index2 = TrigramIndex.load(self.get_book())
+        self.assertIsNot(index2, index)
+        self.assertEqual(index2.get_candidates('title', ['hello']), set())
+        self.assertEqual(index2.get_candidates('title', ['goodbye']), {'item1'})
+        self.assertEqual(index.get_candidates('title', ['hello']), {'item1'})
+        self.assertEqual(index.get_candidates('title', ['goodbye']), set())
+
+        with mock.patch.object(TrigramIndex, 'build', side_effect=AssertionError):
+            self.assertIs(TrigramIndex.load(self.get_book()), index2)
+
+        # rebuilt if the files are changed otherwise
+        book = Host(self.test_root).books['']
+        book.load_meta_files()
+        book.meta['item2']['title'] = 'Goodbye'
+        book.save_meta_files()
+
+        index3 = TrigramIndex.load(self.get_book())
+        self.assertIsNot(index3, index)
+        self.assertEqual(index3.get_candidates('title', ['goodbye']), {'item1', 'item2'})
+
+
+class TestDateIndex(unittest.TestCase):
+    def build_index(self):
+        return DateIndex.build({
+            'item1': {'create': '20200101000000000', 'modify': '20200301000000000'},
+            'item2': {'create': '20200102000000000', 'modify': '20200102000000000'},
+            'item3': {'create': '20200101000000000'},
+            'item4': {'create': ''},
+            'item5': {},
+        })
+
+    def test_build(self):
+        index = self.build_index()
+        self.assertEqual(index.dates['create'], ['20200101000000000', '20200101000000000', '20200102000000000'])
+        self.assertEqual(index.ids['create'], ['item1', 'item3', 'item2'])
+        self.assertEqual(index.dates['modify'], ['20200102000000000', '20200301000000000'])
+        self.assertEqual(index.ids['modify'], ['item2', 'item1'])
+
+    def test_get_candidates(self):
+        index = self.build_index()
+        self.assertEqual(
+            index.get_candidates('create', '20200101000000000', '20200101000000000'),
+            {'item1', 'item3'},
+        )
+        self.assertEqual(
+            index.get_candidates('create', '20200101000000000', '20200102000000000'),
+            {'item1', 'item2', 'item3'},
+        )
+        self.assertEqual(
+            index.get_candidates('create', '20200101000000001', '99999999999999999'),
+            {'item2'},
+        )
+        self.assertEqual(
+            index.get_candidates('modify', '20200201000000000', '20200228000000000'),
+            set(),
+        )
+
+    def test_update(self):
+        index = self.build_index()
+        meta = {
+            'item1': {'create': '20200103000000000'},
+            'item2': {'create': '20200102000000000', 'modify': '20200102000000000'},
+            'item3': {'create': '20200101000000000'},
+            'item6': {'create': '20200101120000000'},
+        }
+        index2 = index.update(meta, ['item1', 'item6'])
+        self.assertIs(index2, index)
+        self.assertEqual(index.ids['create'], ['item3', 'item6', 'item2', 'item1'])
+        self.assertEqual(index.ids['modify'], ['item2'])
+        self.assertEqual(
+            index.get_candidates('create', '20200101000000000', '20200101235959999'),
+            {'item3', 'item6'},
+        )
+
+    def test_copy(self):
+        index = self.build_index()
+        index2 = index.copy()
+        index2.update({'item1': {'create': '20200103000000000'}}, ['item1'])
+        self.assertEqual(index2.ids['create'], ['item3', 'item2', 'item1'])
+        self.assertEqual(index2.ids['modify'], ['item2'])
+        self.assertEqual(index.ids['create'], ['item1', 'item3', 'item2'])
+        self.assertEqual(index.ids['modify'], ['item2', 'item1'])
+        self.assertEqual(index.dates['modify'], ['20200102000000000', '20200301000000000'])
+
+    def test_update_rebuild(self):
+        """Rebuild if too many items are changed."""
+        index = self.build_index()
+        meta = {'item1': {'create': '20200103000000000'}}
+        with mock.patch.object(DateIndex, 'UPDATE_MAX', 1):
+            index2 = index.update(meta, ['item1', 'item2'])
+        self.assertIsNot(index2, index)
+        self.assertEqual(index2.ids['create'], ['item1'])
+
+
+class TestDateIndexCache(TestBookMixin, unittest.TestCase):
+    def setUp(self):
+        self.test_root = tempfile.mkdtemp(dir=tmpdir)
+        self.init_book(self.test_root, meta={
+            'item1': {'create': '20200101000000000'},
+            'item2': {'create': '20200102000000000'},
+        })
+        self.tree_cache = TreeCache(1024 * 1024)
+
+    def get_book(self):
+        book = Host(self.test_root, tree_cache=self.tree_cache).books['']
+        book.load_meta_files()
+        return book
+
+    def test_load(self):
+        index = DateIndex.load(self.get_book())
+        self.assertEqual(index.ids['create'], ['item1', 'item2'])
+
+        # shared through the tree cache, separately from other indexes
+        self.assertIs(DateIndex.load(self.get_book()), index)
+        self.assertIsInstance(TrigramIndex.load(self.get_book()), TrigramIndex)
+
+    def test_load_outdated(self):
+        index = DateIndex.load(self.get_book())
+
+        book = self.get_book()
+        book.meta['item1']['create'] = '20200103000000000'
+        book.save_meta_files()
+
+        # a copy is updated for the saved files, and the shared one is kept
+        index2 = DateIndex.load(self.get_book())
+        self.assertIsNot(index2, index)
+        self.assertEqual(index2.ids['create'], ['item2', 'item1'])
+        self.assertEqual(index.ids['create'], ['item1', 'item2'])
+
+
+class TestSplitSite(unittest.TestCase):
+    def test_basic(self):
+        self.assertEqual(split_site('HTTPS://user@WWW.Example.com:8080/Path?q=1#frag'),
+                         ('https', 'www.example.com', '/Path?q=1'))
+        self.assertEqual(split_site('http://example.com'), ('http', 'example.com', ''))
+        self.assertEqual(split_site('file:///path/to/file'), ('file', '', '/path/to/file'))
+        self.assertEqual(split_site('about:blank'), ('about', '', 'blank'))
+
+    def test_bad(self):
+        self.assertIsNone(split_site('http://[example.com'))
+
+
+class TestExactIndex(unittest.TestCase):
+    META = {
+        'item1': {
+            'type': 'folder',
+        },
+        'item2': {
+            'index': 'item2/index.HTML',
+            'charset': 'UTF-8',
+            'source': 'https://www.example.com/page.html',
+        },
+        'item3': {
+            'index': 'item3.htz',
+            'type': 'Note',
+            'source': 'http://example.com/',
+        },
+        'item4': {
+            'index': 'item4.v1.maff',
+            'type': ['bad'],
+            'source': 'about:blank',
+        },
+        'Item5': {
+            'index': 'item5.d/index',
+        },
+    }
+
+    def test_build(self):
+        index = ExactIndex.build(dict(self.META, item6=None))
+        self.assertEqual(index.values['id'], {
+            'item1': {'item1'}, 'item2': {'item2'}, 'item3': {'item3'},
+            'item4': {'item4'}, 'item5': {'Item5'},
+        })
+        self.assertEqual(index.values['type'], {
+            'folder': {'item1'}, '': {'item2', 'Item5'}, 'Note': {'item3'}, None: {'item4'},
+        })
+        self.assertEqual(index.values['ext'], {
+            '': {'item1'}, '.html': {'item2'}, '.htz': {'item3'}, None: {'item4', 'Item5'},
+        })
+        self.assertEqual(index.values['host'], {
+            '': {'item1', 'item4', 'Item5'}, 'www.example.com': {'item2'}, 'example.com': {'item3'},
+        })
+
+    def test_get_candidates(self):
+        index = ExactIndex.build(self.META)
+        self.assertEqual(index.get_candidates('type', lambda value: value == 'folder'), {'item1', 'item4'})
+        self.assertEqual(index.get_candidates('charset', lambda value: 'utf' in value.lower()), {'item2'})
+
+    def test_get_id_candidates(self):
+        index = ExactIndex.build(self.META)
+        self.assertEqual(index.get_id_candidates('ITEM5'), {'Item5'})
+        self.assertEqual(index.get_id_candidates('item'), set())
+        self.assertIsNone(index.get_id_candidates('item\n5'))
+        self.assertIsNone(index.get_id_candidates('ítem5'))
+
+    def test_get_ext_candidates(self):
+        index = ExactIndex.build(self.META)
+        self.assertEqual(index.get_ext_candidates('.htm'), {'item2', 'item4', 'Item5'})
+        self.assertEqual(index.get_ext_candidates('.HTZ'), {'item3', 'item4', 'Item5'})
+        self.assertIsNone(index.get_ext_candidates('htz'))
+
+    def test_update(self):
+        index = ExactIndex.build(self.META)
+        meta = dict(self.META)
+        meta['item1'] = {'type': 'bookmark'}
+        meta['item6'] = {'type': 'folder'}
+        del meta['item3']
+        index2 = index.update(meta, ['item1', 'item3', 'item6'])
+        self.assertIs(index2, index)
+        self.assertEqual(index.values['type'], {
+            'bookmark': {'item1'}, 'folder': {'item6'}, '': {'item2', 'Item5'}, None: {'item4'},
+        })
+        self.assertNotIn('item3', index.values['id'])
+        self.assertNotIn('example.com', index.values['host'])
+        self.assertEqual(index.values['ext'], {
+            '': {'item1', 'item6'}, '.html': {'item2'}, None: {'item4', 'Item5'},
+        })
+
+    def test_copy(self):
+        index = ExactIndex.build(self.META)
+        index2 = index.copy()
+        index2.update({'item1': {'type': 'bookmark'}}, ['item1', 'item3'])
+        self.assertEqual(index2.values['type'], {
+            'bookmark': {'item1'}, '': {'item2', 'Item5'}, None: {'item4'},
+        })
+        self.assertEqual(index.values['type'], {
+            'folder': {'item1'}, '': {'item2', 'Item5'}, 'Note': {'item3'}, None: {'item4'},
+        })
+        self.assertEqual(index.values['host']['example.com'], {'item3'})
+
+
+class TestSaveLoad(TestBookMixin, unittest.TestCase):
+    def setUp(self):
+        self.test_root = tempfile.mkdtemp(dir=tmpdir)
+        self.test_tree = os.path.join(self.test_root, WSB_DIR, 'tree')
+        os.makedirs(self.test_tree)
+
+    def test_save_load(self):
+        book = self.init_book(self.test_root, fulltext={
+            'item1': {
+                'index.html': {'content': 'Hello world.'},
+            },
+        })
+        FulltextIndex.build(book.fulltext).save(book)
+        self.assertTrue(os.path.isfile(os.path.join(self.test_tree, 'fulltext.idx')))
+
+        index = FulltextIndex.load(book)
+        self.assertEqual(index.ids, ['item1'])
+        self.assertEqual(index.get_candidates('hello'), {'item1'})
+
+    def test_load_missing(self):
+        book = self.init_book(self.test_root, fulltext={})
+        self.assertIsNone(FulltextIndex.load(book))
+
+    def test_load_outdated(self):
+        """Return None if fulltext files are changed after saving."""
+        book = self.init_book(self.test_root, fulltext={
+            'item1': {
+                'index.html': {'content': 'Hello world.'},
+            },
+        })
+        index = FulltextIndex.build(book.fulltext)
+        index.save(book)
+
+        book.fulltext['item1']['index.html']['content'] = 'Goodbye world.'
+        book.save_fulltext_files()
+        self.assertIsNone(FulltextIndex.load(book))
+
+        # revalidate
+        index.save_signature(book)
+        self.assertIsNotNone(FulltextIndex.load(book))
+
+    def test_load_outdated_index(self):
+        """Return None if the index file is changed after saving."""
+        book = self.init_book(self.test_root, fulltext={})
+        FulltextIndex.build(book.fulltext).save(book)
+        with open(os.path.join(self.test_tree, 'fulltext.idx'), 'ab') as fh:
+            fh.write(b'\0')
+        self.assertIsNone(FulltextIndex.load(book))
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_basic(self):
+        bloom = BloomFilter.build(['hello', 'world'])
+        self.assertIn('hello', bloom)
+        self.assertIn('world', bloom)
+        self.assertNotIn('goodbye', bloom)
+        self.assertEqual(bloom.count, 2)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter.build(f'word{i}' for i in range(2000))
+        self.assertTrue(all(f'word{i}' in bloom for i in range(2000)))
+        positives = sum(f'other{i}' in bloom for i in range(10000))
+        self.assertLess(positives, 100)
+
+    def test_is_full(self):
+        bloom = BloomFilter(10)
+        self.assertEqual(bloom.capacity, BloomFilter.MIN_CAPACITY)
+        bloom.update(str(i) for i in range(BloomFilter.MIN_CAPACITY * 2))
+        self.assertFalse(bloom.is_full)
+        bloom.add('x')
+        self.assertTrue(bloom.is_full)
+
+    def test_dump_load(self):
+        bloom = BloomFilter.build(['hello'])
+        bloom2 = BloomFilter.load(bloom.dump())
+        self.assertIn('hello', bloom2)
+        self.assertNotIn('world', bloom2)
+        self.assertEqual(bloom2.count, 1)
+
+
+class TestFulltextSummary(TestBookMixin, unittest.TestCase):
+    def setUp(self):
+        self.test_root = tempfile.mkdtemp(dir=tmpdir)
+        self.test_tree = os.path.join(self.test_root, WSB_DIR, 'tree')
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_FULLTEXT_THRESHOLD', 10)
+    def init_book_shards(self, config=CONFIG_FULLTEXT_INDEX):
+        return self.init_book(self.test_root, config=config, fulltext={
+            'item1': {
+                'index.html': {'content': 'Hello world.'},
+                'frame.html': {'content': 'Frame content.'},
+            },
+            'item2': {
+                'index.html': {'content': 'Goodbye world.'},
+            },
+        })
+
+    def test_build_shard(self):
+        sig, files, bloom = FulltextSummary.build_shard((1, 2, 3), {
+            'item1': {'index.html': {'content': 'Hello world.'}},
+            'item2': None,
+        })
+        self.assertEqual(sig, (1, 2, 3))
+        self.assertEqual(files, {'item1': ['index.html'], 'item2': None})
+        self.assertIn('hello', bloom)
+        self.assertNotIn('goodbye', bloom)
+
+        _, _, bloom = FulltextSummary.build_shard((1, 2, 3), {}, bloom=False)
+        self.assertIsNone(bloom)
+
+    def test_shard_map(self):
+        summary = FulltextSummary([
+            ((1,), {'item1': ['index.html'], 'item2': ['index.html']}, None),
+            ((2,), {'item1': ['index2.html'], 'item2': None}, None),
+        ])
+        self.assertEqual(summary.shard_map, {'item1': 1})
+        self.assertEqual(summary.get_files('item1'), ['index2.html'])
+        self.assertIsNone(summary.get_files('item2'))
+
+    def test_get_candidates(self):
+        summary = FulltextSummary([
+            FulltextSummary.build_shard((1,), {'item1': {'index.html': {'content': 'Hello world.'}}}),
+            FulltextSummary.build_shard((2,), {'item2': {'index.html': {'content': 'Goodbye world.'}}}),
+            FulltextSummary.build_shard((3,), {'item3': {'index.html': {'content': 'Goodbye.'}}}, bloom=False),
+        ])
+        self.assertEqual(summary.get_candidates({'hello', 'world'}), {'item1', 'item3'})
+        self.assertEqual(summary.get_candidates({'world'}), {'item1', 'item2', 'item3'})
+        self.assertEqual(summary.get_candidates({'other'}), {'item3'})
+
+    def test_save(self):
+        """Taken when the fulltext files are saved."""
+        book = self.init_book_shards()
+        self.assertTrue(os.path.isfile(os.path.join(self.test_tree, 'fulltext.sum')))
+
+        summary = FulltextSummary.load(book)
+        self.assertEqual(summary.signature, book.get_tree_files_signature('fulltext'))
+        self.assertEqual(len(summary.shards), 2)
+        self.assertEqual(summary.get_files('item1'), ['index.html', 'frame.html'])
+        self.assertEqual(summary.get_candidates({'hello'}), {'item1'})
+        self.assertEqual(summary.get_candidates({'goodbye'}), {'item2'})
+
+    def test_save_no_bloom(self):
+        """Don't build the Bloom filters without fulltext_index."""
+        with mock.patch('webscrapbook.scrapbook.fulltext.BloomFilter.build') as mocked:
+            book = self.init_book_shards(config=None)
+        mocked.assert_not_called()
+
+        summary = FulltextSummary.load(book)
+        self.assertEqual(summary.signature, book.get_tree_files_signature('fulltext'))
+        self.assertEqual([bloom for _, _, bloom in summary.shards], [None, None])
+        self.assertEqual(summary.get_files('item1'), ['index.html', 'frame.html'])
+        self.assertEqual(summary.get_candidates({'hello'}), {'item1', 'item2'})
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_FULLTEXT_THRESHOLD', 10)
+    def test_update(self):
+        """Only the Bloom filter of a rewritten file is updated."""
+        self.init_book_shards()
+        book = Host(self.test_root).books['']
+        book.load_fulltext_files()
+        book.fulltext['item2'] = {'index.html': {'content': 'Goodnight moon.'}}
+        with mock.patch.object(FulltextSummary, 'build_shard', autospec=True,
+                               side_effect=FulltextSummary.build_shard) as mocked:
+            book.save_fulltext_files()
+
+        summary = FulltextSummary.load(book)
+        self.assertEqual(summary.signature, book.get_tree_files_signature('fulltext'))
+        self.assertEqual(summary.get_candidates({'goodnight'}), {'item2'})
+        self.assertEqual(summary.get_candidates({'hello'}), {'item1'})
+        mocked.assert_called_once_with(mock.ANY, mock.ANY, bloom=False)
+
+    def test_load_missing(self):
+        book = self.init_book(self.test_root)
+        self.assertEqual(FulltextSummary.load(book).shards, [])
+
+    def test_load_broken(self):
+        book = self.init_book(self.test_root, fulltext={})
+        with open(os.path.join(self.test_tree, 'fulltext.sum'), 'wb') as fh:
+            fh.write(b'\0')
+        self.assertEqual(FulltextSummary.load(book).shards, [])
+
+    def test_load_cache(self):
+        self.init_book_shards()
+        tree_cache = TreeCache(1024 * 1024)
+        summary = FulltextSummary.load(Host(self.test_root, tree_cache=tree_cache).books[''])
+        self.assertIs(FulltextSummary.load(Host(self.test_root, tree_cache=tree_cache).books['']), summary)
+
+
+class TestFulltextShards(TestBookMixin, unittest.TestCase):
+    def setUp(self):
+        self.test_root = tempfile.mkdtemp(dir=tmpdir)
+        self.test_tree = os.path.join(self.test_root, WSB_DIR, 'tree')
+
+    @mock.patch('webscrapbook.scrapbook.book.Book.SAVE_FULLTEXT_THRESHOLD', 10)
+    def init_book_shards(self):
+        return self.init_book(self.test_root, config=CONFIG_FULLTEXT_INDEX, fulltext={
+            'item1': {'index.html': {'content': 'Hello world.'}},
+            'item2': {'index.html': {'content': 'Goodbye world.'}},
+        })
+
+    def test_get(self):
+        """Load only the fulltext file having the item."""
+        self.init_book_shards()
+        book = Host(self.test_root).books['']
+        with mock.patch.object(book, 'load_fulltext_file', wraps=book.load_fulltext_file) as mocked:
+            fulltext = FulltextShards.load(book)
+            self.assertEqual(fulltext.get_files('item2'), ['index.html'])
+            mocked.assert_not_called()
+
+            self.assertEqual(fulltext.get('item2'), {'index.html': {'content': 'Goodbye world.'}})
+            self.assertIsNone(fulltext.get('item3'))
+            mocked.assert_called_once_with(1)
+
+    def test_load_outdated(self):
+        """Take the summary of a changed file by loading it."""
+        self.init_book_shards()
+        with open(os.path.join(self.test_tree, 'fulltext1.js'), 'w', encoding='UTF-8') as fh:
+            fh.write('scrapbook.fulltext({"item3": {"index.html": {"content": "Moon"}}})')
+
+        book = Host(self.test_root).books['']
+        with mock.patch.object(book, 'load_fulltext_file', wraps=book.load_fulltext_file) as mocked:
+            fulltext = FulltextShards.load(book)
+            mocked.assert_called_once_with(1)
+
+            self.assertEqual(fulltext.get('item3'), {'index.html': {'content': 'Moon'}})
+            self.assertIsNone(fulltext.get('item2'))
+            mocked.assert_called_once_with(1)
+
+        # the taken summary has no Bloom filter for the changed file
+        self.assertEqual(fulltext.summary.signature, book.get_tree_files_signature('fulltext'))
+        self.assertIsNotNone(fulltext.summary.shards[0][2])
+        self.assertIsNone(fulltext.summary.shards[1][2])
+
+        # the saved summary is not touched
+        with mock.patch.object(FulltextSummary, 'save') as mocked:
+            FulltextShards.load(book)
+        mocked.assert_not_called()
+        self.assertNotEqual(FulltextSummary.load(book).signature, book.get_tree_files_signature('fulltext'))
+
+    def test_load_missing_summary(self):
+        self.init_book_shards()
+        os.remove(os.path.join(self.test_tree, 'fulltext.sum'))
+        book = Host(self.test_root).books['']
+        fulltext = FulltextShards.load(book)
+        self.assertEqual(fulltext.get('item1'), {'index.html': {'content': 'Hello world.'}})
+        self.assertEqual(fulltext.get('item2'), {'index.html': {'content': 'Goodbye world.'}})
+
+
+if __name__ == '__main__':
+    unittest.main()
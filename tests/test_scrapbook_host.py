@@ -727,5 +727,65 @@ class TestFileLock(TestBase):
                     break
 
 
+class TestTreeCache(TestBase):
+    def test_get_signature(self):
+        test_file = os.path.join(self.test_root, 'meta.js')
+        with open(test_file, 'w', encoding='UTF-8') as fh:
+            fh.write('abc')
+        st = os.stat(test_file)
+
+        self.assertEqual(
+            wsb_host.TreeCache.get_signature(test_file),
+            (3, st.st_mtime_ns, st.st_ino),
+        )
+
+    def test_get_set(self):
+        cache = wsb_host.TreeCache(100)
+        self.assertIsNone(cache.get('meta.js', (10, 1, 1)))
+
+        cache.set('meta.js', (10, 1, 1), {'id': {}})
+        self.assertEqual(cache.get('meta.js', (10, 1, 1)), {'id': {}})
+        self.assertEqual(cache.size, 10)
+
+    def test_get_stale(self):
+        """Stale entry should be dropped."""
+        cache = wsb_host.TreeCache(100)
+        cache.set('meta.js', (10, 1, 1), {'id': {}})
+
+        self.assertIsNone(cache.get('meta.js', (10, 2, 1)))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+    def test_set_evict(self):
+        """Least recently used entries should be evicted when oversized."""
+        cache = wsb_host.TreeCache(100)
+        cache.set('meta.js', (40, 1, 1), {'id1': {}})
+        cache.set('toc.js', (40, 1, 2), {'id2': []})
+        cache.get('meta.js', (40, 1, 1))
+        cache.set('fulltext.js', (40, 1, 3), {'id3': {}})
+
+        self.assertEqual(cache.get('meta.js', (40, 1, 1)), {'id1': {}})
+        self.assertIsNone(cache.get('toc.js', (40, 1, 2)))
+        self.assertEqual(cache.get('fulltext.js', (40, 1, 3)), {'id3': {}})
+        self.assertEqual(cache.size, 80)
+
+    def test_set_oversized(self):
+        """An entry larger than max_size should not be cached."""
+        cache = wsb_host.TreeCache(100)
+        cache.set('meta.js', (101, 1, 1), {'id1': {}})
+
+        self.assertIsNone(cache.get('meta.js', (101, 1, 1)))
+        self.assertEqual(cache.size, 0)
+
+    def test_discard(self):
+        cache = wsb_host.TreeCache(100)
+        cache.set('meta.js', (10, 1, 1), {'id': {}})
+        cache.discard('meta.js')
+        cache.discard('toc.js')
+
+        self.assertIsNone(cache.get('meta.js', (10, 1, 1)))
+        self.assertEqual(cache.size, 0)
+
+
 if __name__ == '__main__':
     unittest.main()
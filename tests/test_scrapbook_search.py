@@ -6,8 +6,11 @@ from datetime import datetime, timezone
 from unittest import mock
 
 from webscrapbook.scrapbook import search
+from webscrapbook.scrapbook.book import Book
+from webscrapbook.scrapbook.fulltext import FulltextIndex
+from webscrapbook.scrapbook.host import Host, TreeCache
 
-from . import TEMP_DIR, TestBookMixin
+from . import TEMP_DIR, TestBookMixin, require_numpy
 
 
 def setUpModule():
@@ -529,6 +532,23 @@ class TestQuery(unittest.TestCase):
                 f'{dt.hour:0>2}{dt.minute:0>2}{dt.second:0>2}'
                 f'{(dt.microsecond // 1000):0>3}')
 
+    def test_syntax_cmd_site(self):
+        query = search.Query('site:Example.com site:https://example.com:8080/Docs/?a=1 -site:file://')
+        self.assertEqual(query.rules, {
+            'site': {
+                'include': [
+                    search.Site('', 'example.com', ''),
+                    search.Site('https', 'example.com', '/Docs/?a=1'),
+                ],
+                'exclude': [
+                    search.Site('file', '', ''),
+                ],
+            },
+        })
+
+        with self.assertRaises(ValueError):
+            query = search.Query('site:http://[example.com')
+
     def test_syntax_cmd_date(self):
         fields = ('create', 'modify')
         for field in fields:
@@ -766,6 +786,16 @@ class TestQuery(unittest.TestCase):
         query = search.Query('limit:5 -limit:')
         self.assertEqual(query.limit, -1)
 
+    def test_syntax_cmd_explain(self):
+        query = search.Query('explain:')
+        self.assertTrue(query.explain)
+
+        query = search.Query('explain: -explain:')
+        self.assertFalse(query.explain)
+
+        query = search.Query('foo')
+        self.assertFalse(query.explain)
+
     def test_match_item(self):
         item = search.Item(
             book_id='',
@@ -797,6 +827,63 @@ class TestQuery(unittest.TestCase):
                     query.match_item(item)
                 mocked.assert_called_once_with(query.rules[cmd], item)
 
+    def test_plan_rules(self):
+        query = search.Query('content:foo title:bar type:note marked: create:2020')
+        self.assertEqual([k for k, _ in query.item_rules], ['marked', 'create', 'type', 'title'])
+        self.assertEqual([k for k, _ in query.file_rules], ['content'])
+
+        # more terms cost more
+        query = search.Query('title:a title:b title:c -title:d comment:e')
+        self.assertEqual([k for k, _ in query.item_rules], ['comment', 'title'])
+
+        # the default rule depends on the default fields
+        query = search.Query('foo comment:bar')
+        self.assertEqual([k for k, _ in query.item_rules], ['comment'])
+        self.assertEqual([k for k, _ in query.file_rules], [None])
+
+        query = search.Query('default:title,source foo comment:bar')
+        self.assertEqual([k for k, _ in query.item_rules], [None, 'comment'])
+        self.assertEqual([k for k, _ in query.file_rules], [])
+
+    def test_copy(self):
+        query = search.Query('book:book1 root:20200101000000000 foo')
+        query.hints['book1'] = {}
+        query2 = query.copy()
+        self.assertIs(query2.rules, query.rules)
+        self.assertEqual(query2.books, query.books)
+        self.assertIsNot(query2.books['include'], query.books['include'])
+        self.assertEqual(query2.roots, query.roots)
+        self.assertIsNot(query2.roots['include'], query.roots['include'])
+        self.assertEqual(query2.hints, {})
+
+    def test_get_key(self):
+        self.assertEqual(
+            search.Query('foo  title:bar -sort:id').get_key(),
+            search.Query('title:bar foo -sort:id').get_key(),
+        )
+        self.assertNotEqual(
+            search.Query('f.o').get_key(),
+            search.Query('re: f.o').get_key(),
+        )
+        self.assertNotEqual(
+            search.Query('foo').get_key(),
+            search.Query('mc: foo').get_key(),
+        )
+        self.assertNotEqual(
+            search.Query('foo').get_key(),
+            search.Query('foo limit:1').get_key(),
+        )
+        self.assertNotEqual(
+            search.Query('foo').get_key(),
+            search.Query('foo book:book1').get_key(),
+        )
+
+        # patterns longer than the repr limit should not collide
+        self.assertNotEqual(
+            search.Query('re: ' + 'a' * 300 + 'b').get_key(),
+            search.Query('re: ' + 'a' * 300 + 'c').get_key(),
+        )
+
     def test_match_item_default(self):
         rule = {}
 
@@ -909,6 +996,23 @@ class TestQuery(unittest.TestCase):
             search.Query._match_type(rule, item)
         mocked.assert_called_once_with(rule, None)
 
+    def test_match_item_site(self):
+        rule = {}
+
+        item = search.Item(
+            book_id='',
+            id='20200101000000000',
+            file='',
+            meta={
+                'source': 'http://example.com',
+            },
+            fulltext={},
+            context={},
+        )
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_site_or') as mocked:
+            search.Query._match_site(rule, item)
+        mocked.assert_called_once_with(rule, 'http://example.com')
+
     def test_match_item_meta_text(self):
         for cmd in ('title', 'comment', 'source', 'index'):
             with self.subTest(cmd=cmd):
@@ -1028,6 +1132,60 @@ class TestQuery(unittest.TestCase):
         self.assertFalse(search.Query.match_text(rule, 'foo bar xyzzy'))
         self.assertFalse(search.Query.match_text(rule, 'foo bar baz xyzzy'))
 
+    def test_match_text_plain(self):
+        """Plain text terms are found with a substring search."""
+        rule = search.Query('ab bc -cd').rules[None]
+        with mock.patch('webscrapbook.scrapbook.search._fold', side_effect=search._fold) as mocked:
+            self.assertTrue(search.Query.match_text(rule, 'xABCx'))
+            self.assertTrue(search.Query.match_text(rule, 'bcab'))
+            self.assertFalse(search.Query.match_text(rule, 'abc bcd'))
+            self.assertFalse(search.Query.match_text(rule, 'ab'))
+        mocked.assert_called_with('ab')
+
+        # chars matching an ASCII letter case-insensitively
+        rule = search.Query('sky').rules[None]
+        self.assertTrue(search.Query.match_text(rule, 'ſKY'))
+
+        rule = search.Query('mc: Sky').rules[None]
+        self.assertTrue(search.Query.match_text(rule, 'Sky'))
+        self.assertFalse(search.Query.match_text(rule, 'sky'))
+
+        # non-foldable and regex terms are searched as a regex
+        for query_text in ('σ', 're: a.c'):
+            with self.subTest(query=query_text):
+                rule = search.Query(query_text).rules[None]
+                self.assertIsNone(search._get_plain_term(rule['include'][0]))
+
+        rule = search.Query('σ').rules[None]
+        self.assertTrue(search.Query.match_text(rule, 'Σ'))
+        self.assertTrue(search.Query.match_text(rule, 'ς'))
+
+    def test_match_text_plain_fold_memo(self):
+        """Folded texts are memoized only while matching an item."""
+        rule = search.Query('ab bc -cd').rules[None]
+        with mock.patch('webscrapbook.scrapbook.search.fold', side_effect=search.fold) as mocked:
+            self.assertTrue(search.Query.match_text(rule, 'xABCx'))
+        self.assertEqual(mocked.call_count, 3)
+
+        memo = {}
+        with mock.patch('webscrapbook.scrapbook.search.fold', side_effect=search.fold) as mocked:
+            self.assertTrue(search._match_folding(memo, search.Query.match_text, rule, 'xABCx'))
+            self.assertTrue(search._match_folding(memo, search.Query.match_text, rule, 'xABCx'))
+        mocked.assert_called_once_with('xABCx')
+        self.assertEqual(memo, {'xABCx': 'xabcx'})
+        self.assertIsNone(search._fold_memo.value)
+
+    def test_get_plain_term(self):
+        self.assertEqual(search._get_plain_term(re.compile('Foo', re.I)), ('foo', True))
+        self.assertEqual(search._get_plain_term(re.compile('Foo')), ('Foo', False))
+        self.assertEqual(search._get_plain_term(re.compile(re.escape('a.b (c)'), re.I)), ('a.b (c)', True))
+        self.assertEqual(search._get_plain_term(re.compile('中文', re.I)), ('中文', True))
+        self.assertIsNone(search._get_plain_term(re.compile('a.b', re.I)))
+        self.assertIsNone(search._get_plain_term(re.compile('^foo$', re.I)))
+        self.assertIsNone(search._get_plain_term(re.compile('', re.I)))
+        self.assertIsNone(search._get_plain_term(re.compile('café', re.I)))
+        self.assertEqual(search._get_plain_term(re.compile('café')), ('café', False))
+
     def test_match_text_or(self):
         rule = {
             'include': [
@@ -1065,6 +1223,40 @@ class TestQuery(unittest.TestCase):
         self.assertFalse(search.Query.match_text_or(rule, 'foo bar xyzzy'))
         self.assertFalse(search.Query.match_text_or(rule, 'foo bar baz xyzzy'))
 
+    def test_match_site_or(self):
+        rule = {
+            'include': [
+                search.Site('', 'example.com', ''),
+                search.Site('https', 'example.org', '/docs/'),
+            ],
+            'exclude': [
+                search.Site('', 'private.example.com', ''),
+            ],
+        }
+        self.assertFalse(search.Query.match_site_or(rule, None))
+        self.assertFalse(search.Query.match_site_or(rule, ''))
+        self.assertFalse(search.Query.match_site_or(rule, {'url': 'http://example.com'}))
+        self.assertTrue(search.Query.match_site_or(rule, 'http://example.com'))
+        self.assertTrue(search.Query.match_site_or(rule, 'https://user@WWW.Example.com:8080/page'))
+        self.assertFalse(search.Query.match_site_or(rule, 'http://badexample.com/'))
+        self.assertFalse(search.Query.match_site_or(rule, 'http://private.example.com/'))
+        self.assertFalse(search.Query.match_site_or(rule, 'http://a.private.example.com/'))
+        self.assertTrue(search.Query.match_site_or(rule, 'https://example.org/docs/page'))
+        self.assertFalse(search.Query.match_site_or(rule, 'http://example.org/docs/page'))
+        self.assertFalse(search.Query.match_site_or(rule, 'https://example.org/Docs/page'))
+        self.assertFalse(search.Query.match_site_or(rule, 'http://[example.com/'))
+
+        # include anything if not set
+        rule = {
+            'include': [],
+            'exclude': [
+                search.Site('', '', ''),
+            ],
+        }
+        self.assertFalse(search.Query.match_site_or(rule, None))
+        self.assertFalse(search.Query.match_site_or(rule, 'about:blank'))
+        self.assertTrue(search.Query.match_site_or(rule, 'http://example.com'))
+
     def test_match_bool(self):
         rule = {'include': True}
         self.assertFalse(search.Query.match_bool(rule, None))
@@ -1280,6 +1472,41 @@ class TestQuery(unittest.TestCase):
                     expected,
                 )
 
+    def test_get_snippet_hits(self):
+        input = """Praesent sagittis vitae enim sed luctus. Duis egestas molestie leo, a hendrerit nulla ultrices eget."""
+        query = search.Query('re: content:mol.stie content:hendrerit content:sagittis')
+        key1, key2, key3 = query.rules['content']['include']
+
+        # recorded hits are not searched again
+        with mock.patch('webscrapbook.scrapbook.search._find_key', wraps=search._find_key) as mocked:
+            self.assertEqual(
+                query.get_snippet(input, 'content', 30, hits={key1: 54, key2: 70, key3: None}),
+                """egestas <mark class="kw0">molestie</mark> leo, a hendr…""",
+            )
+        self.assertNotIn(mock.call(key1, input), mocked.call_args_list)
+        self.assertNotIn(mock.call(key2, input), mocked.call_args_list)
+        self.assertNotIn(mock.call(key3, input), mocked.call_args_list)
+
+        # keys not recorded are searched
+        self.assertEqual(
+            query.get_snippet(input, 'content', 30, hits={key1: 54}),
+            """raesent <mark class="kw2">sagittis</mark> vitae enim s…""",
+        )
+
+    def test_match_text_hits(self):
+        query = search.Query('re: content:fo+ content:bar')
+        rule = query.rules['content']
+        key1, key2 = rule['include']
+
+        hits = {}
+        self.assertTrue(query.match_text(rule, 'my foo and bar', hits))
+        self.assertEqual(hits, {key1: 3, key2: 11})
+
+        # stop at the first key not found
+        hits = {}
+        self.assertFalse(query.match_text(rule, 'my bar and bar', hits))
+        self.assertEqual(hits, {key1: None})
+
 
 class TestSearch(TestBookMixin, unittest.TestCase):
     def setUp(self):
@@ -1691,6 +1918,113 @@ no_tree = true
             ),
         ])
 
+    def test_search_sort_multiple(self):
+        """A later sort takes precedence."""
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {'type': 'note', 'title': 'b'},
+                '20200102000000000': {'type': '', 'title': 'a'},
+                '20200103000000000': {'type': 'note', 'title': 'a'},
+                '20200104000000000': {'type': '', 'title': 'b'},
+                '20200105000000000': {'type': 'note', 'title': 'a'},
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                    '20200103000000000',
+                    '20200104000000000',
+                    '20200105000000000',
+                ],
+            },
+        )
+
+        for query_text, expected in (
+            ('sort:title sort:type', [
+                '20200102000000000', '20200104000000000',
+                '20200103000000000', '20200105000000000', '20200101000000000',
+            ]),
+            ('-sort:title sort:type', [
+                '20200104000000000', '20200102000000000',
+                '20200101000000000', '20200103000000000', '20200105000000000',
+            ]),
+            ('sort:title -sort:type', [
+                '20200103000000000', '20200105000000000', '20200101000000000',
+                '20200102000000000', '20200104000000000',
+            ]),
+            ('-sort:title -sort:type', [
+                '20200101000000000', '20200103000000000', '20200105000000000',
+                '20200104000000000', '20200102000000000',
+            ]),
+        ):
+            with self.subTest(query=query_text):
+                self.assertEqual(
+                    [item.id for item in self.get_search_results(query_text)],
+                    expected,
+                )
+                self.assertEqual(
+                    [item.id for item in self.get_search_results(f'{query_text} limit:3')],
+                    expected[:3],
+                )
+
+    def test_search_sort_limit_books(self):
+        """The limit is shared by the books."""
+        self.init_host(self.root, config="""\
+[book "book1"]
+top_dir = book1
+
+[book "book2"]
+top_dir = book2
+""")
+        for book_id in ('book1', 'book2'):
+            self.init_book(
+                self.root,
+                book_id,
+                meta={
+                    '20200101000000000': {},
+                    '20200102000000000': {},
+                    '20200103000000000': {},
+                },
+                toc={
+                    'root': [
+                        '20200101000000000',
+                        '20200102000000000',
+                        '20200103000000000',
+                    ],
+                },
+            )
+
+        with mock.patch('webscrapbook.scrapbook.search.SearchEngine.search_book_sorted',
+                        side_effect=search.SearchEngine.search_book_sorted, autospec=True) as mocked:
+            self.assertEqual(
+                [(item.book_id, item.id) for item in self.get_search_results('book:book1 book:book2 -sort:id limit:4')],
+                [
+                    ('book1', '20200103000000000'),
+                    ('book1', '20200102000000000'),
+                    ('book1', '20200101000000000'),
+                    ('book2', '20200103000000000'),
+                ],
+            )
+        self.assertEqual(mocked.call_args_list, [
+            mock.call(mock.ANY, 'book1', 4),
+            mock.call(mock.ANY, 'book2', 1),
+        ])
+
+        with mock.patch('webscrapbook.scrapbook.search.SearchEngine.search_book_sorted',
+                        side_effect=search.SearchEngine.search_book_sorted, autospec=True) as mocked:
+            self.assertEqual(
+                [(item.book_id, item.id) for item in self.get_search_results('book:book1 book:book2 -sort:id limit:3')],
+                [
+                    ('book1', '20200103000000000'),
+                    ('book1', '20200102000000000'),
+                    ('book1', '20200101000000000'),
+                ],
+            )
+        self.assertEqual(mocked.call_args_list, [
+            mock.call(mock.ANY, 'book1', 3),
+        ])
+
     def test_search_limit(self):
         self.init_book(
             self.root,
@@ -1766,6 +2100,880 @@ no_tree = true
             ),
         ])
 
+    def test_search_item_rules(self):
+        """Rules not depending on the file are checked once for an item."""
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {'type': 'site', 'title': 'Foo'},
+                '20200102000000000': {'type': 'note', 'title': 'Foo'},
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                ],
+            },
+            fulltext={
+                '20200101000000000': {
+                    'index.html': {'content': 'Lorem ipsum'},
+                    'page1.html': {'content': 'dolor sit amet'},
+                    'page2.html': {'content': 'Lorem dolor'},
+                },
+                '20200102000000000': {
+                    'index.html': {'content': 'Lorem ipsum'},
+                },
+            },
+        )
+
+        with mock.patch('webscrapbook.scrapbook.search.Query._match_type',
+                        side_effect=search.Query._match_type) as mocked_type, \
+             mock.patch('webscrapbook.scrapbook.search.Query._match_content',
+                        side_effect=search.Query._match_content) as mocked_content:
+            self.assertEqual(
+                [(item.id, item.file) for item in self.get_search_results('type:site content:lorem')],
+                [('20200101000000000', 'index.html'), ('20200101000000000', 'page2.html')],
+            )
+        self.assertEqual(mocked_type.call_count, 2)
+        self.assertEqual(mocked_content.call_count, 3)
+
+    def test_search_fulltext_index(self):
+        book = self.init_book(
+            self.root,
+            config="""\
+[book ""]
+fulltext_index = true
+""",
+            meta={
+                '20200101000000000': {'title': 'Foo'},
+                '20200102000000000': {'title': 'Bar'},
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                ],
+            },
+            fulltext={
+                '20200101000000000': {
+                    'index.html': {'content': 'Lorem ipsum dolor sit amet'},
+                },
+                '20200102000000000': {
+                    'index.html': {'content': 'Consectetur adipiscing elit'},
+                },
+            },
+        )
+        FulltextIndex.build(book.fulltext).save(book)
+
+        # content of a non-candidate item should not be searched
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_text_hinted',
+                        side_effect=search.Query.match_text_hinted) as mocked:
+            self.assertEqual(
+                [item.id for item in self.get_search_results('ipsum')],
+                ['20200101000000000'],
+            )
+        self.assertEqual(mocked.call_args_list, [
+            mock.call(mock.ANY, 'Lorem ipsum dolor sit amet', mock.ANY, '20200101000000000', mock.ANY),
+            mock.call(mock.ANY, 'Consectetur adipiscing elit', mock.ANY, '20200102000000000', mock.ANY),
+        ])
+        hints = mocked.call_args_list[0][0][2]
+        self.assertEqual(list(hints.values()), [{'20200101000000000'}])
+
+        self.assertEqual(
+            [item.id for item in self.get_search_results('-content:ipsum')],
+            ['20200102000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in self.get_search_results('content:sit -content:elit')],
+            ['20200101000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in self.get_search_results('bar')],
+            ['20200102000000000'],
+        )
+
+        # outdated index should not be used
+        book.fulltext['20200102000000000']['index.html']['content'] = 'Lorem ipsum'
+        book.save_fulltext_files()
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_text_hinted') as mocked:
+            self.assertEqual(
+                [item.id for item in self.get_search_results('ipsum')],
+                ['20200101000000000', '20200102000000000'],
+            )
+        mocked.assert_not_called()
+
+    def test_search_fulltext_index_regex(self):
+        book = self.init_book(
+            self.root,
+            config="""\
+[book ""]
+fulltext_index = true
+""",
+            meta={
+                '20200101000000000': {'title': 'Foo'},
+                '20200102000000000': {'title': 'Bar'},
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                ],
+            },
+            fulltext={
+                '20200101000000000': {
+                    'index.html': {'content': 'Lorem ipsum dolor sit amet'},
+                },
+                '20200102000000000': {
+                    'index.html': {'content': 'Consectetur adipiscing elit'},
+                },
+            },
+        )
+        FulltextIndex.build(book.fulltext).save(book)
+
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_text_hinted',
+                        side_effect=search.Query.match_text_hinted) as mocked:
+            self.assertEqual(
+                [item.id for item in self.get_search_results(r're: content:ips.m\s+dol')],
+                ['20200101000000000'],
+            )
+        hints = mocked.call_args_list[0][0][2]
+        self.assertEqual(list(hints.values()), [{'20200101000000000'}])
+
+    def test_search_fulltext_summary(self):
+        with mock.patch('webscrapbook.scrapbook.book.Book.SAVE_FULLTEXT_THRESHOLD', 10):
+            self.init_book(
+                self.root,
+                config="""\
+[book ""]
+fulltext_index = true
+""",
+                meta={
+                    '20200101000000000': {'title': 'Foo'},
+                    '20200102000000000': {'title': 'Bar'},
+                },
+                toc={
+                    'root': [
+                        '20200101000000000',
+                        '20200102000000000',
+                    ],
+                },
+                fulltext={
+                    '20200101000000000': {
+                        'index.html': {'content': 'Lorem ipsum dolor sit amet'},
+                    },
+                    '20200102000000000': {
+                        'index.html': {'content': 'Consectetur adipiscing elit'},
+                    },
+                },
+            )
+
+        # a fulltext file whose Bloom filter doesn't have the tokens should not be loaded
+        with mock.patch('webscrapbook.scrapbook.book.Book.load_fulltext_file', autospec=True,
+                        side_effect=Book.load_fulltext_file) as mocked:
+            self.assertEqual(
+                [item.id for item in self.get_search_results('content:"lorem ipsum dolor"')],
+                ['20200101000000000'],
+            )
+        self.assertEqual(mocked.call_args_list, [mock.call(mock.ANY, 0)])
+
+        # fulltext files should not be loaded if the content is not needed
+        with mock.patch('webscrapbook.scrapbook.book.Book.load_fulltext_file', autospec=True,
+                        side_effect=Book.load_fulltext_file) as mocked:
+            self.assertEqual(
+                [(item.id, item.file) for item in self.get_search_results('title:bar')],
+                [('20200102000000000', 'index.html')],
+            )
+        mocked.assert_not_called()
+
+    def test_search_trigram_index(self):
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {'title': 'Hello world', 'source': 'http://example.com/'},
+                '20200102000000000': {'title': 'Yellow', 'comment': 'Hello there'},
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                ],
+            },
+        )
+        host = (self.root, None, TreeCache(1024 * 1024))
+
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_text_hinted',
+                        side_effect=search.Query.match_text_hinted) as mocked:
+            self.assertEqual(
+                [item.id for item in search.search(host, 'title:hello')],
+                ['20200101000000000'],
+            )
+        hints = mocked.call_args_list[0][0][2]
+        self.assertEqual(list(hints.values()), [{'20200101000000000'}])
+
+        self.assertEqual(
+            [item.id for item in search.search(host, 'hello')],
+            ['20200101000000000', '20200102000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in search.search(host, 'llo -title:yel')],
+            ['20200101000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in search.search(host, 're: source:exam.le\\.com')],
+            ['20200101000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in search.search(host, 're: title:(hello|yellow)')],
+            ['20200101000000000', '20200102000000000'],
+        )
+
+    @mock.patch('webscrapbook.scrapbook.columns.np', None)
+    def test_search_explain(self):
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {
+                    'title': 'Foo',
+                    'type': 'folder',
+                },
+                '20200102000000000': {
+                    'index': '20200102000000000/index.html',
+                    'title': 'Bar',
+                },
+                '20200103000000000': {
+                    'index': '20200103000000000/index.html',
+                    'title': 'Baz',
+                },
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                    '20200103000000000',
+                ],
+            },
+            fulltext={
+                '20200102000000000': {
+                    'index.html': {'content': 'Lorem ipsum dolor'},
+                },
+                '20200103000000000': {
+                    'index.html': {'content': 'Sit amet'},
+                },
+            },
+        )
+
+        explain = {}
+        self.assertEqual(
+            [item.id for item in search.search(self.root, 'explain: -type:folder re: ips.m', explain=explain)],
+            ['20200102000000000'],
+        )
+        self.assertEqual(explain, {
+            'time': mock.ANY,
+            'phases': {phase: mock.ANY for phase in search.SearchExplain.PHASES},
+            'results': 1,
+            'books': {
+                '': {
+                    'items': mock.ANY,
+                    'candidates': [],
+                    'rules': [
+                        {'rule': 'type', 'checked': 3, 'passed': 2, 'searches': 3,
+                         'scanned': 6, 'time': mock.ANY},
+                        {'rule': 'default', 'checked': 2, 'passed': 1, 'searches': mock.ANY,
+                         'scanned': mock.ANY, 'time': mock.ANY},
+                    ],
+                    'fulltext_files': 1,
+                    'results': 1,
+                },
+            },
+        })
+        self.assertGreater(explain['books']['']['rules'][1]['scanned'], 0)
+
+        # not filled if not explained
+        explain = {}
+        self.assertEqual(
+            [item.id for item in search.search(self.root, 're: ips.m', explain=explain)],
+            ['20200102000000000'],
+        )
+        self.assertEqual(explain, {})
+
+    def test_search_explain_candidates(self):
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {
+                    'title': 'Foo',
+                    'charset': 'UTF-8',
+                },
+                '20200102000000000': {
+                    'title': 'Bar',
+                    'charset': 'Big5',
+                },
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                ],
+            },
+        )
+        host = (self.root, None, TreeCache(1024 * 1024))
+
+        explain = {}
+        self.assertEqual(
+            [item.id for item in search.search(host, 'explain: id:20200102000000000', explain=explain)],
+            ['20200102000000000'],
+        )
+        self.assertEqual(explain['books']['']['candidates'], [['exact', 1]])
+        self.assertEqual(explain['books']['']['rules'], [
+            {'rule': 'id', 'checked': 1, 'passed': 1, 'searches': 1,
+             'scanned': 17, 'time': mock.ANY},
+        ])
+
+    def test_search_exact_index(self):
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {
+                    'type': 'folder',
+                },
+                '20200102000000000': {
+                    'index': '20200102000000000.htz',
+                    'charset': 'UTF-8',
+                    'source': 'https://www.example.com/docs/page.html',
+                },
+                '20200103000000000': {
+                    'type': 'bookmark',
+                    'source': 'http://example.org/',
+                },
+                '20200104000000000': {
+                    'index': '20200104000000000/index.html',
+                    'charset': 'Big5',
+                    'source': 'http://example.com/',
+                },
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                    '20200103000000000',
+                    '20200104000000000',
+                ],
+            },
+        )
+        host = (self.root, None, TreeCache(1024 * 1024))
+
+        # rules of non-candidate items should not be checked
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_item_meta',
+                        side_effect=search.Query.match_item_meta, autospec=True) as mocked:
+            self.assertEqual(
+                [item.id for item in search.search(host, 'id:20200102000000000 id:20200103000000000')],
+                ['20200102000000000', '20200103000000000'],
+            )
+        self.assertEqual(mocked.call_count, 2)
+
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_item_meta',
+                        side_effect=search.Query.match_item_meta, autospec=True) as mocked:
+            self.assertEqual(
+                [item.id for item in search.search(host, 'site:example.com')],
+                ['20200102000000000', '20200104000000000'],
+            )
+        self.assertEqual(mocked.call_count, 2)
+
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_item_meta',
+                        side_effect=search.Query.match_item_meta, autospec=True) as mocked:
+            self.assertEqual(
+                [item.id for item in search.search(host, 'index:.HTZ')],
+                ['20200102000000000'],
+            )
+        self.assertEqual(mocked.call_count, 1)
+
+        self.assertEqual(
+            [item.id for item in search.search(host, 'type: -charset:utf')],
+            ['20200104000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in search.search(host, 'site:https://example.com/docs/')],
+            ['20200102000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in search.search(host, '-site:example.com -type:folder')],
+            ['20200103000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in search.search(host, 're: id:0000000$')],
+            ['20200101000000000', '20200102000000000', '20200103000000000', '20200104000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in search.search(host, 'index:/index.htm')],
+            ['20200104000000000'],
+        )
+
+    @mock.patch('webscrapbook.scrapbook.columns.np', None)
+    def test_search_date_index(self):
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {'title': 'Hello', 'create': '20200101000000000', 'modify': '20200301000000000'},
+                '20200102000000000': {'title': 'Hello', 'create': '20200102000000000', 'modify': '20200102000000000'},
+                '20200103000000000': {'title': 'World', 'create': '20200103000000000', 'modify': '20200103000000000'},
+                '20200104000000000': {'title': 'Hello'},
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                    '20200103000000000',
+                    '20200104000000000',
+                ],
+            },
+        )
+        host = (self.root, None, TreeCache(1024 * 1024))
+
+        # items out of the date range are skipped without checking the rules
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_item_meta',
+                        autospec=True, side_effect=search.Query.match_item_meta) as mocked:
+            self.assertEqual(
+                [item.id for item in search.search(host, 'create:20200102-20200103')],
+                ['20200102000000000', '20200103000000000'],
+            )
+        self.assertEqual(mocked.call_count, 2)
+
+        # dates of a rule are ORed
+        self.assertEqual(
+            [item.id for item in search.search(host, 'modify:20200301 modify:-20200102')],
+            ['20200101000000000', '20200102000000000'],
+        )
+
+        # intersected with the candidates of other rules
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_item_meta',
+                        autospec=True, side_effect=search.Query.match_item_meta) as mocked:
+            self.assertEqual(
+                [item.id for item in search.search(host, 'title:hello create:20200102-')],
+                ['20200102000000000'],
+            )
+        self.assertEqual(mocked.call_count, 1)
+
+        self.assertEqual(
+            [item.id for item in search.search(host, 'create:20200102- -create:20200103')],
+            ['20200102000000000'],
+        )
+
+    @require_numpy()
+    def test_search_columns(self):
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {'title': 'Hello', 'type': 'folder', 'create': '20200101000000000'},
+                '20200102000000000': {'title': 'Hello', 'marked': True, 'charset': 'UTF-8',
+                                      'create': '20200102000000000'},
+                '20200103000000000': {'title': 'World', 'type': 'note', 'marked': True,
+                                      'create': '20200103000000000'},
+                '20200104000000000': {'title': 'Hello', 'charset': 'Big5'},
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                    '20200103000000000',
+                    '20200104000000000',
+                ],
+            },
+        )
+        host = (self.root, None, TreeCache(1024 * 1024))
+
+        # items not matching the non-text rules are skipped without checking the rules
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_item_meta',
+                        autospec=True, side_effect=search.Query.match_item_meta) as mocked:
+            self.assertEqual(
+                [item.id for item in search.search(host, 'marked: -type:note')],
+                ['20200102000000000'],
+            )
+        self.assertEqual(mocked.call_count, 1)
+
+        self.assertEqual(
+            [item.id for item in search.search(host, '-marked:')],
+            ['20200101000000000', '20200104000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in search.search(host, 'type:folder type:note')],
+            ['20200101000000000', '20200103000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in search.search(host, 'charset:utf -charset:big5')],
+            ['20200102000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in search.search(host, '-create:20200102-20200102235959')],
+            ['20200101000000000', '20200103000000000'],
+        )
+
+        # intersected with the candidates of other rules
+        with mock.patch('webscrapbook.scrapbook.search.Query.match_item_meta',
+                        autospec=True, side_effect=search.Query.match_item_meta) as mocked:
+            self.assertEqual(
+                [item.id for item in search.search(host, 'title:hello create:20200102-')],
+                ['20200102000000000'],
+            )
+        self.assertEqual(mocked.call_count, 1)
+
+    def test_stats(self):
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {'type': 'folder', 'create': '20200101000000000'},
+                '20200102000000000': {'marked': True, 'source': 'http://example.com/'},
+            },
+        )
+        for host in (self.root, (self.root, None, TreeCache(1024 * 1024))):
+            with self.subTest(host=host):
+                self.assertEqual(search.stats(host), {
+                    'count': 2,
+                    'marked': 1,
+                    'locked': 0,
+                    'location': 0,
+                    'type': {'': 1, 'folder': 1},
+                    'charset': {'': 2},
+                    'source_host': {'': 1, 'example.com': 1},
+                    'create': {'202001': 1},
+                    'modify': {},
+                })
+
+        with self.assertRaises(KeyError):
+            search.stats(self.root, 'nonexist')
+
+    def test_search_cache(self):
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {'title': 'Hello world'},
+                '20200102000000000': {'title': 'Yellow'},
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                ],
+            },
+        )
+        cache = search.SearchCache(8, 100)
+
+        with mock.patch('webscrapbook.scrapbook.search.SearchEngine.search',
+                        side_effect=search.SearchEngine.search, autospec=True) as mocked:
+            self.assertEqual(
+                [item.id for item in search.search(self.root, 'llo', cache=cache)],
+                ['20200101000000000', '20200102000000000'],
+            )
+            self.assertEqual(mocked.call_count, 1)
+
+            # cached results should be used for an equivalent query
+            items = list(search.search(self.root, ' llo ', context={'title': 100}, cache=cache))
+            self.assertEqual(
+                [item.id for item in items],
+                ['20200101000000000', '20200102000000000'],
+            )
+            self.assertEqual(items[0].context['title'], 'He<mark class="kw0">llo</mark> world')
+            self.assertEqual(mocked.call_count, 1)
+
+            # only the IDs of the results should be cached
+            self.assertEqual(
+                [items for items, _ in cache._results.values()],
+                [[('', '20200101000000000', ''), ('', '20200102000000000', '')]],
+            )
+
+            # an incomplete search should not be cached
+            next(search.search(self.root, 'world', cache=cache))
+            self.assertEqual(mocked.call_count, 2)
+            list(search.search(self.root, 'world', cache=cache))
+            self.assertEqual(mocked.call_count, 3)
+
+            # changed tree files should invalidate the results
+            self.init_book(
+                self.root,
+                meta={
+                    '20200101000000000': {'title': 'Hello world'},
+                },
+                toc={
+                    'root': [
+                        '20200101000000000',
+                    ],
+                },
+            )
+            self.assertEqual(
+                [item.id for item in search.search(self.root, 'llo', cache=cache)],
+                ['20200101000000000'],
+            )
+            self.assertEqual(mocked.call_count, 4)
+
+    def test_search_cache_max_items(self):
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {'title': 'Hello world'},
+                '20200102000000000': {'title': 'Yellow'},
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                ],
+            },
+        )
+        cache = search.SearchCache(8, 1)
+
+        with mock.patch('webscrapbook.scrapbook.search.SearchEngine.search',
+                        side_effect=search.SearchEngine.search, autospec=True) as mocked:
+            list(search.search(self.root, 'llo', cache=cache))
+            list(search.search(self.root, 'llo', cache=cache))
+            self.assertEqual(mocked.call_count, 2)
+
+            list(search.search(self.root, 'world', cache=cache))
+            list(search.search(self.root, 'world', cache=cache))
+            self.assertEqual(mocked.call_count, 3)
+
+    def test_search_parallel(self):
+        self.init_host(self.root, config="""\
+[book "book1"]
+top_dir = book1
+
+[book "book2"]
+top_dir = book2
+
+[book "book3"]
+top_dir = book3
+no_tree = true
+""")
+        for book_id in ('book1', 'book2'):
+            self.init_book(
+                self.root,
+                book_id,
+                meta={
+                    '20200101000000000': {'title': f'{book_id} Hello'},
+                    '20200102000000000': {'title': f'{book_id} Yellow'},
+                    '20200103000000000': {'title': f'{book_id} World'},
+                },
+                toc={
+                    'root': [
+                        '20200101000000000',
+                        '20200102000000000',
+                        '20200103000000000',
+                    ],
+                },
+            )
+
+        for query in (
+            'book:book1 book:book2 book:book3 llo',
+            'book:book1 book:book2 -sort:id',
+            'book:book1 book:book2 -sort:id limit:4',
+            'book:book1 book:book2 limit:2',
+        ):
+            with self.subTest(query=query):
+                expected = [
+                    (item.book_id, item.id, item.context)
+                    for item in search.search(self.root, query, context={'title': 20})
+                ]
+                self.assertEqual([
+                    (item.book_id, item.id, item.context)
+                    for item in search.search(self.root, query, context={'title': 20}, jobs=2)
+                ], expected)
+
+        # reuse an executor across searches
+        host = Host(self.root)
+        with search.create_executor(host, 2, 1024 * 1024) as executor:
+            for _ in range(2):
+                self.assertEqual(
+                    [(item.book_id, item.id) for item in search.search(host, 'book:book1 book:book2 world',
+                                                                       executor=executor)],
+                    [('book1', '20200103000000000'), ('book2', '20200103000000000')],
+                )
+
+        # a search with a single book does not use the executor
+        executor = mock.Mock()
+        self.assertEqual(
+            [item.id for item in search.search(host, 'book:book1 world', executor=executor)],
+            ['20200103000000000'],
+        )
+        executor.submit.assert_not_called()
+
+    def test_search_parallel_changed(self):
+        """A worker should search the current tree files."""
+        self.init_host(self.root, config="""\
+[book "book1"]
+top_dir = book1
+
+[book "book2"]
+top_dir = book2
+""")
+        for book_id in ('book1', 'book2'):
+            self.init_book(
+                self.root,
+                book_id,
+                meta={
+                    '20200101000000000': {'title': 'Hello'},
+                },
+                toc={
+                    'root': ['20200101000000000'],
+                },
+            )
+
+        host = Host(self.root)
+        with search.create_executor(host, 1, 1024 * 1024) as executor:
+            self.assertEqual(
+                [(item.book_id, item.id) for item in search.search(host, 'book:book1 book:book2 world',
+                                                                   executor=executor)],
+                [],
+            )
+
+            with open(os.path.join(host.books['book1'].tree_dir, 'meta.js'), 'w', encoding='UTF-8') as fh:
+                fh.write('scrapbook.meta({"20200101000000000": {"title": "Hello world"}})')
+
+            self.assertEqual(
+                [(item.book_id, item.id) for item in search.search(host, 'book:book1 book:book2 world',
+                                                                   executor=executor)],
+                [('book1', '20200101000000000')],
+            )
+
+    def test_search_context_hits(self):
+        """The snippet of the content is generated from the recorded hits."""
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {'index': '20200101000000000/index.html'},
+            },
+            toc={
+                'root': ['20200101000000000'],
+            },
+            fulltext={
+                '20200101000000000': {
+                    'index.html': {'content': 'Lorem ipsum dolor sit amet.'},
+                },
+            },
+        )
+
+        with mock.patch('webscrapbook.scrapbook.search.Query._crop_at_first_hit',
+                        side_effect=search.Query._crop_at_first_hit) as mocked:
+            items = list(search.search(self.root, 're: content:d.lor', context={'fulltext': 10}))
+        self.assertEqual(items[0].context['fulltext'], 'um <mark class="kw0">dolor</mark> …')
+        hits = mocked.call_args[1]['hits']
+        self.assertEqual(list(hits.values()), [12])
+
+    def test_search_paging(self):
+        self.init_book(
+            self.root,
+            meta={
+                '20200101000000000': {'title': 'Hello 1'},
+                '20200102000000000': {'title': 'Hello 2'},
+                '20200103000000000': {'title': 'Hello 3'},
+                '20200104000000000': {'title': 'Hello 4'},
+            },
+            toc={
+                'root': [
+                    '20200101000000000',
+                    '20200102000000000',
+                    '20200103000000000',
+                    '20200104000000000',
+                ],
+            },
+        )
+
+        # context is generated only for the items in the page
+        with mock.patch('webscrapbook.scrapbook.search.SearchEngine._generate_context',
+                        autospec=True) as mocked:
+            self.assertEqual(
+                [item.id for item in search.search(self.root, 'hello', offset=1, size=2)],
+                ['20200102000000000', '20200103000000000'],
+            )
+        self.assertEqual(mocked.call_count, 2)
+
+        self.assertEqual(
+            [item.id for item in search.search(self.root, 'hello', offset=3)],
+            ['20200104000000000'],
+        )
+        self.assertEqual(
+            [item.id for item in search.search(self.root, 'hello -sort:id limit:3', offset=1, size=5)],
+            ['20200103000000000', '20200102000000000'],
+        )
+
+        # a page is served by the cached leading results
+        cache = search.SearchCache(8, 100)
+        with mock.patch('webscrapbook.scrapbook.search.SearchEngine.search',
+                        side_effect=search.SearchEngine.search, autospec=True) as mocked:
+            self.assertEqual(
+                [item.id for item in search.search(self.root, 'hello', cache=cache, size=3)],
+                ['20200101000000000', '20200102000000000', '20200103000000000'],
+            )
+            self.assertEqual(
+                [item.id for item in search.search(self.root, 'hello', cache=cache, offset=1, size=2)],
+                ['20200102000000000', '20200103000000000'],
+            )
+            self.assertEqual(mocked.call_count, 1)
+
+            self.assertEqual(
+                [item.id for item in search.search(self.root, 'hello', cache=cache, offset=2, size=2)],
+                ['20200103000000000', '20200104000000000'],
+            )
+            self.assertEqual(mocked.call_count, 2)
+
+
+class TestSearchCache(unittest.TestCase):
+    def test_get_query(self):
+        cache = search.SearchCache(2, 100)
+        query = cache.get_query('foo')
+        query2 = cache.get_query('foo')
+        self.assertIsNot(query2, query)
+        self.assertIs(query2.rules, query.rules)
+
+        with self.assertRaises(ValueError):
+            cache.get_query('re: ???')
+
+    def test_lru(self):
+        cache = search.SearchCache(2, 100)
+        cache.set('a', [1])
+        cache.set('b', [2])
+        self.assertEqual(cache.get('a'), [1])
+        cache.set('c', [3])
+        self.assertEqual(cache.get('a'), [1])
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), [3])
+
+        cache.clear()
+        self.assertIsNone(cache.get('a'))
+
+    def test_incomplete(self):
+        cache = search.SearchCache(2, 100)
+        cache.set('a', [1, 2], complete=False)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('a', 2), [1, 2])
+        self.assertIsNone(cache.get('a', 3))
+
+        # don't replace with less results
+        cache.set('a', [1], complete=False)
+        self.assertEqual(cache.get('a', 2), [1, 2])
+
+        cache.set('a', [1, 2, 3])
+        self.assertEqual(cache.get('a'), [1, 2, 3])
+        cache.set('a', [1, 2, 3, 4], complete=False)
+        self.assertEqual(cache.get('a'), [1, 2, 3])
+
+    def test_max_size(self):
+        cache = search.SearchCache(8, 100, 4)
+        cache.set('a', [1, 2])
+        cache.set('b', [3])
+        self.assertEqual(cache.size, 3)
+
+        cache.set('c', [4, 5])
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), [3])
+        self.assertEqual(cache.get('c'), [4, 5])
+        self.assertEqual(cache.size, 3)
+
+        # results larger than max_size are not cached
+        cache.set('d', [1, 2, 3, 4, 5])
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.size, 3)
+
+        cache.clear()
+        self.assertEqual(cache.size, 0)
+
 
 if __name__ == '__main__':
     unittest.main()
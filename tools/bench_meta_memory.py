@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Benchmark memory usage of loaded metadata with and without compact_meta.
+
+Dummy metadata with the given number of items is decoded from JSON, like
+how tree files are loaded, and the memory allocated for holding it as a
+TreeData (plain dicts) and as a CompactMetaData is measured.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from webscrapbook.scrapbook.book import CompactMetaData, TreeData
+
+TYPES = ('', 'folder', 'note', 'bookmark', 'separator', 'file')
+
+
+def generate_meta(count):
+    meta = {}
+    for i in range(count):
+        id = f'20200101{i:09d}'
+        meta[id] = {
+            'index': f'{id}/index.html',
+            'title': f'Dummy item {i}',
+            'type': TYPES[i % len(TYPES)],
+            'create': id,
+            'modify': id,
+            'source': f'https://example.com/page/{i}',
+            'icon': 'favicon.ico',
+            'comment': '',
+            'charset': 'UTF-8',
+        }
+    return json.dumps(meta)
+
+
+def bench(text, factory):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = factory(json.loads(text))
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return size, elapsed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=200000, help='Number of items of the dummy metadata (default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    print(f'Generating dummy metadata with {args.count} items...')
+    text = generate_meta(args.count)
+
+    plain, plain_time = bench(text, TreeData)
+    compact, compact_time = bench(text, CompactMetaData)
+
+    print(f'plain:   {plain / 1024 / 1024:.1f} MiB ({plain_time:.3f}s)')
+    print(f'compact: {compact / 1024 / 1024:.1f} MiB ({compact_time:.3f}s, {compact / plain:.0%} of plain)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Benchmark loading tree files with and without tree snapshots.
+
+A dummy book with the given number of items is generated in a temp
+directory, and the time for loading its tree files is measured:
+
+- parse: parse the tree files (no snapshot)
+- cold: parse the tree files and take the snapshots
+- warm: load from the up-to-date snapshots
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from webscrapbook import WSB_CONFIG, WSB_DIR
+from webscrapbook.scrapbook.book import Book
+from webscrapbook.scrapbook.host import Host
+
+
+def generate_book(root, count):
+    os.makedirs(os.path.join(root, WSB_DIR))
+    with open(os.path.join(root, WSB_DIR, WSB_CONFIG), 'w', encoding='UTF-8') as fh:
+        fh.write("""[book ""]
+top_dir =
+data_dir = data
+tree_dir = tree
+""")
+
+    book = Host(root).books['']
+    book.meta = {}
+    book.toc = {'root': []}
+    book.fulltext = {}
+    for i in range(count):
+        id = f'20200101{i:09d}'
+        book.meta[id] = {
+            'index': f'{id}/index.html',
+            'title': f'Dummy item {i}',
+            'type': '',
+            'create': id,
+            'modify': id,
+            'source': f'https://example.com/page/{i}',
+            'icon': 'favicon.ico',
+            'comment': '',
+        }
+        book.toc['root'].append(id)
+        book.fulltext[id] = {
+            'index.html': {
+                'content': f'Dummy content of item {i}. ' * 20,
+            },
+        }
+    book.save_meta_files()
+    book.save_toc_files()
+    book.save_fulltext_files()
+
+
+def bench(root, snapshot, repeat):
+    host = Host(root)
+    host.config['book']['']['tree_snapshot'] = snapshot
+    best = None
+    for _ in range(repeat):
+        book = Book(host)
+        start = time.perf_counter()
+        for name in ('meta', 'toc', 'fulltext'):
+            book.load_tree_files(name)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def clear_snapshots(root):
+    shutil.rmtree(os.path.join(root, 'tree', Book.TREE_SNAPSHOT_DIR), ignore_errors=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=50000, help='Number of items of the dummy book (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs for each case, taking the best (default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        print(f'Generating a dummy book with {args.count} items...')
+        generate_book(root, args.count)
+
+        parse = bench(root, False, args.repeat)
+        cold = None
+        for _ in range(args.repeat):
+            clear_snapshots(root)
+            t = bench(root, True, 1)
+            cold = t if cold is None else min(cold, t)
+        warm = bench(root, True, args.repeat)
+
+        print(f'parse: {parse:.3f}s')
+        print(f'cold:  {cold:.3f}s')
+        print(f'warm:  {warm:.3f}s ({parse / warm:.1f}x faster than parse)')
+
+
+if __name__ == '__main__':
+    main()
@@ -36,6 +36,7 @@ class Config():
             'allowed_x_host': '0',
             'allowed_x_port': '0',
             'allowed_x_prefix': '0',
+            'search_jobs': '0',
         },
         'server': {
             'port': '8080',
@@ -59,6 +60,10 @@ class Config():
             'tree_dir': '.wsb/tree',
             'index': '.wsb/tree/map.html',
             'no_tree': 'false',
+            'tree_journal': 'false',
+            'tree_snapshot': 'false',
+            'compact_meta': 'false',
+            'fulltext_index': 'false',
             'new_at_top': 'false',
             'inclusive_frames': 'true',
             'static_index': 'false',
@@ -73,6 +78,7 @@ class Config():
             'allowed_x_host': 'getint',
             'allowed_x_port': 'getint',
             'allowed_x_prefix': 'getint',
+            'search_jobs': 'getint',
         },
         'server': {
             'port': 'getint',
@@ -86,6 +92,10 @@ class Config():
         'book': {
             None: {
                 'no_tree': 'getboolean',
+                'tree_journal': 'getboolean',
+                'tree_snapshot': 'getboolean',
+                'compact_meta': 'getboolean',
+                'fulltext_index': 'getboolean',
                 'new_at_top': 'getboolean',
                 'inclusive_frames': 'getboolean',
                 'static_index': 'getboolean',
@@ -1,5 +1,6 @@
 """The WGSI application.
 """
+import atexit
 import datetime
 import functools
 import hashlib
@@ -11,6 +12,7 @@ import types
 from collections import defaultdict, namedtuple
 from contextlib import nullcontext
 from secrets import token_urlsafe
+from threading import Lock
 from urllib.parse import quote, unquote, urljoin, urlsplit, urlunsplit
 from zlib import adler32
 
@@ -63,6 +65,7 @@ jsonify = functools.partial(
     ensure_ascii=False,
     check_circular=False,
     separators=(',', ':'),
+    default=wsb_util.json_default,
 )
 
 bp = flask.Blueprint('default', __name__)
@@ -153,10 +156,21 @@ def generate_server_sent_events(gen):
     yield 'data: ' + '\n\n'
 
 
-def http_response(body=None, status=None, headers=None, format=None):
+def generate_ndjson(gen):
+    try:
+        for data in gen:
+            yield data + '\n'
+    except Exception:
+        traceback.print_exc()
+        err = {'error': {'status': 500, 'message': 'Internal Server Error'}}
+        yield jsonify(err) + '\n'
+
+
+def http_response(body=None, status=None, headers=None, format=None, meta=None):
     """Handle formatted response.
 
     ref: https://jsonapi.org
+    ref: https://github.com/ndjson/ndjson-spec
     """
     if not format:
         mimetype = None
@@ -171,7 +185,10 @@ def http_response(body=None, status=None, headers=None, format=None):
             status = None
             body = None
 
-        body = jsonify({'data': body})
+        body = {'data': body}
+        if meta is not None:
+            body['meta'] = meta
+        body = jsonify(body)
 
     # expect body to be a generator of text (mostly JSON) data
     elif format == 'sse':
@@ -189,6 +206,22 @@ def http_response(body=None, status=None, headers=None, format=None):
 
             body = generate_server_sent_events(body)
 
+    # expect body to be a generator of JSON data
+    elif format == 'ndjson':
+        mimetype = 'application/x-ndjson'
+
+        if status == 204:
+            status = None
+            body = None
+
+        if body is None:
+            body = iter(())
+        else:
+            if not isinstance(body, types.GeneratorType):
+                abort(500, 'Invalid generator for an NDJSON stream')
+
+            body = generate_ndjson(body)
+
     else:
         abort(400, f'Output format {format!r} is not supported.')
 
@@ -920,6 +953,7 @@ def action_config():
                 {'text': 'comment:', 'value': 'comment:'},
                 {'text': 'content:', 'value': 'content:'},
                 {'text': 'source:', 'value': 'source:'},
+                {'text': 'site:', 'value': 'site:'},
                 {'text': 'icon:', 'value': 'icon:'},
                 {'text': 'type:', 'value': 'type:'},
                 {'text': 'create:', 'value': 'create:'},
@@ -1237,7 +1271,7 @@ def action_cache():
         book_items[book_id] = request.values.getlist(f'item[{i}]') + item_ids
 
     gen = wsb_cache.generate(
-        (host.root, host.config),
+        (host.root, host.config, host.tree_cache),
         book_items=book_items,
         lock=request.values.get('lock', default=True),
         backup=request.values.get('backup', default=True, type=bool),
@@ -1280,7 +1314,7 @@ def action_check():
     format = request.format
 
     gen = wsb_check.run(
-        (host.root, host.config),
+        (host.root, host.config, host.tree_cache),
         book_ids=request.values.getlist('book'),
         lock=request.values.get('lock', default=True),
         backup=request.values.get('backup', default=True, type=bool),
@@ -1335,7 +1369,7 @@ def action_export():
 
     zs = util.fs.ZipStream()
     gen = wsb_exporter.run(
-        (host.root, host.config), zs,
+        (host.root, host.config, host.tree_cache), zs,
         book_id=book_id,
         items=request.values.get('items', default=(), type=json.loads),
         scheme=wsb_exporter.SCHEME_ROOT_INDEXES,
@@ -1380,7 +1414,7 @@ def action_import():
         files = sorted(f.path for f in it)
 
     _gen = wsb_importer.run(
-        (host.root, host.config), files,
+        (host.root, host.config, host.tree_cache), files,
         book_id=book_id,
         target_id=target_id,
         target_index=target_index,
@@ -1430,7 +1464,7 @@ def action_query():
     lock = request.values.get('lock', default=True)
 
     try:
-        rv = wsb_util.HostQuery((host.root, host.config),
+        rv = wsb_util.HostQuery((host.root, host.config, host.tree_cache),
                                 query, auto_cache, lock=lock).run()
     except Exception as exc:
         traceback.print_exc()
@@ -1442,11 +1476,26 @@ def action_query():
 
 @handle_action_advanced
 def action_search():
-    """Search in scrapbooks."""
+    """Search in scrapbooks.
+
+    The results can be paged with `offset` (the number of results to skip)
+    and `size` (the max number of results to return, which must be positive,
+    or -1 for no limit). A paged JSON or NDJSON response provides `next`, the
+    offset of the next page, or null if no more.
+
+    A JSON or NDJSON response for a query with the `explain:` option provides
+    `explain`, the breakdown of the search.
+    """
     format = request.format
+    offset = max(request.values.get('offset', default=0, type=int), 0)
+    size = request.values.get('size', default=-1, type=int)
+    if size <= 0 and size != -1:
+        # a page of no result never advances
+        abort(400, f'Invalid size: {size}')
+    explain = {}
 
     gen = wsb_search.search(
-        (host.root, host.config),
+        (host.root, host.config, host.tree_cache),
         query=request.values.get('q', default=''),
         context={
             'title': -1,
@@ -1456,12 +1505,29 @@ def action_search():
             'fulltext': request.values.get('fulltext', default=None, type=int),
         },
         lock=request.values.get('lock', default=True),
+        cache=host.search_cache,
+        executor=host.search_executor,
+        offset=offset,
+        # take one more to tell whether there is a next page
+        size=size + 1 if size >= 0 else -1,
+        explain=explain,
     )
 
+    # the offset of the next page, or None if no more
+    meta = {'next': None} if size >= 0 else None
+
+    def paged():
+        for i, item in enumerate(gen):
+            if i == size:
+                meta['next'] = offset + size
+                gen.close()
+                return
+            yield item
+
     if format == 'json':
         data = defaultdict(list)
         try:
-            for item in gen:
+            for item in paged():
                 data[item.book_id].append({
                     'id': item.id,
                     'file': item.file,
@@ -1470,12 +1536,43 @@ def action_search():
         except wsb_search.QueryError as exc:
             abort(400, str(exc))
 
-        return http_response(data, format=format)
+        if explain:
+            meta = dict(meta or {}, explain=explain)
+
+        return http_response(data, format=format, meta=meta)
+
+    elif format == 'ndjson':
+        def wrapper():
+            try:
+                for item in paged():
+                    yield jsonify({
+                        'data': {
+                            'book_id': item.book_id,
+                            'id': item.id,
+                            'file': item.file,
+                            'context': item.context,
+                        },
+                    })
+            except wsb_search.QueryError as exc:
+                yield jsonify({
+                    'error': {
+                        'status': 400,
+                        'message': str(exc),
+                    },
+                })
+                return
+
+            if explain:
+                yield jsonify({'meta': dict(meta or {}, explain=explain)})
+            elif meta is not None:
+                yield jsonify({'meta': meta})
+
+        return http_response(wrapper(), format=format)
 
     elif format == 'sse':
         def wrapper():
             try:
-                for item in gen:
+                for item in paged():
                     yield jsonify({
                         'type': 'info',
                         'msg': '',
@@ -1498,6 +1595,27 @@ def action_search():
         abort(400, 'Action not supported.')
 
 
+@handle_action_advanced
+def action_stats():
+    """Get the aggregated counts of the items of a scrapbook."""
+    format = request.format
+
+    if format != 'json':
+        abort(400, 'Action not supported.')
+
+    book_id = request.values.get('book', default='')
+    if book_id not in host.books:
+        abort(404, 'Book does not exist.')
+
+    data = wsb_search.stats(
+        (host.root, host.config, host.tree_cache),
+        book_id=book_id,
+        lock=request.values.get('lock', default=True),
+    )
+
+    return http_response(data, format=format)
+
+
 @bp.before_request
 def handle_before_request():
     host.verify_authorization()
@@ -1559,6 +1677,17 @@ def handle_error(exc):
         response.content_type = 'text/event-stream'
         return response
 
+    if request.format == 'ndjson':
+        response = exc.get_response()
+        response.data = jsonify({
+            'error': {
+                'status': exc.code,
+                'message': exc.description,
+            },
+        }) + '\n'
+        response.content_type = 'application/x-ndjson'
+        return response
+
     return exc
 
 
@@ -1566,12 +1695,30 @@ class WebHost(wsb_host.Host):
     """Extended Host class that also handles HTTP server related things.
 
     - Token handling: security token validation to avoid CSRF attack.
+    - Tree caching: parsed tree files are kept across requests.
+    - Search caching: parsed queries and search results are kept across
+      requests.
+    - Parallel search: books are searched in worker processes if
+      app.search_jobs > 1.
     """
     TOKEN_PURGE_INTERVAL = 3600  # in seconds
     TOKEN_DEFAULT_EXPIRY = 1800  # in seconds
+    # in bytes of the source tree files rather than of the memory used by the
+    # parsed data, which may take several times as much
+    TREE_CACHE_MAX_SIZE = 512 * 1024 * 1024
+    SEARCH_CACHE_MAX_ENTRIES = 64
+    SEARCH_CACHE_MAX_ITEMS = 50000  # of the results of a search
+    SEARCH_CACHE_MAX_SIZE = 200000  # of the results of all searches
 
     def __init__(self, root, config=None):
-        super().__init__(root, config=config)
+        super().__init__(root, config=config,
+                         tree_cache=wsb_host.TreeCache(self.TREE_CACHE_MAX_SIZE))
+
+        self.search_cache = wsb_search.SearchCache(self.SEARCH_CACHE_MAX_ENTRIES,
+                                                   self.SEARCH_CACHE_MAX_ITEMS,
+                                                   self.SEARCH_CACHE_MAX_SIZE)
+        self._search_executor = None
+        self._search_executor_lock = Lock()
 
         # token handling
         self.tokens = os.path.join(self.root, WSB_DIR, 'server', 'tokens')
@@ -1585,6 +1732,29 @@ class WebHost(wsb_host.Host):
     def i18n(self):
         return self.get_i18n(self.config['app']['locale'])
 
+    @property
+    def search_executor(self):
+        """The worker pool to search books in, or None if not parallel.
+
+        The pool is created once on first use, even for concurrent requests,
+        and is shut down at exit.
+        """
+        executor = self._search_executor
+        if executor is not None:
+            return executor
+
+        jobs = self.config['app']['search_jobs']
+        if jobs <= 1:
+            return None
+
+        with self._search_executor_lock:
+            executor = self._search_executor
+            if executor is None:
+                executor = wsb_search.create_executor(self, jobs, self.TREE_CACHE_MAX_SIZE)
+                atexit.register(executor.shutdown)
+                self._search_executor = executor
+        return executor
+
     def token_acquire(self, now=None):
         if now is None:
             now = int(time.time())
@@ -327,7 +327,7 @@ def cmd_query(args):
     import json
     from contextlib import nullcontext
 
-    from .scrapbook.util import HostQuery
+    from .scrapbook.util import HostQuery, json_default
 
     if input_ is None:
         cm = nullcontext(sys.stdin)
@@ -344,7 +344,7 @@ def cmd_query(args):
             raise RuntimeError(f'Malformed input query: {exc}') from None
 
     rv = HostQuery(root, query).run()
-    print(json.dumps(rv, ensure_ascii=False))
+    print(json.dumps(rv, ensure_ascii=False, default=json_default))
 
 
 def cmd_search(args):
@@ -359,6 +359,8 @@ def cmd_search(args):
         'comment': kwargs.pop('comment'),
         'source': kwargs.pop('source'),
     }
+    explain = kwargs.pop('explain')
+    kwargs['explain'] = report = {}
 
     import json
     from contextlib import nullcontext
@@ -376,6 +378,9 @@ def cmd_search(args):
     with cm as fh:
         query = fh.read()
 
+    if explain:
+        query += '\nexplain:'
+
     try:
         for item in search.search(root, query, **kwargs):
             msg = json.dumps({
@@ -385,6 +390,9 @@ def cmd_search(args):
                 'context': item.context,
             }, ensure_ascii=False)
             log(msg)
+
+        if report:
+            log(json.dumps({'explain': report}, ensure_ascii=False))
     except search.QueryError as exc:
         die(exc)
     except Exception as exc:
@@ -611,6 +619,10 @@ corresponding book) (default/empty: all items)""")
         '--recreate', dest='recreate', default=False, action=argparse.BooleanOptionalAction,
         help="""ignore current fulltext cache and generate again
 (default: %(default)s)""")
+    parser_cache.add_argument(
+        '--jobs', metavar='N', type=int, action='store',
+        help="""number of worker processes to generate the fulltext cache of
+the items in parallel (default: None)""")
     parser_cache.add_argument(
         '--static-site', default=False, action=argparse.BooleanOptionalAction,
         help="""generate static site pages (default: %(default)s)""")
@@ -1108,6 +1120,10 @@ properties:
   "id": ID of the matched item
   "file": matched filename of the item
   "context": context snippets of the match
+
+For a query with the "explain:" option (or --explain), a last object with
+"explain" is output for the breakdown of the search, including the time of
+each phase and the stats of each rule.
 """)
     parser_search.set_defaults(func=cmd_search)
     parser_search.add_argument(
@@ -1128,6 +1144,13 @@ properties:
     parser_search.add_argument(
         '--source', metavar='LEN', type=int, action='store',
         help="""length of the context source (default: None)""")
+    parser_search.add_argument(
+        '--jobs', metavar='N', type=int, action='store',
+        help="""number of worker processes to search the books in parallel
+(default: None)""")
+    parser_search.add_argument(
+        '--explain', default=False, action='store_true',
+        help="""output the breakdown of the search (same as the "explain:" option)""")
 
     # subcommand: help
     parser_help = subparsers.add_parser(
@@ -1,12 +1,18 @@
 """Scrapbook book handler.
 """
 import functools
-import glob
 import hashlib
 import html
+import itertools
 import json
+import marshal
 import os
 import re
+import sys
+import tempfile
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 from urllib.parse import unquote, urlsplit
 from urllib.request import pathname2url
@@ -15,10 +21,15 @@ from lxml import etree
 
 from .. import util
 from .._polyfill import zipfile
+from . import host as wsb_host
+from .columns import MetaColumns
+from .fulltext import DateIndex, ExactIndex, FulltextSummary, TrigramIndex
 
 # A shortcut for getting an ID at current time. Also for easier mock testing.
 _id_now = functools.partial(util.datetime_to_id, None)
 
+_json_decoder = json.JSONDecoder()
+
 
 class TreeFileError(ValueError):
     def __init__(self, msg, filename=None):
@@ -43,6 +54,623 @@ class TreeFileMalformedJsonError(TreeFileMalformedError):
     """
 
 
+# A global counter so that versions of different TreeData never collide.
+_tree_data_versions = itertools.count()
+
+
+def _track(value, tracker, key):
+    if isinstance(value, dict):
+        return _TrackedDict(tracker, key, value)
+    if isinstance(value, list):
+        return _TrackedList(tracker, key, value)
+    return value
+
+
+def _copy_value(value):
+    """Get a deep copy of a JSON-like value, with mappings as plain dicts."""
+    if isinstance(value, (dict, MutableMapping)):
+        return {k: _copy_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_value(v) for v in value]
+    return value
+
+
+def _is_same_value(value, other):
+    """Check whether two JSON-like values are serialized the same, regardless
+    of the order of the keys."""
+    if isinstance(value, (dict, MutableMapping)):
+        if not isinstance(other, (dict, MutableMapping)) or len(value) != len(other):
+            return False
+        for k, v in value.items():
+            try:
+                o = other[k]
+            except KeyError:
+                return False
+            if not _is_same_value(v, o):
+                return False
+        return True
+    if isinstance(value, list):
+        return (isinstance(other, list) and len(value) == len(other)
+                and all(_is_same_value(v, o) for v, o in zip(value, other)))
+    return type(value) is type(other) and value == other
+
+
+class _TrackingDictMixin:
+    """Mutating methods of a dict that report the changed keys."""
+    __slots__ = ()
+
+    def _changing(self, key):
+        raise NotImplementedError
+
+    def _changed(self, key, values=()):
+        raise NotImplementedError
+
+    def __setitem__(self, key, value):
+        # skip if a scalar value is not really changed
+        if not isinstance(value, (dict, list)):
+            try:
+                old = dict.__getitem__(self, key)
+            except KeyError:
+                pass
+            else:
+                if type(old) is type(value) and old == value:
+                    return
+        self._changing(key)
+        dict.__setitem__(self, key, value)
+        self._changed(key, (value,))
+
+    def __delitem__(self, key):
+        if key in self:
+            self._changing(key)
+        dict.__delitem__(self, key)
+        self._changed(key)
+
+    def pop(self, key, *args):
+        if key not in self:
+            return dict.pop(self, key, *args)
+        self._changing(key)
+        value = dict.pop(self, key)
+        self._changed(key)
+        return value
+
+    def popitem(self):
+        if not self:
+            raise KeyError('popitem(): dictionary is empty')
+        key = list(self)[-1]
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        try:
+            return dict.__getitem__(self, key)
+        except KeyError:
+            self[key] = default
+            return default
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        keys = list(self)
+        for key in keys:
+            self._changing(key)
+        dict.clear(self)
+        for key in keys:
+            self._changed(key)
+
+    def __reduce_ex__(self, protocol):
+        # copy or pickle as a plain dict
+        return (dict, (dict(self),))
+
+
+class _TrackedDict(_TrackingDictMixin, dict):
+    """A dict under an item of a TreeData."""
+    __slots__ = ('_tracker', '_key')
+
+    def __init__(self, tracker, key, data):
+        super().__init__(data)
+        self._tracker = tracker
+        self._key = key
+        for k, v in self.items():
+            if isinstance(v, (dict, list)):
+                dict.__setitem__(self, k, _track(v, tracker, key))
+
+    def _changing(self, key):
+        self._tracker._keep_original(self._key)
+
+    def _changed(self, key, values=()):
+        self._tracker._touch(self._key, values)
+
+
+class _TrackedList(list):
+    """A list under an item of a TreeData."""
+    __slots__ = ('_tracker', '_key')
+
+    def __init__(self, tracker, key, data):
+        super().__init__(data)
+        self._tracker = tracker
+        self._key = key
+        for i, v in enumerate(self):
+            if isinstance(v, (dict, list)):
+                list.__setitem__(self, i, _track(v, tracker, key))
+
+    def _changing(self):
+        self._tracker._keep_original(self._key)
+
+    def _changed(self, values=()):
+        self._tracker._touch(self._key, values)
+
+    def __setitem__(self, index, value):
+        self._changing()
+        if isinstance(index, slice):
+            value = list(value)
+            super().__setitem__(index, value)
+            self._changed(value)
+        else:
+            super().__setitem__(index, value)
+            self._changed((value,))
+
+    def __delitem__(self, index):
+        self._changing()
+        super().__delitem__(index)
+        self._changed()
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, n):
+        self._changing()
+        super().__imul__(n)
+        self._changed()
+        return self
+
+    def append(self, value):
+        self._changing()
+        super().append(value)
+        self._changed((value,))
+
+    def extend(self, values):
+        values = list(values)
+        self._changing()
+        super().extend(values)
+        self._changed(values)
+
+    def insert(self, index, value):
+        self._changing()
+        super().insert(index, value)
+        self._changed((value,))
+
+    def pop(self, *args):
+        self._changing()
+        value = super().pop(*args)
+        self._changed()
+        return value
+
+    def remove(self, value):
+        self._changing()
+        super().remove(value)
+        self._changed()
+
+    def clear(self):
+        self._changing()
+        super().clear()
+        self._changed()
+
+    def sort(self, *args, **kwargs):
+        self._changing()
+        super().sort(*args, **kwargs)
+        self._changed()
+
+    def reverse(self):
+        self._changing()
+        super().reverse()
+        self._changed()
+
+    def __reduce_ex__(self, protocol):
+        # copy or pickle as a plain list
+        return (list, (list(self),))
+
+
+class _MetaShape:
+    """The key layout shared by compact meta records with the same keys."""
+    __slots__ = ('keys', 'index', '_added')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = {k: i for i, k in enumerate(keys)}
+        self._added = {}
+
+    def add(self, key):
+        try:
+            return self._added[key]
+        except KeyError:
+            shape = self._added[key] = _get_meta_shape(self.keys + (key,))
+            return shape
+
+    def remove(self, key):
+        return _get_meta_shape(tuple(k for k in self.keys if k != key))
+
+
+_meta_shapes = {}
+
+
+def _get_meta_shape(keys):
+    try:
+        return _meta_shapes[keys]
+    except KeyError:
+        keys = tuple(sys.intern(k) if type(k) is str else k for k in keys)
+        shape = _meta_shapes[keys] = _MetaShape(keys)
+        return shape
+
+
+class _MetaRecord(MutableMapping):
+    """A compact mapping for the meta of an item of CompactMetaData.
+
+    The keys are stored in a shape shared by all records with the same keys
+    in the same order, and the values in a tuple. Values of keys with few
+    distinct values (e.g. type) are interned, and a value equal to the item
+    ID (e.g. create) shares the ID string.
+    """
+    __slots__ = ('_tracker', '_key', '_shape', '_values')
+
+    INTERN_KEYS = {'type', 'charset', 'marked', 'locked'}
+
+    def __init__(self, tracker, key, data):
+        self._tracker = tracker
+        self._key = key
+        keys = []
+        values = []
+        for k, v in data.items():
+            keys.append(k)
+            values.append(self._wrap(k, v))
+        self._shape = _get_meta_shape(tuple(keys))
+        self._values = tuple(values)
+
+    def _wrap(self, key, value):
+        if isinstance(value, (dict, list)):
+            return _track(value, self._tracker, self._key)
+        if type(value) is str:
+            if key in self.INTERN_KEYS:
+                return sys.intern(value)
+            if value == self._key:
+                return self._key
+        return value
+
+    def __getitem__(self, key):
+        return self._values[self._shape.index[key]]
+
+    def get(self, key, default=None):
+        try:
+            return self._values[self._shape.index[key]]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self._shape.index
+
+    def __iter__(self):
+        return iter(self._shape.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __setitem__(self, key, value):
+        try:
+            i = self._shape.index[key]
+        except KeyError:
+            self._tracker._keep_original(self._key)
+            self._shape = self._shape.add(key)
+            self._values += (self._wrap(key, value),)
+        else:
+            old = self._values[i]
+            # skip if a scalar value is not really changed
+            if (not isinstance(value, (dict, list))
+                    and type(old) is type(value) and old == value):
+                return
+            self._tracker._keep_original(self._key)
+            self._values = self._values[:i] + (self._wrap(key, value),) + self._values[i + 1:]
+        self._tracker._touch(self._key, (value,))
+
+    def __delitem__(self, key):
+        i = self._shape.index[key]
+        self._tracker._keep_original(self._key)
+        self._shape = self._shape.remove(key)
+        self._values = self._values[:i] + self._values[i + 1:]
+        self._tracker._touch(self._key)
+
+    def copy(self):
+        return dict(zip(self._shape.keys, self._values))
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def __reduce_ex__(self, protocol):
+        # copy or pickle as a plain dict
+        return (dict, (self.copy(),))
+
+
+class TreeData(_TrackingDictMixin, dict):
+    """A dict of tree data (meta, toc, fulltext) that tracks changed items.
+
+    Dicts and lists under an item are wrapped so that an in-place
+    modification (e.g. meta[id]['title'] = ... or toc[id].append(...)) marks
+    the item as changed too. A dict or list newly put into the data is kept
+    as-is, and the item is taken as possibly changed until mark_clean().
+
+    Attributes:
+        version: an int that changes whenever the data is changed, and is
+            unique among all TreeData
+        dirty: a dict whose keys are the changed items since last
+            mark_clean(), in the order of first change
+        shard_map: a dict mapping each item to the index of the tree file
+            it's stored in, or None if unknown
+        shard_count: the number of tree files of the shard map
+        files_signature: the signature of the tree files (see
+            Book.get_tree_files_signature()) the data is loaded from or saved
+            to since last mark_clean(), or None if unknown
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.version = next(_tree_data_versions)
+        self.dirty = {}
+        self.shard_map = None
+        self.shard_count = 0
+        self.files_signature = None
+        self._untracked = set()
+        self._originals = {}
+        dict.update(self, *args, **kwargs)
+        for k, v in self.items():
+            if isinstance(v, (dict, list)):
+                dict.__setitem__(self, k, self._wrap(k, v))
+
+    @property
+    def has_untracked(self):
+        """Whether there's a value that may be changed without tracking."""
+        return bool(self._untracked)
+
+    def _wrap(self, key, value):
+        return _track(value, self, key)
+
+    def _changing(self, key):
+        self._keep_original(key)
+
+    def _changed(self, key, values=()):
+        self._touch(key, values)
+
+    def _keep_original(self, key):
+        # keep a copy of the item before its first change, or None if absent
+        if key not in self._originals:
+            self._originals[key] = _copy_value(dict.get(self, key))
+
+    def _touch(self, key, values=()):
+        self.version = next(_tree_data_versions)
+        self.dirty[key] = True
+        for value in values:
+            if isinstance(value, (dict, list, _MetaRecord)) and not (
+                isinstance(value, (_TrackedDict, _TrackedList, _MetaRecord))
+                and value._tracker is self and value._key == key
+            ):
+                self._untracked.add(key)
+
+    def mark_clean(self):
+        """Reset the change tracking, e.g. after the data is saved.
+
+        Values not tracked are replaced with tracked copies.
+        """
+        for key in self._untracked:
+            try:
+                value = dict.__getitem__(self, key)
+            except KeyError:
+                continue
+            dict.__setitem__(self, key, self._wrap(key, value))
+        self._untracked.clear()
+        self._originals.clear()
+        self.dirty.clear()
+
+    def discard_unchanged(self):
+        """Remove the items whose value is the same as before the first change
+        since last mark_clean() (e.g. changed and then restored) from dirty.
+
+        Returns:
+            bool: whether any item remains changed
+        """
+        originals = self._originals
+        for key in tuple(self.dirty):
+            if key not in originals:
+                continue
+            if key in self._untracked:
+                # a value not tracked may be modified silently
+                if dict.__contains__(self, key):
+                    continue
+                self._untracked.discard(key)
+            if _is_same_value(dict.get(self, key), originals[key]):
+                del self.dirty[key]
+        return bool(self.dirty)
+
+
+class CompactMetaData(TreeData):
+    """A TreeData of meta that stores each item as a compact record.
+
+    A record is a mutable mapping rather than a dict, which saves much
+    memory for a large book as the keys are shared among items.
+    """
+    def _wrap(self, key, value):
+        if isinstance(value, (dict, _MetaRecord)):
+            return _MetaRecord(self, key, value)
+        return _track(value, self, key)
+
+
+def _json_default(obj):
+    if isinstance(obj, _MetaRecord):
+        return obj.copy()
+    raise TypeError(f'Object of type {obj.__class__.__name__} is not JSON serializable')
+
+
+class _ParentIndex:
+    """An index of the parents of each item in a TOC.
+
+    Attributes:
+        parents: a dict mapping each item to a dict of each parent and the
+            count of the item in it
+        ranks: a dict mapping each parent to a number that increases in the
+            order of the parents in the TOC
+    """
+    CACHE_NAME = 'toc.parents'
+
+    def __init__(self, toc=None):
+        self.parents = parents = {}
+        self.ranks = {}
+        self._next_rank = 0
+        for parent_id, item_ids in (toc or {}).items():
+            self.add_parent(parent_id)
+            for item_id in item_ids:
+                p = parents.setdefault(item_id, {})
+                p[parent_id] = p.get(parent_id, 0) + 1
+
+    def copy(self):
+        index = self.__class__()
+        index.parents = {item_id: p.copy() for item_id, p in self.parents.items()}
+        index.ranks = self.ranks.copy()
+        index._next_rank = self._next_rank
+        return index
+
+    def get_parents(self, item_id):
+        """Get the parents of an item and the count of it, in TOC order."""
+        ranks = self.ranks
+        return sorted(self.parents.get(item_id, {}).items(), key=lambda p: ranks[p[0]])
+
+    def add_parent(self, parent_id):
+        """Register a parent newly added to the end of the TOC."""
+        self.ranks[parent_id] = self._next_rank
+        self._next_rank += 1
+
+    def remove_parent(self, parent_id):
+        """Unregister a parent removed from the TOC."""
+        del self.ranks[parent_id]
+
+    def add(self, parent_id, item_id):
+        p = self.parents.setdefault(item_id, {})
+        p[parent_id] = p.get(parent_id, 0) + 1
+
+    def remove(self, parent_id, item_id):
+        p = self.parents[item_id]
+        p[parent_id] -= 1
+        if not p[parent_id]:
+            del p[parent_id]
+            if not p:
+                del self.parents[item_id]
+
+
+class _ReachIndex:
+    """A pre-order interval index of the items reachable in a TOC.
+
+    The TOC is traversed once in depth-first pre-order. The items first
+    visited under an item form a contiguous interval of the order, which is
+    exactly the items reachable from it if no item in the interval refers
+    to an item visited before it (i.e. the subtree is closed). Such an
+    item is recorded with the end of its interval.
+
+    Attributes:
+        order: a list of the items in the traversed order
+        pre: a dict mapping each item to the position in order
+        ends: a dict mapping each item with a closed subtree to the end of
+            its interval
+    """
+    CACHE_NAME = 'toc.reach'
+
+    def __init__(self, toc, root_ids):
+        self.order = order = []
+        self.pre = pre = {}
+        self.ends = ends = {}
+
+        # traverse iteratively to support an arbitrarily deep tree
+        low = {}
+        for root_id in itertools.chain(root_ids, toc):
+            if root_id in pre:
+                continue
+            pre[root_id] = low[root_id] = len(order)
+            order.append(root_id)
+            stack = [(root_id, iter(toc.get(root_id, ())))]
+            while stack:
+                item_id, it = stack[-1]
+                for child_id in it:
+                    i = pre.get(child_id)
+                    if i is None:
+                        pre[child_id] = low[child_id] = len(order)
+                        order.append(child_id)
+                        stack.append((child_id, iter(toc.get(child_id, ()))))
+                        break
+                    if i < low[item_id]:
+                        low[item_id] = i
+                else:
+                    stack.pop()
+                    if low[item_id] >= pre[item_id]:
+                        ends[item_id] = len(order)
+                    if stack:
+                        parent_id = stack[-1][0]
+                        if low[item_id] < low[parent_id]:
+                            low[parent_id] = low[item_id]
+
+    def collect(self, item_id, rv):
+        """Add the items reachable from item_id to rv in traversal order.
+
+        Returns:
+            bool: False if not determinable by the index
+        """
+        if item_id in rv:
+            return True
+
+        try:
+            start = self.pre[item_id]
+        except KeyError:
+            # not in the TOC
+            rv[item_id] = True
+            return True
+
+        try:
+            end = self.ends[item_id]
+        except KeyError:
+            return False
+
+        item_ids = self.order[start:end]
+
+        # an item already in rv is not traversed again, which changes the
+        # result
+        if not rv.keys().isdisjoint(item_ids):
+            return False
+
+        rv.update(zip(item_ids, itertools.repeat(True)))
+        return True
+
+    def is_reachable(self, item_id, from_id):
+        """Check whether item_id is reachable from from_id.
+
+        Returns:
+            bool: the result, or None if not determinable by the index
+        """
+        if item_id == from_id:
+            return True
+
+        try:
+            start = self.pre[from_id]
+        except KeyError:
+            # not in the TOC
+            return False
+
+        try:
+            end = self.ends[from_id]
+        except KeyError:
+            return None
+
+        i = self.pre.get(item_id)
+        return i is not None and start <= i < end
+
+
 class Book:
     """Main scrapbook book controller.
     """
@@ -52,7 +680,12 @@ class Book:
     # https://stackoverflow.com/questions/16005091/node-js-javascript-stringify
     JSON_TRANSLATER = str.maketrans({'\u2028': '\\u2028', '\u2029': '\\u2029'})
 
-    REGEX_TREE_FILE_WRAPPER = re.compile(r'^(?:/\*.*\*/|[^(])+\(([\s\S]*)\)(?:/\*.*\*/|[\s;])*$')
+    # The wrapping parts of a tree file, i.e. the text around the JSON data.
+    # The JSON data is decoded in place between them, to avoid copying the
+    # whole (possibly very large) JSON text.
+    REGEX_TREE_FILE_PREFIX = re.compile(r'(?:/\*.*\*/|[^(])+\([ \t\n\r]*')
+    REGEX_TREE_FILE_SUFFIX = re.compile(r'[ \t\n\r]*\)(?:/\*.*\*/|[\s;])*$')
+    REGEX_TREE_FILE_SUFFIX_ANY = re.compile(r'\)(?:/\*.*\*/|[\s;])*$')
     REGEX_ITEM_POSTIT = re.compile(r'^.*?<pre>\n?([^<]*(?:<(?!/pre>)[^<]*)*)\n</pre>.*$', re.S)
 
     # A javascript string >= 256 MiB (UTF-16 chars) causes an error in some
@@ -68,6 +701,27 @@ class Book:
     # Split at at around 128 MiB
     SAVE_FULLTEXT_THRESHOLD = 128 * 1024 * 1024
 
+    # Rewrite only the tree files with a changed item when possible, unless
+    # a file gets larger than the ratio of the threshold due to the changes.
+    SAVE_SHARD_MAX_RATIO = 1.5
+
+    # Max number of threads for writing tree files concurrently
+    SAVE_SHARD_MAX_WORKERS = 4
+
+    # In journal mode, fold the journal files back into the base files when
+    # there are too many of them or they get too large compared to the base
+    # files.
+    SAVE_JOURNAL_MAX_FILES = 32
+    SAVE_JOURNAL_MAX_RATIO = 0.25
+
+    TREE_FILE_JOURNAL_HEADER = '/* Journal of changes to the preceding files. Do not edit. */\n'
+
+    # Snapshots of the parsed tree files (with tree_snapshot enabled) are
+    # stored in marshal format, which is fast to load but not portable among
+    # Python versions.
+    TREE_SNAPSHOT_DIR = 'snapshots'
+    TREE_SNAPSHOT_TAG = f'{sys.implementation.cache_tag}-{marshal.version}'
+
     REPR_ATTRS = ('id', 'name', 'top_dir')
     DEFAULT_META = {
         'id': None,
@@ -147,15 +801,45 @@ class Book:
         self.data_dir = os.path.normpath(os.path.join(self.top_dir, config['data_dir']))
         self.tree_dir = os.path.normpath(os.path.join(self.top_dir, config['tree_dir']))
         self.no_tree = config['no_tree']
+        self.tree_journal = config['tree_journal']
+        self.tree_snapshot = config['tree_snapshot']
+        self.compact_meta = config['compact_meta']
+        self.fulltext_index = config['fulltext_index']
 
         self.meta = None
         self.toc = None
         self.fulltext = None
 
+        # indexes of the TOC and the version of the TOC (a TreeData) they
+        # are up to date with
+        self._parent_index = None
+        self._parent_index_version = None
+        self._parent_index_shared = False
+        self._reach_index = None
+        self._reach_index_version = None
+        self._reach_query_version = None
+        self._data_names = None
+        self._data_names_stamp = None
+
     def __repr__(self):
         repr_str = ', '.join(f'{attr}={repr(getattr(self, attr))}' for attr in self.REPR_ATTRS)
         return f'{self.__class__.__name__}({repr_str})'
 
+    @classmethod
+    def get_tree_state(cls, data):
+        """Get a state of tree data for checking whether it's changed later.
+
+        A TreeData is represented by its version, which is much cheaper than
+        a checksum of the whole data. Other objects fall back to checksum().
+        """
+        if isinstance(data, TreeData):
+            # a value not tracked may be modified silently; always take
+            # as changed
+            if data.has_untracked:
+                return object()
+            return data.version
+        return cls.checksum(data)
+
     @staticmethod
     def checksum(obj, method='sha1'):
         """Get a checksum of an object (by its JSONified string)."""
@@ -211,32 +895,153 @@ class Book:
         if text == '':
             return {}
 
-        m = self.REGEX_TREE_FILE_WRAPPER.search(text)
-
+        m = self.REGEX_TREE_FILE_PREFIX.match(text)
         if not m:
             raise TreeFileMalformedWrappingError('Malformed tree file wrapping', filename=file)
 
+        # a JSON error is a wrapping error if the closing part is missing
+        start = m.end()
         try:
-            return json.loads(m.group(1))
+            data, end = _json_decoder.raw_decode(text, start)
         except json.decoder.JSONDecodeError as exc:
+            if not self.REGEX_TREE_FILE_SUFFIX_ANY.search(text, start):
+                raise TreeFileMalformedWrappingError('Malformed tree file wrapping', filename=file) from None
+            raise TreeFileMalformedJsonError(f'Malformed tree file: {exc}', filename=file) from exc
+
+        if not self.REGEX_TREE_FILE_SUFFIX.match(text, end):
+            if not self.REGEX_TREE_FILE_SUFFIX_ANY.search(text, end):
+                raise TreeFileMalformedWrappingError('Malformed tree file wrapping', filename=file)
+            exc = json.decoder.JSONDecodeError('Extra data', text, end)
             raise TreeFileMalformedJsonError(f'Malformed tree file: {exc}', filename=file) from exc
 
-    def load_tree_files(self, name):
+        return data
+
+    def get_tree_files_signature(self, name):
+        """Get a signature of the current tree files of name, which changes
+        whenever any of the files is changed.
+        """
+        rv = []
+        for file in self.iter_tree_files(name):
+            try:
+                st = os.stat(file)
+            except OSError:
+                break
+            rv.append((os.path.basename(file), st.st_size, st.st_mtime_ns, st.st_ino))
+        return tuple(rv)
+
+    def load_tree_files(self, name, factory=TreeData):
+        signature = self.get_tree_files_signature(name)
         data = {}
+        shard_map = {}
+        shard_count = 0
+        count = 0
         for file in self.iter_tree_files(name):
-            data.update(self.load_tree_file(file))
+            d = self._load_tree_file_cached(file)
+            data.update(d)
+            shard_map.update(dict.fromkeys(d, shard_count))
+            shard_count += 1
+            count += len(d)
+
+        # The shard map is valid only if each item is in exactly one file.
+        shards_valid = len(data) == count
 
         # remove top-level None values to allow quick clear by appending file
         # e.g. add meta1.js with {'id1': None} to quickly delete 'id1' in meta.js
         for k in tuple(data):
             if data[k] is None:
                 del data[k]
+                shards_valid = False
 
+        data = factory(data)
+        data.files_signature = signature
+        if shards_valid:
+            data.shard_map = shard_map
+            data.shard_count = shard_count
         return data
 
+    def _load_tree_file_cached(self, file):
+        """Load a tree file through the tree cache of the host and/or the
+        tree snapshot.
+
+        The returned data may be shared with the cache and must not be
+        modified. load_tree_files() wraps the values into copies.
+        """
+        cache = self.host.tree_cache
+        if cache is None and not self.tree_snapshot:
+            return self.load_tree_file(file)
+
+        try:
+            signature = wsb_host.TreeCache.get_signature(file)
+        except OSError:
+            return self.load_tree_file(file)
+
+        if cache is not None:
+            data = cache.get(file, signature)
+            if data is not None:
+                return data
+
+        data = None
+        if self.tree_snapshot:
+            data = self._load_tree_snapshot(file, signature)
+        if data is None:
+            data = self.load_tree_file(file)
+            if self.tree_snapshot:
+                self._save_tree_snapshot(file, signature, data)
+
+        if cache is not None:
+            cache.set(file, signature, data)
+
+        return data
+
+    def get_tree_snapshot_file(self, file):
+        return os.path.join(self.tree_dir, self.TREE_SNAPSHOT_DIR, f'{os.path.basename(file)}.bin')
+
+    def _load_tree_snapshot(self, file, signature):
+        """Load the snapshot of a tree file.
+
+        Returns:
+            dict: the data, or None if the snapshot is missing, outdated, or
+                broken
+        """
+        try:
+            with open(self.get_tree_snapshot_file(file), 'rb') as fh:
+                tag, sig, data = marshal.loads(fh.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+        if tag != self.TREE_SNAPSHOT_TAG or sig != signature or not isinstance(data, dict):
+            return None
+
+        return data
+
+    def _save_tree_snapshot(self, file, signature, data):
+        """Save the snapshot of a tree file.
+
+        The snapshot is an optional cache, and any error is ignored.
+        """
+        snapshot = self.get_tree_snapshot_file(file)
+        try:
+            os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+
+            # write to a temp file and then replace, so that a concurrent
+            # load never gets a partially written snapshot
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(snapshot))
+            try:
+                with open(fd, 'wb') as fh:
+                    marshal.dump((self.TREE_SNAPSHOT_TAG, signature, data), fh)
+                os.replace(tmp, snapshot)
+            except BaseException:
+                os.remove(tmp)
+                raise
+        except (OSError, ValueError):
+            pass
+
     def load_meta_files(self, refresh=False):
         if refresh or self.meta is None:
-            self.meta = self.load_tree_files('meta')
+            if self.compact_meta:
+                self.meta = self.load_tree_files('meta', CompactMetaData)
+            else:
+                self.meta = self.load_tree_files('meta')
 
     def load_toc_files(self, refresh=False):
         if refresh or self.toc is None:
@@ -246,6 +1051,15 @@ class Book:
         if refresh or self.fulltext is None:
             self.fulltext = self.load_tree_files('fulltext')
 
+    def load_fulltext_file(self, index):
+        """Load a fulltext file through the tree cache of the host and/or the
+        tree snapshot.
+
+        The returned data may be shared with the cache and must not be
+        modified.
+        """
+        return self._load_tree_file_cached(self.get_tree_file('fulltext', index))
+
     def save_tree_file(self, name, index, gen):
         """Save a tree file.
 
@@ -254,55 +1068,63 @@ class Book:
         """
         file = self.get_tree_file(name, index)
         self.backup(file)
+        self._discard_tree_cache(file)
         with open(file, 'w', encoding='UTF-8', newline='\n') as fh:
             for chunk in gen:
                 fh.write(chunk.translate(self.JSON_TRANSLATER))
 
-    def _gen_meta_file(self, data):
-        yield '/* Feel free to edit this file, but keep data code valid JSON format. */\n'
+    def _discard_tree_cache(self, file):
+        # A rewrite may not be detected by the signature of the file on a
+        # filesystem with coarse timestamps. Drop the entry explicitly.
+        if self.host.tree_cache is not None:
+            self.host.tree_cache.discard(file)
+
+        try:
+            os.remove(self.get_tree_snapshot_file(file))
+        except OSError:
+            pass
+
+    def _gen_meta_file(self, data, journal=False):
+        if journal:
+            yield self.TREE_FILE_JOURNAL_HEADER
+        else:
+            yield '/* Feel free to edit this file, but keep data code valid JSON format. */\n'
         yield 'scrapbook.meta('
         yield from json.JSONEncoder(
             ensure_ascii=False,
             check_circular=False,
             indent=2,
+            default=_json_default,
         ).iterencode(data)
         yield ')'
 
     def save_meta_files(self):
         """Save to tree/meta#.js
+
+        In journal mode, only the changes are appended as a new file, unless
+        the journal files should be compacted.
+
+        The cached indexes of the meta files, if any, are updated for the
+        saved files. As they may be in use by other readers, copies of them
+        are updated and cached instead.
         """
-        os.makedirs(os.path.join(self.tree_dir), exist_ok=True)
-        i = 0
-        size = 1
-        meta = {}
-        for id in tuple(self.meta):
-            if self.meta[id] is None:
-                del self.meta[id]
-                continue
-            meta[id] = self.meta[id]
-            size += 1
-            if size >= self.SAVE_META_THRESHOLD:
-                self.save_tree_file('meta', i, self._gen_meta_file(meta))
-                i += 1
-                size = 0
-                meta = {}
+        indexes = [index for index in (cls.get_cached(self)
+                                       for cls in (TrigramIndex, DateIndex, ExactIndex, MetaColumns))
+                   if index is not None]
+        changed = list(self.meta.dirty) if indexes else None
 
-        if size:
-            self.save_tree_file('meta', i, self._gen_meta_file(meta))
-            i += 1
+        if not (self.tree_journal and self._save_tree_journal('meta', self.meta, self._gen_meta_file)):
+            self._save_tree_files('meta', self.meta, self._gen_meta_file,
+                                  self.SAVE_META_THRESHOLD, lambda item: 1)
 
-        # remove unused tree/meta#.js
-        while True:
-            file = self.get_tree_file('meta', i)
-            try:
-                self.backup(file)
-                os.remove(file)
-            except FileNotFoundError:
-                break
-            i += 1
+        for index in indexes:
+            index.copy().update(self.meta, changed).set_cached(self, self.meta.files_signature)
 
-    def _gen_toc_file(self, data):
-        yield '/* Feel free to edit this file, but keep data code valid JSON format. */\n'
+    def _gen_toc_file(self, data, journal=False):
+        if journal:
+            yield self.TREE_FILE_JOURNAL_HEADER
+        else:
+            yield '/* Feel free to edit this file, but keep data code valid JSON format. */\n'
         yield 'scrapbook.toc('
         yield from json.JSONEncoder(
             ensure_ascii=False,
@@ -313,36 +1135,19 @@ class Book:
 
     def save_toc_files(self):
         """Save to tree/toc#.js
+
+        In journal mode, only the changes are appended as a new file, unless
+        the journal files should be compacted.
         """
-        os.makedirs(os.path.join(self.tree_dir), exist_ok=True)
-        i = 0
-        size = 1
-        toc = {}
-        for id in tuple(self.toc):
-            if self.toc[id] is None:
-                del self.toc[id]
-                continue
-            toc[id] = self.toc[id]
-            size += 1 + len(toc[id])
-            if size >= self.SAVE_TOC_THRESHOLD:
-                self.save_tree_file('toc', i, self._gen_toc_file(toc))
-                i += 1
-                size = 0
-                toc = {}
+        parent_index = self._get_synced_parent_index()
 
-        if size:
-            self.save_tree_file('toc', i, self._gen_toc_file(toc))
-            i += 1
+        if not (self.tree_journal and self._save_tree_journal('toc', self.toc, self._gen_toc_file)):
+            self._save_tree_files('toc', self.toc, self._gen_toc_file,
+                                  self.SAVE_TOC_THRESHOLD, lambda item: 1 + len(item))
 
-        # remove unused tree/toc#.js
-        while True:
-            file = self.get_tree_file('toc', i)
-            try:
-                self.backup(file)
-                os.remove(file)
-            except FileNotFoundError:
-                break
-            i += 1
+        # share the parent index kept up to date for the saved files
+        if parent_index is not None and self._set_cached_toc_index(parent_index):
+            self._parent_index_shared = True
 
     def _gen_fulltext_file(self, data):
         yield '/* This file is generated by WebScrapBook and is not intended to be edited. */\n'
@@ -359,38 +1164,259 @@ class Book:
 
     def save_fulltext_files(self):
         """Save to tree/fulltext#.js
+
+        The summary of the fulltext files (see FulltextSummary) is updated
+        for the saved files.
         """
+        signature = getattr(self.fulltext, 'files_signature', None)
+        changed = list(getattr(self.fulltext, 'dirty', ()))
+
+        shards = self._save_tree_files('fulltext', self.fulltext, self._gen_fulltext_file,
+                                       self.SAVE_FULLTEXT_THRESHOLD,
+                                       lambda item: sum(len(v['content']) for v in item.values()))
+
+        # the summary is an optional cache
+        try:
+            FulltextSummary.update(self, shards, changed, signature)
+        except OSError:
+            FulltextSummary.discard(self)
+
+    def _save_tree_files(self, name, data, gen_func, threshold, get_size):
+        """Save data to the tree files of name.
+
+        Only the tree files with a changed item are rewritten if possible.
+        Otherwise, all items are repacked into tree files of around threshold
+        size. Nothing is written if no item is really changed since the tree
+        files are loaded or saved.
+
+        Args:
+            get_size: a function that takes an item and returns the size
+
+        Returns:
+            dict: the index => data of each rewritten tree file
+        """
+        if (isinstance(data, TreeData) and not data.discard_unchanged()
+                and not data.has_untracked and data.files_signature
+                and data.files_signature == self.get_tree_files_signature(name)):
+            data.mark_clean()
+            return {}
+
         os.makedirs(os.path.join(self.tree_dir), exist_ok=True)
-        i = 0
+        shards = self._save_tree_files_changed(name, data, gen_func, threshold, get_size)
+        if shards is None:
+            shards = self._save_tree_files_all(name, data, gen_func, threshold, get_size)
+
+        self._mark_tree_saved(name, data)
+        return shards
+
+    def _save_tree_files_all(self, name, data, gen_func, threshold, get_size):
+        shards = []
         size = 1
-        fulltext = {}
-        for id in tuple(self.fulltext):
-            if self.fulltext[id] is None:
-                del self.fulltext[id]
+        shard = {}
+        for id in tuple(data):
+            if data[id] is None:
+                del data[id]
                 continue
-            fulltext[id] = self.fulltext[id]
-            for path in fulltext[id]:
-                size += len(fulltext[id][path]['content'])
-            if size >= self.SAVE_FULLTEXT_THRESHOLD:
-                self.save_tree_file('fulltext', i, self._gen_fulltext_file(fulltext))
-                i += 1
+            shard[id] = data[id]
+            size += get_size(shard[id])
+            if size >= threshold:
+                shards.append(shard)
                 size = 0
-                fulltext = {}
+                shard = {}
 
         if size:
-            self.save_tree_file('fulltext', i, self._gen_fulltext_file(fulltext))
-            i += 1
+            shards.append(shard)
 
-        # remove unused tree/fulltext#.js
+        self._write_tree_shards(name, enumerate(shards), gen_func)
+
+        # remove unused tree files
+        i = len(shards)
         while True:
-            file = self.get_tree_file('fulltext', i)
+            file = self.get_tree_file(name, i)
             try:
                 self.backup(file)
+                self._discard_tree_cache(file)
                 os.remove(file)
             except FileNotFoundError:
                 break
             i += 1
 
+        if isinstance(data, TreeData):
+            data.shard_map = {id: i for i, shard in enumerate(shards) for id in shard}
+            data.shard_count = len(shards)
+
+        return dict(enumerate(shards))
+
+    def _save_tree_files_changed(self, name, data, gen_func, threshold, get_size):
+        """Rewrite only the tree files having a changed item.
+
+        The tree file an item was loaded from is tracked by the shard map of
+        a TreeData, and new items are appended to the last tree files.
+
+        Returns:
+            dict: the index => data of each rewritten tree file, or None if
+                the tree files should be fully repacked, e.g. the shard map is
+                unavailable, or a tree file gets empty or too large.
+        """
+        if not isinstance(data, TreeData) or data.shard_map is None:
+            return None
+
+        # journal files should be compacted by a repack
+        if self.tree_journal:
+            return None
+
+        # tree files have been changed since the shard map is taken, e.g.
+        # edited or repacked by another tool
+        count = data.shard_count
+        if not count or data.files_signature is None:
+            return None
+        signature = self.get_tree_files_signature(name)
+        if len(signature) != count or signature != data.files_signature:
+            return None
+
+        shard_map = data.shard_map
+        last = count - 1
+        changed = set()
+        new_ids = []
+        for id in tuple(data.dirty):
+            i = shard_map.get(id)
+            if data.get(id) is None:
+                data.pop(id, None)
+                if i is not None:
+                    del shard_map[id]
+                    changed.add(i)
+            elif i is None:
+                new_ids.append(id)
+            else:
+                changed.add(i)
+
+        if new_ids:
+            changed.add(last)
+
+        if not changed:
+            return {}
+
+        shards = {i: {} for i in changed}
+        for id, i in shard_map.items():
+            try:
+                shards[i][id] = data[id]
+            except KeyError:
+                pass
+
+        max_size = threshold * self.SAVE_SHARD_MAX_RATIO
+        for i, shard in shards.items():
+            if not shard and not (i == last and new_ids):
+                return None
+            if sum(get_size(item) for item in shard.values()) > max_size:
+                return None
+
+        # append new items to the last shard, or new shards if it's full
+        size = sum(get_size(item) for item in shards[last].values()) if new_ids else 0
+        i = last
+        for id in new_ids:
+            if size >= threshold:
+                i += 1
+                shards[i] = {}
+                size = 0
+            shards[i][id] = data[id]
+            shard_map[id] = i
+            size += get_size(data[id])
+        data.shard_count = i + 1
+
+        self._write_tree_shards(name, sorted(shards.items()), gen_func)
+        return shards
+
+    def _write_tree_shards(self, name, shards, gen_func):
+        """Write tree files concurrently.
+
+        Args:
+            shards: an iterable of (index, data) tuples
+        """
+        shards = list(shards)
+        if len(shards) <= 1:
+            for i, shard in shards:
+                self.save_tree_file(name, i, gen_func(shard))
+            return
+
+        with ThreadPoolExecutor(max_workers=self.SAVE_SHARD_MAX_WORKERS) as executor:
+            futures = [executor.submit(self.save_tree_file, name, i, gen_func(shard)) for i, shard in shards]
+            for future in futures:
+                future.result()
+
+    def is_tree_journal_file(self, file):
+        """Check whether a tree file is a journal file."""
+        header = self.TREE_FILE_JOURNAL_HEADER
+        try:
+            with open(file, encoding='UTF-8') as fh:
+                return fh.read(len(header)) == header
+        except (OSError, UnicodeDecodeError):
+            return False
+
+    def _save_tree_journal(self, name, data, gen_func):
+        """Append the changes of data since the tree files as a journal file.
+
+        Returns:
+            bool: True if the journal is saved (or there's no change), or False
+                if the tree files should be fully saved (compacted) instead.
+        """
+        files = list(self.iter_tree_files(name))
+        if not files:
+            return False
+
+        journal_cnt = 0
+        journal_size = 0
+        base_size = 0
+        for file in files:
+            size = os.stat(file).st_size
+            if self.is_tree_journal_file(file):
+                journal_cnt += 1
+                journal_size += size
+            else:
+                base_size += size
+
+        if (journal_cnt >= self.SAVE_JOURNAL_MAX_FILES
+                or journal_size > base_size * self.SAVE_JOURNAL_MAX_RATIO):
+            return False
+
+        changes = {}
+        if isinstance(data, TreeData):
+            # take the changed items from the tracking
+            data.discard_unchanged()
+            deleted = []
+            for id in data.dirty:
+                value = data.get(id)
+                if value is None:
+                    deleted.append(id)
+                    continue
+                changes[id] = value
+            for id in deleted:
+                data.pop(id, None)
+                changes[id] = None
+        else:
+            base = self.load_tree_files(name)
+            for id in tuple(data):
+                value = data[id]
+                if value is None:
+                    del data[id]
+                    continue
+                if base.get(id) != value:
+                    changes[id] = value
+            for id in base:
+                if id not in data:
+                    changes[id] = None
+
+        if changes:
+            self.save_tree_file(name, len(files), gen_func(changes, journal=True))
+
+        self._mark_tree_saved(name, data)
+
+        return True
+
+    def _mark_tree_saved(self, name, data):
+        if isinstance(data, TreeData):
+            data.mark_clean()
+            data.files_signature = self.get_tree_files_signature(name)
+
     def backup(self, file, **kwargs):
         """A shortcut for auto backup.
         """
@@ -495,7 +1521,12 @@ class Book:
         if dict is None:
             dict = {}
 
+        index = None
         for item_id in item_ids:
+            if index is None:
+                index = self._get_reach_index() or False
+            if index and index.collect(item_id, dict):
+                continue
             self._get_reachable_items(item_id, dict)
 
         return dict
@@ -506,13 +1537,100 @@ class Book:
 
         dict[item_id] = True
 
-        try:
-            child_ids = self.toc[item_id]
-        except KeyError:
-            return
+        stack = [iter(self.toc.get(item_id, ()))]
+        while stack:
+            for child_id in stack[-1]:
+                if child_id in dict:
+                    continue
+                dict[child_id] = True
+                child_ids = self.toc.get(child_id)
+                if child_ids:
+                    stack.append(iter(child_ids))
+                    break
+            else:
+                stack.pop()
+
+    def is_reachable(self, item_id, from_id):
+        """Check whether an item is reachable from another item (or itself).
+        """
+        index = self._get_reach_index()
+        if index is not None:
+            rv = index.is_reachable(item_id, from_id)
+            if rv is not None:
+                return rv
+
+        dict = {}
+        self._get_reachable_items(from_id, dict)
+        return item_id in dict
+
+    def _get_reach_index(self):
+        """Get the reachability index of the TOC.
+
+        The index for the TOC files is shared through the tree cache of the
+        host, and is built on first use. Otherwise, the index is built when
+        the TOC is queried again without a change, as a single query is
+        cheaper by a direct traversal.
 
-        for child_id in child_ids:
-            self._get_reachable_items(child_id, dict)
+        Returns:
+            _ReachIndex: the index, or None if not available
+        """
+        toc = self.toc
+        if not isinstance(toc, TreeData):
+            return None
+
+        index = self._reach_index
+        if index is not None and self._reach_index_version == toc.version:
+            return index
+
+        index = self._get_cached_toc_index(_ReachIndex)
+        if index is None:
+            if not self._can_cache_toc_index() and self._reach_query_version != toc.version:
+                self._reach_query_version = toc.version
+                return None
+
+            index = _ReachIndex(toc, self.SPECIAL_ITEM_ID)
+            self._set_cached_toc_index(index)
+
+        self._reach_index = index
+        self._reach_index_version = toc.version
+        return index
+
+    def _can_cache_toc_index(self):
+        # an index can be shared only if the TOC is the same as the files
+        toc = self.toc
+        return (self.host.tree_cache is not None and isinstance(toc, TreeData)
+                and toc.files_signature is not None and not toc.dirty)
+
+    def _get_toc_index_cache_key(self, cls):
+        signature = self.toc.files_signature
+        # TreeCache takes the first element as the size of the entry, which
+        # is approximated by the size of the TOC files
+        return os.path.join(self.tree_dir, cls.CACHE_NAME), (sum(sig[1] for sig in signature), signature)
+
+    def _get_cached_toc_index(self, cls):
+        """Get the cached index of the TOC files self.toc is loaded from or
+        saved to, if self.toc is not changed since then.
+
+        The returned index is shared and must not be modified.
+
+        Returns:
+            the index, or None if not cached
+        """
+        if not self._can_cache_toc_index():
+            return None
+        return self.host.tree_cache.get(*self._get_toc_index_cache_key(cls))
+
+    def _set_cached_toc_index(self, index):
+        """Cache an index for the TOC files, if self.toc is not changed since
+        they are loaded or saved.
+
+        Returns:
+            bool: whether the index is cached and thus shared
+        """
+        if not self._can_cache_toc_index():
+            return False
+        self.host.tree_cache.set(*self._get_toc_index_cache_key(type(index)), index)
+        return True
 
     def get_unique_id(self, item_id=None):
         """Get an unique item ID.
@@ -523,9 +1641,9 @@ class Book:
         if item_id is None:
             item_id = _id_now()
 
+        data_names = self._get_data_names()
         while (item_id in self.meta
-               or os.path.lexists(os.path.join(self.data_dir, item_id))
-               or next(glob.iglob(glob.escape(os.path.join(self.data_dir, item_id)) + '.*'), None)
+               or os.path.normcase(item_id) in data_names
                ):
             try:
                 dt += timedelta(milliseconds=1)  # noqa: F821
@@ -536,6 +1654,83 @@ class Book:
 
         return item_id
 
+    def mark_data_file(self, file):
+        """Record a file created under data_dir for get_unique_id().
+
+        This keeps the index of data_dir entry names up to date even if the
+        creation doesn't change the modified time of data_dir, e.g. for a
+        coarse timestamp resolution. The stamp of the last scan is kept so
+        that other changes of data_dir still trigger a rescan. Use
+        creating_data_file() instead to avoid the rescan.
+        """
+        names = self._data_names
+        if names is None:
+            return
+
+        rel = os.path.relpath(os.path.normpath(file), self.data_dir)
+        name = rel.split(os.sep, 1)[0]
+        if name in (os.curdir, os.pardir):
+            return
+
+        self._add_data_name(names, name)
+
+    @contextmanager
+    def creating_data_file(self, file):
+        """Record a file created under data_dir in the with block for
+        get_unique_id().
+
+        data_dir is checked before and after the creation, and the index of
+        data_dir entry names is kept without a rescan if data_dir was not
+        modified since the last scan before the creation, so that the
+        change is explained by the creation.
+        """
+        stamp = self._get_data_names_stamp()
+        try:
+            yield
+        finally:
+            self.mark_data_file(file)
+            if self._data_names is not None and stamp == self._data_names_stamp:
+                self._data_names_stamp = self._get_data_names_stamp()
+
+    def _get_data_names(self):
+        """Get the set of names and stems of the entries under data_dir.
+
+        A name is also registered for each leading part before a dot so
+        that "<id>.*" can be checked with a set lookup.
+
+        The index is rebuilt when data_dir is modified since the last scan.
+        """
+        stamp = self._get_data_names_stamp()
+        names = self._data_names
+        if names is not None and stamp == self._data_names_stamp:
+            return names
+
+        names = self._data_names = set()
+        self._data_names_stamp = stamp
+        try:
+            with os.scandir(self.data_dir) as entries:
+                for entry in entries:
+                    self._add_data_name(names, entry.name)
+        except OSError:
+            pass
+        return names
+
+    def _get_data_names_stamp(self):
+        try:
+            st = os.stat(self.data_dir)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    @staticmethod
+    def _add_data_name(names, name):
+        name = os.path.normcase(name)
+        names.add(name)
+        i = name.find('.')
+        while i != -1:
+            names.add(name[:i])
+            i = name.find('.', i + 1)
+
     def get_template(self, type, ext='.html'):
         try:
             tpl = self.TEMPLATES[(type, ext)]
@@ -567,14 +1762,6 @@ class Book:
         Returns:
             dict: information of the items
         """
-        reverse_toc = {}
-        if include_parents:
-            for parent_id, toc in self.toc.items():
-                for i, item_id in enumerate(toc):
-                    reverse_toc.setdefault(item_id, []).append(
-                        (parent_id, i),
-                    )
-
         results = {}
         for item_id in items:
             result = {}
@@ -588,8 +1775,8 @@ class Book:
                 result['children'] = children
 
             if include_parents:
-                parents = reverse_toc.get(item_id)
-                if parents is not None:
+                parents = self.get_parents(item_id)
+                if parents:
                     result['parents'] = parents
 
             if result:
@@ -597,6 +1784,100 @@ class Book:
 
         return results
 
+    def get_parents(self, item_id):
+        """Get the positions of an item in the TOC.
+
+        The parent index for the TOC files is shared through the tree cache
+        of the host, or built once otherwise, and is then updated along with
+        the TOC changes made through the item methods of the book. It's
+        rebuilt if the TOC is changed otherwise.
+
+        Returns:
+            list: (parent_id, index) tuples, in TOC order
+        """
+        index = self._get_parent_index()
+        rv = []
+        for parent_id, count in index.get_parents(item_id):
+            item_ids = self.toc[parent_id]
+            i = -1
+            for _ in range(count):
+                i = item_ids.index(item_id, i + 1)
+                rv.append((parent_id, i))
+        return rv
+
+    def _get_parent_index(self):
+        index = self._get_synced_parent_index()
+        if index is not None:
+            return index
+
+        toc = self.toc
+        index = self._get_cached_toc_index(_ParentIndex)
+        shared = index is not None
+        if index is None:
+            index = _ParentIndex(toc)
+            shared = self._set_cached_toc_index(index)
+
+        self._parent_index = index
+        self._parent_index_version = toc.version if isinstance(toc, TreeData) else None
+        self._parent_index_shared = shared
+        return index
+
+    def _get_synced_parent_index(self, update=False):
+        """Get the parent index if it's up to date with the TOC.
+
+        Args:
+            update: whether the index is to be updated, which replaces a
+                shared index with a copy of it
+        """
+        index = self._parent_index
+        version = self._parent_index_version
+        if index is None or version is None or version != getattr(self.toc, 'version', None):
+            return None
+        if update and self._parent_index_shared:
+            index = self._parent_index = index.copy()
+            self._parent_index_shared = False
+        return index
+
+    def _toc_insert(self, parent_id, index, item_ids):
+        """Insert items to the TOC of a parent and update the parent index."""
+        parent_index = self._get_synced_parent_index(update=True)
+        item_ids = list(item_ids)
+        if parent_index is not None and parent_id not in self.toc:
+            parent_index.add_parent(parent_id)
+        self.toc.setdefault(parent_id, [])[index:index] = item_ids
+        if parent_index is not None:
+            for item_id in item_ids:
+                parent_index.add(parent_id, item_id)
+            self._parent_index_version = self.toc.version
+
+    def _toc_remove(self, parent_id, index):
+        """Remove an item from the TOC of a parent and update the parent
+        index."""
+        parent_index = self._get_synced_parent_index(update=True)
+        item_ids = self.toc[parent_id]
+        item_id = item_ids.pop(index)
+        if not item_ids:
+            del self.toc[parent_id]
+        if parent_index is not None:
+            parent_index.remove(parent_id, item_id)
+            if not item_ids:
+                parent_index.remove_parent(parent_id)
+            self._parent_index_version = self.toc.version
+
+    def _toc_delete(self, parent_id):
+        """Remove the TOC of a parent and update the parent index.
+
+        Raises:
+            KeyError: if the parent has no TOC
+        """
+        parent_index = self._get_synced_parent_index(update=True)
+        item_ids = self.toc.pop(parent_id)
+        if parent_index is not None:
+            for item_id in item_ids:
+                parent_index.remove(parent_id, item_id)
+            parent_index.remove_parent(parent_id)
+            self._parent_index_version = self.toc.version
+
     def add_item(self, item=None, target_parent_id=ROOT_ITEM_ID, target_index=None):
         """Singular version shortcut of add_items()."""
         return self.add_items((item,), target_parent_id, target_index)
@@ -659,7 +1940,7 @@ class Book:
                 target_index = 0 if self.config['new_at_top'] else float('inf')
             target_index = min(target_index, len(self.toc.get(target_parent_id, ())))
 
-            self.toc.setdefault(target_parent_id, [])[target_index:target_index] = rv
+            self._toc_insert(target_parent_id, target_index, rv)
 
         return rv
 
@@ -820,8 +2101,8 @@ class Book:
 
             # Silently ignore moving into a descendant as it will become
             # non-reachable (unless move within the same parent).
-            if (target_parent_id in self.get_reachable_items(item_id)
-                    and current_parent_id != target_parent_id):
+            if (current_parent_id != target_parent_id
+                    and self.is_reachable(target_parent_id, item_id)):
                 continue
 
             tasks[item] = True
@@ -836,17 +2117,15 @@ class Book:
 
             for _, current_parent_id, current_index in it:
                 # remove from parent TOC
-                del self.toc[current_parent_id][current_index]
-                if not self.toc[current_parent_id]:
-                    del self.toc[current_parent_id]
+                self._toc_remove(current_parent_id, current_index)
 
                 # fix when moving within the same parent
                 if current_parent_id == target_parent_id and current_index < target_index:
                     target_index -= 1
 
-            self.toc.setdefault(target_parent_id, [])[target_index:target_index] = (
+            self._toc_insert(target_parent_id, target_index, (
                 item_id for item_id, _, _ in tasks
-            )
+            ))
 
         return target_index
 
@@ -906,9 +2185,9 @@ class Book:
 
         # perform the tasks
         if tasks:
-            self.toc.setdefault(target_parent_id, [])[target_index:target_index] = (
+            self._toc_insert(target_parent_id, target_index, (
                 item_id for item_id, _, _ in tasks
-            )
+            ))
 
         return target_index
 
@@ -1011,7 +2290,7 @@ class Book:
         else:
             if _item_id is not None:
                 # already copied, simply link to the copy
-                target_book.toc.setdefault(target_parent_id, []).insert(target_index, _item_id)
+                target_book._toc_insert(target_parent_id, target_index, (_item_id,))
                 return
             else:
                 # an added copy, ignore it to prevent an infinite loop
@@ -1056,7 +2335,8 @@ class Book:
             old_index_file = os.path.normpath(os.path.join(self.data_dir, old_index))
             new_index_file = os.path.normpath(os.path.join(target_book.data_dir, new_index))
             if os.path.lexists(old_index_file):
-                util.fs.copy(old_index_file, new_index_file)
+                with target_book.creating_data_file(new_index_file):
+                    util.fs.copy(old_index_file, new_index_file)
 
         # copy cached favicon
         if target_book.id != self.id:
@@ -1132,9 +2412,7 @@ class Book:
 
         for _, current_parent_id, current_index in it:
             # remove from parent TOC
-            del self.toc[current_parent_id][current_index]
-            if not self.toc[current_parent_id]:
-                del self.toc[current_parent_id]
+            self._toc_remove(current_parent_id, current_index)
 
         # handle unreachable items
         reachable_items = self.get_reachable_items()
@@ -1149,7 +2427,7 @@ class Book:
         if recycled:
             target_parent_id = self.RECYCLE_ITEM_ID
             target_index = 0 if self.config['new_at_top'] else len(self.toc.get(target_parent_id, ()))
-            self.toc.setdefault(target_parent_id, [])[target_index:target_index] = recycled
+            self._toc_insert(target_parent_id, target_index, recycled)
 
         return recycled
 
@@ -1203,9 +2481,7 @@ class Book:
 
         for _, current_parent_id, current_index in it:
             # remove from parent TOC
-            del self.toc[current_parent_id][current_index]
-            if not self.toc[current_parent_id]:
-                del self.toc[current_parent_id]
+            self._toc_remove(current_parent_id, current_index)
 
         unrecycled = {}
         for item_id, _, _ in tasks:
@@ -1238,7 +2514,7 @@ class Book:
 
             for target_parent_id, item_ids in map_parent_items.items():
                 target_index = 0 if self.config['new_at_top'] else len(self.toc.get(target_parent_id, ()))
-                self.toc.setdefault(target_parent_id, [])[target_index:target_index] = item_ids
+                self._toc_insert(target_parent_id, target_index, item_ids)
 
         return unrecycled
 
@@ -1291,9 +2567,7 @@ class Book:
 
         for _, current_parent_id, current_index in it:
             # remove from parent TOC
-            del self.toc[current_parent_id][current_index]
-            if not self.toc[current_parent_id]:
-                del self.toc[current_parent_id]
+            self._toc_remove(current_parent_id, current_index)
 
         reachable_items = self.get_reachable_items()
 
@@ -1315,7 +2589,7 @@ class Book:
                 pass
 
             try:
-                del self.toc[item_id]
+                self._toc_delete(item_id)
             except KeyError:
                 pass
 
@@ -1352,6 +2626,9 @@ class Book:
             # no toc to sort
             return
 
+        # sorting doesn't change the parents of any item
+        parent_index = self._get_synced_parent_index()
+
         if key == 'reverse':
             toc.reverse()
         elif key == 'id':
@@ -1363,6 +2640,9 @@ class Book:
                 raise ValueError(f'Unknown sort key: {key!r}')
             toc.sort(key=keyfunc, reverse=reverse)
 
+        if parent_index is not None:
+            self._parent_index_version = self.toc.version
+
     _sort_items_map_type_value = {
         'folder': -1,
         'bookmark': 1,
@@ -4,11 +4,13 @@ import html
 import io
 import itertools
 import os
+import pickle
 import re
 import shutil
 import time
 import traceback
-from collections import UserDict, namedtuple
+from collections import UserDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import nullcontext
 from datetime import datetime, timezone
 from functools import partial
@@ -20,6 +22,8 @@ from lxml import etree
 from .. import util
 from .._polyfill import mimetypes, zipfile
 from ..util import Info
+from .book import TreeData
+from .fulltext import FulltextIndex, FulltextSummary
 from .host import Host
 
 
@@ -415,10 +419,15 @@ class FulltextCacheGenerator():
         'svg', 'math',
     }
 
-    def __init__(self, book, *, recreate=False):
+    # Max number of items submitted to the worker processes per job and not
+    # handled yet, which bounds the memory for the pending results.
+    PENDING_PER_JOB = 4
+
+    def __init__(self, book, *, recreate=False, jobs=None):
         self.book = book
         self.inclusive_frames = self.book.config['inclusive_frames']
         self.recreate = recreate
+        self.jobs = jobs
         self.cache_last_modified = 0
 
     def run(self, item_ids=None):
@@ -445,7 +454,12 @@ class FulltextCacheGenerator():
             book_fulltext_orig = None
         else:
             book.load_fulltext_files()
-            book_fulltext_orig = book.checksum(book.fulltext)
+            book_fulltext_orig = book.get_tree_state(book.fulltext)
+
+        # load the index before the fulltext files are changed
+        index = None
+        if book.fulltext_index and not self.recreate:
+            index = FulltextIndex.load(book, cache=False)
 
         # generate cache for each item
         if item_ids:
@@ -453,19 +467,57 @@ class FulltextCacheGenerator():
         else:
             id_pool = dict.fromkeys(itertools.chain(book.meta, book.fulltext))
 
-        for id in id_pool:
-            yield from self._cache_item(id)
+        if self.jobs and self.jobs > 1 and len(id_pool) > 1:
+            yield from self._cache_items_parallel(id_pool)
+        else:
+            for id in id_pool:
+                yield from self._cache_item(id)
 
         # update fulltext files
-        if book.checksum(book.fulltext) != book_fulltext_orig:
+        if book_fulltext_orig is None or book.get_tree_state(book.fulltext) != book_fulltext_orig:
             # changed => save new files
+            changed = True
+            if book.fulltext_index:
+                index = yield from self._update_index(index)
             yield Info('info', 'Saving fulltext files...')
             book.save_fulltext_files()
         else:
             # no change => touch files to prevent falsely detected as outdated
+            changed = False
             yield Info('info', 'Touching fulltext files...')
             for file in book.iter_fulltext_files():
                 os.utime(file)
+            try:
+                FulltextSummary.revalidate(book, getattr(book.fulltext, 'files_signature', None))
+            except OSError:
+                FulltextSummary.discard(book)
+
+        if book.fulltext_index:
+            yield from self._save_index(index, changed)
+
+    def _update_index(self, index):
+        book = self.book
+        if index is None or not isinstance(book.fulltext, TreeData):
+            yield Info('info', 'Building fulltext index...')
+            return FulltextIndex.build(book.fulltext)
+
+        yield Info('info', 'Updating fulltext index...')
+        return index.update(book.fulltext, book.fulltext.dirty)
+
+    def _save_index(self, index, changed):
+        book = self.book
+        if index is None:
+            index = yield from self._update_index(None)
+            changed = True
+
+        try:
+            if changed:
+                index.save(book)
+            else:
+                index.save_signature(book)
+        except OSError as exc:
+            yield Info('error', f'Failed to save fulltext index: {exc.strerror}', exc=exc)
+            FulltextIndex.discard(book)
 
     def _cache_item(self, id):
         yield Info('debug', f'Checking item {id!r}')
@@ -502,6 +554,56 @@ class FulltextCacheGenerator():
         yield from self._collect_files_to_update(item)
         yield from self._handle_files_to_update(item)
 
+    def _cache_items_parallel(self, ids):
+        """Same as calling _cache_item() for each ID in turn, but with the
+        text extracted in worker processes.
+
+        Each item, including the discovery of its linked and framed pages, is
+        handled as a whole in a worker against the paths of its current
+        cache, and the result is merged into book.fulltext and the logs are
+        yielded in the order of the items.
+        """
+        book = self.book
+        pending = deque()
+        max_pending = self.jobs * self.PENDING_PER_JOB
+        with ProcessPoolExecutor(
+            max_workers=self.jobs,
+            initializer=_init_worker,
+            initargs=(book.host.root, book.host.config),
+        ) as executor:
+            for id in ids:
+                fulltext = book.fulltext.get(id)
+                pending.append((id, executor.submit(
+                    _cache_item_worker, book.id, id, book.meta.get(id),
+                    None if fulltext is None else list(fulltext),
+                    self.cache_last_modified,
+                )))
+                if len(pending) >= max_pending:
+                    yield from self._merge_item(*pending.popleft())
+
+            while pending:
+                yield from self._merge_item(*pending.popleft())
+
+    def _merge_item(self, id, future):
+        infos, paths = future.result()
+        yield from infos
+
+        book = self.book
+        if paths is None:
+            if id in book.fulltext:
+                del book.fulltext[id]
+            return
+
+        if book.fulltext.get(id) is None:
+            book.fulltext[id] = {}
+        fulltext = book.fulltext[id]
+        for path in [path for path in fulltext if path not in paths]:
+            del fulltext[path]
+        for path, data in paths.items():
+            # None for a path whose cache is not changed
+            if data is not None:
+                fulltext[path] = data
+
     def _delete_item(self, id):
         if id in self.book.fulltext:
             yield Info('info', f'Removing stale cache for {id!r}.')
@@ -908,11 +1010,57 @@ class FulltextCacheGenerator():
         return self.FULLTEXT_SPACE_REPLACER(text).strip()
 
 
+_worker_host = None
+
+
+def _init_worker(root, config):
+    global _worker_host
+    _worker_host = Host(root, config)
+
+
+def _cache_item_worker(book_id, id, meta, paths, cache_last_modified):
+    """Run FulltextCacheGenerator._cache_item() for an item in a worker.
+
+    Args:
+        meta: the meta of the item, or None if missing
+        paths: the paths of the current cache of the item, or None if not
+            cached
+
+    Returns:
+        tuple: (infos, paths), in which infos is a list of the yielded Info
+            and paths is the cache of the item with None for each path not
+            changed, or None if the cache of the item is removed
+    """
+    book = _worker_host.books[book_id]
+    book.meta = {} if meta is None else {id: meta}
+    book.fulltext = {} if paths is None else {id: dict.fromkeys(paths)}
+
+    generator = FulltextCacheGenerator(book)
+    generator.cache_last_modified = cache_last_modified
+    infos = [_get_picklable_info(info) for info in generator._cache_item(id)]
+    return infos, book.fulltext.get(id)
+
+
+def _get_picklable_info(info):
+    if info.exc is not None:
+        try:
+            pickle.dumps(info.exc)
+        except Exception:
+            return info._replace(exc=None)
+    return info
+
+
 def generate(host, book_items=None, *,
              lock=True, backup=True,
-             fulltext=True, recreate=False,
+             fulltext=True, recreate=False, jobs=None,
              static_site=False, static_index=None,
              rss=None):
+    """Generate fulltext cache and/or static site pages for the books.
+
+    Args:
+        jobs: the number of worker processes to extract the fulltext of the
+            items in parallel, or None to extract them in the current process
+    """
     start = time.time()
 
     if isinstance(host, Host):
@@ -953,6 +1101,7 @@ def generate(host, book_items=None, *,
                     generator = FulltextCacheGenerator(
                         book,
                         recreate=recreate,
+                        jobs=jobs,
                     )
                     yield from generator.run(item_ids)
 
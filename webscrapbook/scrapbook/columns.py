@@ -0,0 +1,310 @@
+"""Column-oriented snapshot of the item metadata.
+
+The snapshot requires NumPy, which is an optional dependency (installed with
+the "numpy" extra), and the counterparts fall back to iterating the meta
+without it.
+"""
+from urllib.parse import urlsplit
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .fulltext import MetaIndex
+
+
+class MetaColumns(MetaIndex):
+    """A column-oriented snapshot of the meta, for evaluating the rules of
+    the non-text fields as vectorized masks and aggregating the items without
+    iterating the meta.
+
+    Each item is a row. A date is stored as an integer, a flag as a bool, and
+    a field of few distinct values as the code of a category.
+    """
+    CACHE_NAME = 'meta.columns'
+    DATE_FIELDS = ('create', 'modify')
+    FLAG_FIELDS = ('marked', 'locked', 'location')
+    CATEGORY_FIELDS = ('type', 'charset', 'source_host')
+
+    # fields that SearchEngine can evaluate over the snapshot
+    RULE_FIELDS = frozenset(DATE_FIELDS + FLAG_FIELDS + ('type', 'charset'))
+
+    # a missing date, or a date not in the 17-digit form, which cannot be
+    # compared as an integer and is always taken as a candidate
+    DATE_MISSING = -1
+    DATE_IRREGULAR = -2
+
+    # Max number of changed items to update in place before the snapshot is
+    # rebuilt, as an in-place update takes a linear time for each item.
+    UPDATE_MAX = 64
+
+    def __init__(self):
+        super().__init__()
+        self.ids = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.dates = {field: np.zeros(0, dtype=np.int64) for field in self.DATE_FIELDS}
+        self.flags = {field: np.zeros(0, dtype=bool) for field in self.FLAG_FIELDS}
+        self.codes = {field: np.zeros(0, dtype=np.int32) for field in self.CATEGORY_FIELDS}
+        self.categories = {field: {} for field in self.CATEGORY_FIELDS}
+
+    @classmethod
+    def load(cls, book):
+        """Get the snapshot for book.meta, building and caching one if needed.
+
+        Returns:
+            MetaColumns: the snapshot, or None if NumPy is not available, the
+                host has no tree cache, or book.meta is not loaded from the
+                tree files
+        """
+        if np is None:
+            return None
+        return super().load(book)
+
+    @classmethod
+    def build(cls, meta):
+        index = cls()
+        rows = [(id, cls.get_row(item)) for id, item in meta.items() if item]
+        index.ids = [id for id, _ in rows]
+        index.alive = np.ones(len(rows), dtype=bool)
+        columns = list(zip(*(row for _, row in rows))) or [()] * len(cls._get_fields())
+        for (kind, field), column in zip(cls._get_fields(), columns):
+            if kind == 'date':
+                index.dates[field] = np.array(column, dtype=np.int64)
+            elif kind == 'flag':
+                index.flags[field] = np.array(column, dtype=bool)
+            else:
+                categories = index.categories[field]
+                index.codes[field] = np.array(
+                    [categories.setdefault(value, len(categories)) for value in column],
+                    dtype=np.int32,
+                )
+        return index
+
+    def copy(self):
+        index = self.__class__()
+        index.ids = self.ids.copy()
+        index.alive = self.alive.copy()
+        index.dates = {field: array.copy() for field, array in self.dates.items()}
+        index.flags = {field: array.copy() for field, array in self.flags.items()}
+        index.codes = {field: array.copy() for field, array in self.codes.items()}
+        index.categories = {field: categories.copy() for field, categories in self.categories.items()}
+        return index
+
+    def update(self, meta, ids):
+        if len(ids) > self.UPDATE_MAX:
+            return self.build(meta)
+
+        for id in ids:
+            item = meta.get(id)
+            try:
+                i = self.ids.index(id)
+            except ValueError:
+                if not item:
+                    continue
+                i = len(self.ids)
+                self.ids.append(id)
+                self._append_row()
+
+            if not item:
+                self.alive[i] = False
+                continue
+
+            self.alive[i] = True
+            for (kind, field), value in zip(self._get_fields(), self.get_row(item)):
+                if kind == 'date':
+                    self.dates[field][i] = value
+                elif kind == 'flag':
+                    self.flags[field][i] = value
+                else:
+                    categories = self.categories[field]
+                    self.codes[field][i] = categories.setdefault(value, len(categories))
+
+        return self
+
+    def _append_row(self):
+        def append(array):
+            return np.concatenate((array, np.zeros(1, dtype=array.dtype)))
+
+        self.alive = append(self.alive)
+        for columns in (self.dates, self.flags, self.codes):
+            for field, array in columns.items():
+                columns[field] = append(array)
+
+    @classmethod
+    def _get_fields(cls):
+        return (
+            [('date', field) for field in cls.DATE_FIELDS]
+            + [('flag', field) for field in cls.FLAG_FIELDS]
+            + [('category', field) for field in cls.CATEGORY_FIELDS]
+        )
+
+    @classmethod
+    def get_row(cls, item):
+        """Get the values of the columns for the meta of an item.
+
+        A category is the text (or '' if falsy) as matched by the search, or
+        None for a non-text value, which is always taken as a candidate.
+
+        Returns:
+            tuple: the values in the order of the date, flag, and category
+                fields
+        """
+        source = item.get('source')
+        if source and isinstance(source, str):
+            try:
+                source_host = urlsplit(source).hostname or ''
+            except ValueError:
+                source_host = ''
+        else:
+            source_host = cls._get_category(source)
+
+        return (
+            *(cls._get_date(item.get(field)) for field in cls.DATE_FIELDS),
+            *(bool(item.get(field)) for field in cls.FLAG_FIELDS),
+            cls._get_category(item.get('type')),
+            cls._get_category(item.get('charset')),
+            source_host,
+        )
+
+    @classmethod
+    def _get_date(cls, value):
+        if not value:
+            return cls.DATE_MISSING
+        if isinstance(value, str) and len(value) == 17 and value.isascii() and value.isdigit():
+            return int(value)
+        return cls.DATE_IRREGULAR
+
+    @staticmethod
+    def _get_category(value):
+        if not value:
+            return ''
+        if isinstance(value, str):
+            return value
+        return None
+
+    def get_date_mask(self, field, include, exclude):
+        """Get the mask of the rows whose date may be within any of the
+        included (since, until) ranges and not within any excluded one.
+        """
+        dates = self.dates[field]
+        mask = dates >= 0
+        if include:
+            matched = np.zeros(len(dates), dtype=bool)
+            for since, until in include:
+                matched |= (dates >= int(since)) & (dates <= int(until))
+            mask &= matched
+        for since, until in exclude:
+            mask &= (dates < int(since)) | (dates > int(until))
+        return mask | (dates == self.DATE_IRREGULAR)
+
+    def get_flag_mask(self, field, include, exclude):
+        """Get the mask of the rows whose flag is set if included and unset if
+        excluded.
+        """
+        flags = self.flags[field]
+        mask = np.ones(len(flags), dtype=bool)
+        if exclude:
+            mask &= ~flags
+        if include:
+            mask &= flags
+        return mask
+
+    def get_category_mask(self, field, matcher):
+        """Get the mask of the rows whose category may match.
+
+        Args:
+            matcher: a function that takes the text of a category and returns
+                whether it matches, which is called once for each category
+        """
+        matched = np.array([value is None or bool(matcher(value))
+                            for value in self.categories[field]], dtype=bool)
+        return matched[self.codes[field]]
+
+    def get_ids(self, mask=None):
+        """Get IDs of the items of the rows in the mask.
+
+        Returns:
+            set: the item IDs
+        """
+        mask = self.alive if mask is None else mask & self.alive
+        ids = self.ids
+        return {ids[i] for i in np.flatnonzero(mask).tolist()}
+
+    def get_stats(self):
+        """Get the aggregated counts of the items.
+
+        Returns:
+            dict: see get_stats()
+        """
+        alive = self.alive
+        rv = {'count': int(np.count_nonzero(alive))}
+
+        for field in self.FLAG_FIELDS:
+            rv[field] = int(np.count_nonzero(self.flags[field] & alive))
+
+        for field in self.CATEGORY_FIELDS:
+            categories = list(self.categories[field])
+            counts = np.bincount(self.codes[field][alive], minlength=len(categories))
+            rv[field] = dict(sorted(
+                (category, count) for category, count in zip(categories, counts.tolist())
+                if count and category is not None
+            ))
+
+        for field in self.DATE_FIELDS:
+            dates = self.dates[field][alive]
+            months, counts = np.unique(dates[dates >= 0] // 10 ** 11, return_counts=True)
+            rv[field] = {f'{month:06d}': count
+                         for month, count in zip(months.tolist(), counts.tolist())}
+
+        return rv
+
+
+def _get_meta_stats(meta):
+    rv = {'count': 0}
+    rv.update((field, 0) for field in MetaColumns.FLAG_FIELDS)
+    rv.update((field, {}) for field in MetaColumns.CATEGORY_FIELDS + MetaColumns.DATE_FIELDS)
+
+    fields = MetaColumns._get_fields()
+    for item in meta.values():
+        if not item:
+            continue
+
+        rv['count'] += 1
+        for (kind, field), value in zip(fields, MetaColumns.get_row(item)):
+            if kind == 'flag':
+                rv[field] += value
+            elif kind == 'category':
+                if value is not None:
+                    rv[field][value] = rv[field].get(value, 0) + 1
+            elif value >= 0:
+                month = f'{value // 10 ** 11:06d}'
+                rv[field][month] = rv[field].get(month, 0) + 1
+
+    for field in MetaColumns.CATEGORY_FIELDS + MetaColumns.DATE_FIELDS:
+        rv[field] = dict(sorted(rv[field].items()))
+    return rv
+
+
+def get_stats(book):
+    """Get the aggregated counts of the items of a book.
+
+    The counts are taken from the column snapshot if available, or by
+    iterating the meta otherwise.
+
+    Returns:
+        dict: with keys:
+            - count: the number of items
+            - marked, locked, location: the number of items with the flag
+            - type, charset, source_host: value => number of items, in which
+              a missing value is ''
+            - create, modify: month ('YYYYMM' in UTC) => number of items
+    """
+    if book.no_tree:
+        return _get_meta_stats({})
+
+    book.load_meta_files()
+    columns = MetaColumns.load(book)
+    if columns is not None and not book.meta.dirty:
+        return columns.get_stats()
+    return _get_meta_stats(book.meta)
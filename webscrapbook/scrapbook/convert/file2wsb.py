@@ -157,7 +157,8 @@ class Converter:
             self.preserve_filename and os.path.isfile(entry) and not (util.is_archive(entry) or is_singlefilez)
         )):
             dst_dir = os.path.join(self.book.data_dir, id)
-            os.makedirs(dst_dir, exist_ok=True)
+            with self.book.creating_data_file(dst_dir):
+                os.makedirs(dst_dir, exist_ok=True)
 
             src = entry
             dst = os.path.join(dst_dir, basename)
@@ -223,10 +224,11 @@ class Converter:
             dst = os.path.join(self.book.data_dir, id + ext)
             yield Info('info', f'Copying data files: {src!r} => {dst!r}')
             try:
-                try:
-                    shutil.copytree(src, dst)
-                except NotADirectoryError:
-                    shutil.copy2(src, dst)
+                with self.book.creating_data_file(dst):
+                    try:
+                        shutil.copytree(src, dst)
+                    except NotADirectoryError:
+                        shutil.copy2(src, dst)
             except OSError as exc:
                 yield Info('error', f'Failed to copy data files for {entry!r}: {exc.strerror}', exc=exc)
 
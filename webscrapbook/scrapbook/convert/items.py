@@ -42,7 +42,7 @@ class Converter:
             yield Info('info', f'Handling book {book_id!r}...')
             book.load_meta_files()
 
-            book_meta_orig = book.checksum(book.meta)
+            book_meta_orig = book.get_tree_state(book.meta)
 
             for id in (item_ids or book.meta):
                 if id not in book.meta:
@@ -68,7 +68,7 @@ class Converter:
                         yield Info('error', f'Failed to convert {id!r}: {exc}', exc=exc)
 
             # update files
-            if book.checksum(book.meta) != book_meta_orig:
+            if book.get_tree_state(book.meta) != book_meta_orig:
                 yield Info('info', 'Saving changed meta files...')
                 book.save_meta_files()
 
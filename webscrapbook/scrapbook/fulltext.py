@@ -0,0 +1,1376 @@
+"""Inverted indexes of the fulltext cache and item metadata.
+"""
+import copy
+import hashlib
+import marshal
+import os
+import re
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from urllib.parse import urlsplit
+
+# Scripts written without spaces between words, which are tokenized as
+# bigrams: CJK ideographs, kana, and hangul.
+_CJK_CHARS = (
+    r'\u3040-\u30ff'  # hiragana, katakana
+    r'\u3400-\u4dbf'  # CJK unified ideographs extension A
+    r'\u4e00-\u9fff'  # CJK unified ideographs
+    r'\uac00-\ud7af'  # hangul syllables
+    r'\uf900-\ufaff'  # CJK compatibility ideographs
+    r'\U00020000-\U0002fa1f'  # CJK unified ideographs extension B-F, etc.
+)
+
+_TOKEN_REGEX = re.compile(rf'(?P<cjk>[{_CJK_CHARS}]+)|[^\W{_CJK_CHARS}]+')
+_WORD_REGEX = re.compile(rf'[^\W{_CJK_CHARS}]+')
+_CJK_REGEX = re.compile(rf'[{_CJK_CHARS}]+')
+
+_SAFE_CHAR_REGEX = re.compile(rf'[\x00-\x7f{_CJK_CHARS}]')
+
+_REGEX_ESCAPE_REGEX = re.compile(r'\\(?:x[0-9A-Fa-f]{2}|u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|N\{[^}]*\}|\d+|.)', re.S)
+_REGEX_QUANTIFIER_REGEX = re.compile(r'(?:[*+?]|\{(?:(\d+)(?:,\d*)?|,\d*)\})[?+]?')
+_REGEX_FLAGS_REGEX = re.compile(r'\(\?([aiLmsux-]+)\)')
+
+# Non-ASCII chars that match an ASCII letter in a case-insensitive regex
+# search but are not lowercased to it.
+_FOLD_TABLE = str.maketrans({
+    'İ': 'i',  # LATIN CAPITAL LETTER I WITH DOT ABOVE
+    'ı': 'i',  # LATIN SMALL LETTER DOTLESS I
+    'ſ': 's',  # LATIN SMALL LETTER LONG S
+    'K': 'k',  # KELVIN SIGN
+})
+
+
+def fold(text):
+    """Normalize case of the text for indexing and looking up."""
+    return text.translate(_FOLD_TABLE).lower()
+
+
+def is_foldable(text):
+    """Check whether a case-insensitive regex search of the text is
+    equivalent to a search of the folded text in the folded target.
+    """
+    return all(_SAFE_CHAR_REGEX.match(c) for c in text)
+
+
+def iter_tokens(text):
+    """Generate tokens of the text.
+
+    A run of word chars is a token, except that a run of CJK chars is split
+    into overlapping bigrams (or a single char if it's alone).
+    """
+    for m in _TOKEN_REGEX.finditer(fold(text)):
+        token = m.group(0)
+        if m.group('cjk') and len(token) > 1:
+            for i in range(len(token) - 1):
+                yield token[i:i + 2]
+        else:
+            yield token
+
+
+def get_tokens(text):
+    """Get the set of tokens of the text.
+
+    Same as set(iter_tokens(text)), but faster.
+    """
+    text = fold(text)
+    tokens = set(_WORD_REGEX.findall(text))
+    for run in _CJK_REGEX.findall(text):
+        if len(run) > 1:
+            tokens.update([run[i:i + 2] for i in range(len(run) - 1)])
+        else:
+            tokens.add(run)
+    return tokens
+
+
+def get_term_tokens(term):
+    """Get the tokens that a text must have to contain the term.
+
+    A partial word at either end of the term, which may be a part of a
+    longer token of the text, is skipped.
+
+    Returns:
+        set: the tokens, or None if the term cannot be looked up
+    """
+    folded = fold(term)
+    if len(folded) != len(term):
+        return None
+
+    tokens = set()
+    for token, cjk, closed_start, closed_end in _iter_term_tokens(folded):
+        if cjk and len(token) > 1:
+            tokens.update(token[i:i + 2] for i in range(len(token) - 1))
+        elif closed_start and closed_end:
+            tokens.add(token)
+    return tokens
+
+
+def _iter_term_tokens(folded):
+    """Generate the tokens of a folded term that can be looked up.
+
+    Yields:
+        tuple: (token, cjk, closed_start, closed_end), where closed_start and
+            closed_end tell whether the token cannot extend further at the
+            start and end in a text containing the term
+    """
+    for m in _TOKEN_REGEX.finditer(folded):
+        token = m.group(0)
+        if not all(_SAFE_CHAR_REGEX.match(c) for c in token):
+            continue
+
+        start, end = m.span(0)
+        closed_start = start > 0 and bool(_SAFE_CHAR_REGEX.match(folded[start - 1]))
+        closed_end = end < len(folded) and bool(_SAFE_CHAR_REGEX.match(folded[end]))
+        yield token, bool(m.group('cjk')), closed_start, closed_end
+
+
+def get_trigrams(text):
+    """Get the set of trigrams of the case-folded text."""
+    text = fold(text)
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def get_literal_trigrams(literal, ignorecase=True):
+    """Get the trigrams that a text must have to contain the literal.
+
+    For a case-insensitive search, a trigram with a char whose
+    case-insensitive matching is not covered by the folding is skipped.
+
+    Returns:
+        set: the trigrams, or None if the literal cannot be looked up
+    """
+    folded = fold(literal)
+    if len(folded) != len(literal):
+        return None
+    trigrams = {folded[i:i + 3] for i in range(len(folded) - 2)}
+    if ignorecase:
+        trigrams = {t for t in trigrams if all(_SAFE_CHAR_REGEX.match(c) for c in t)}
+    return trigrams
+
+
+def get_regex_literals(regex):
+    """Get literal strings that any match of a regex must contain.
+
+    Only a regex of simple constructs is analyzed. A group or a char set
+    is taken as an unknown part, and the literals are collected from the
+    top-level chars not made optional by a quantifier.
+
+    Args:
+        regex: a compiled regex
+
+    Returns:
+        list: the literals, or None if the regex is not analyzable (e.g.
+            with a top-level alternation)
+    """
+    if regex.flags & re.X:
+        return None
+
+    pattern = regex.pattern
+    if not isinstance(pattern, str):
+        return None
+
+    literals = []
+    run = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            m = _REGEX_ESCAPE_REGEX.match(pattern, i)
+            i = m.end()
+            esc = m.group(0)[1:]
+            char = esc if len(esc) == 1 and not esc.isalnum() else None
+        elif c == '|':
+            return None
+        elif c == '(':
+            m = _REGEX_FLAGS_REGEX.match(pattern, i)
+            if m:
+                if 'x' in m.group(1):
+                    return None
+                i = m.end()
+                continue
+            i = _skip_regex_group(pattern, i)
+            char = None
+        elif c == '[':
+            i = _skip_regex_set(pattern, i)
+            char = None
+        elif c in '.^$':
+            i += 1
+            char = None
+        else:
+            i += 1
+            char = c
+
+        m = _REGEX_QUANTIFIER_REGEX.match(pattern, i)
+        if m:
+            i = m.end()
+            required = m.group(0)[0] == '+' or int(m.group(1) or 0) > 0
+        else:
+            required = True
+
+        if char is not None and required:
+            run.append(char)
+        if char is None or m:
+            if run:
+                literals.append(''.join(run))
+            run = []
+
+    if run:
+        literals.append(''.join(run))
+    return literals
+
+
+def _skip_regex_group(pattern, i):
+    depth = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '[':
+            i = _skip_regex_set(pattern, i)
+            continue
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if not depth:
+                return i + 1
+        i += 1
+    return n
+
+
+def _skip_regex_set(pattern, i):
+    n = len(pattern)
+    i += 1
+    if i < n and pattern[i] == '^':
+        i += 1
+    if i < n and pattern[i] == ']':
+        i += 1
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == ']':
+            return i + 1
+        i += 1
+    return n
+
+
+class FulltextIndex:
+    """An inverted index mapping tokens to the items containing them.
+
+    Each item is assigned a document number, and a posting list is an array
+    of document numbers. Updating an item removes its old document number
+    and appends a new one, and the index is rebuilt when too many removed
+    numbers are left.
+
+    The index is stored as FILENAME under the tree directory. A separate
+    small file stores the signatures of the index file and the fulltext
+    files it's generated from, so that an outdated index is never used, and
+    that it can be revalidated without rewriting the index.
+    """
+    FILENAME = 'fulltext.idx'
+    SIGNATURE_SUFFIX = '.sig'
+
+    # The index is stored in marshal format, which is fast to load but not
+    # portable among Python versions and platforms.
+    TAG = f'{sys.implementation.cache_tag}-{marshal.version}-{sys.byteorder}-{array("I").itemsize}'
+
+    # Max ratio of removed document numbers before the index is rebuilt.
+    COMPACT_RATIO = 0.5
+
+    # Max number of tokens to match a partial word, beyond which the word
+    # is too unselective and ignored.
+    PARTIAL_TOKENS_MAX = 5000
+
+    def __init__(self):
+        self.ids = []
+        self.docs = {}
+        self.postings = {}
+        self._vocab = None
+        self._vocab_trigrams = None
+
+    @classmethod
+    def build(cls, fulltext):
+        """Build an index for the fulltext cache data."""
+        index = cls()
+        for id, files in fulltext.items():
+            index.add(id, files)
+        return index
+
+    def add(self, id, files):
+        """Add an item to the index.
+
+        Args:
+            id: the item ID
+            files: a dict of subfiles of the item in the fulltext cache
+        """
+        self.remove(id)
+        if not files:
+            return
+
+        tokens = set()
+        for file in files.values():
+            content = file.get('content')
+            if content:
+                tokens |= get_tokens(content)
+
+        if not tokens:
+            return
+
+        doc = len(self.ids)
+        self.ids.append(id)
+        self.docs[id] = doc
+        postings = self.postings
+        for token in tokens:
+            try:
+                postings[token].append(doc)
+            except KeyError:
+                postings[token] = array('I', (doc,))
+                self._vocab = None
+                self._vocab_trigrams = None
+            except AttributeError:
+                # not yet converted from the loaded bytes
+                self._get_posting(token).append(doc)
+
+    def remove(self, id):
+        """Remove an item from the index."""
+        try:
+            doc = self.docs.pop(id)
+        except KeyError:
+            return
+        self.ids[doc] = None
+
+    def update(self, fulltext, ids):
+        """Update the index for changed items.
+
+        Returns:
+            FulltextIndex: the updated index, which is a new one if rebuilt
+        """
+        for id in ids:
+            self.add(id, fulltext.get(id))
+
+        if len(self.ids) - len(self.docs) > len(self.ids) * self.COMPACT_RATIO:
+            return self.build(fulltext)
+
+        return self
+
+    def _get_posting(self, token):
+        posting = self.postings.get(token)
+        if type(posting) is bytes:
+            posting = self.postings[token] = array('I', posting)
+        return posting
+
+    def _get_docs(self, token):
+        posting = self._get_posting(token)
+        return set() if posting is None else set(posting)
+
+    def _get_docs_partial(self, word, closed_start, closed_end):
+        vocab = self._get_vocab(word)
+        if closed_start:
+            tokens = [t for t in vocab if t.startswith(word)]
+        elif closed_end:
+            tokens = [t for t in vocab if t.endswith(word)]
+        else:
+            tokens = [t for t in vocab if word in t]
+        if len(tokens) > self.PARTIAL_TOKENS_MAX:
+            return None
+        docs = set()
+        for token in tokens:
+            docs.update(self._get_posting(token))
+        return docs
+
+    def _get_vocab(self, word=''):
+        """Get the tokens that may contain the word.
+
+        The tokens are narrowed with a trigram index of the vocabulary, which
+        is built at first use.
+        """
+        if self._vocab is None:
+            self._vocab = list(self.postings)
+
+        if len(word) < 3:
+            return self._vocab
+
+        if self._vocab_trigrams is None:
+            index = {}
+            for token in self._vocab:
+                for i in range(len(token) - 2):
+                    trigram = token[i:i + 3]
+                    try:
+                        tokens = index[trigram]
+                    except KeyError:
+                        index[trigram] = [token]
+                    else:
+                        # a token may have a repeated trigram
+                        if tokens[-1] is not token:
+                            tokens.append(token)
+            self._vocab_trigrams = index
+
+        return min(
+            (self._vocab_trigrams.get(word[i:i + 3], ()) for i in range(len(word) - 2)),
+            key=len,
+        )
+
+    def get_candidates(self, term):
+        """Get IDs of the items that may contain the term.
+
+        Args:
+            term: a plain text to be searched as a substring, case
+                insensitively
+
+        Returns:
+            set: the item IDs, or None if the term cannot be looked up
+        """
+        folded = fold(term)
+        if len(folded) != len(term):
+            return None
+
+        docs = None
+        for token, cjk, closed_start, closed_end in _iter_term_tokens(folded):
+            if cjk and len(token) > 1:
+                for i in range(len(token) - 1):
+                    docs = self._intersect(docs, self._get_docs(token[i:i + 2]))
+                continue
+
+            if closed_start and closed_end:
+                d = self._get_docs(token)
+            else:
+                d = self._get_docs_partial(token, closed_start, closed_end)
+
+            if d is not None:
+                docs = self._intersect(docs, d)
+
+        if docs is None:
+            return None
+
+        ids = self.ids
+        return {ids[doc] for doc in docs if ids[doc] is not None}
+
+    @staticmethod
+    def _intersect(docs, other):
+        if docs is None:
+            return other
+        docs &= other
+        return docs
+
+    @classmethod
+    def get_file(cls, book):
+        return os.path.join(book.tree_dir, cls.FILENAME)
+
+    @staticmethod
+    def get_fulltext_signature(book):
+        return book.get_tree_files_signature('fulltext')
+
+    @classmethod
+    def load(cls, book, *, cache=True):
+        """Load the index of a book.
+
+        Args:
+            book: the Book
+            cache: whether to share the loaded index through the tree cache
+                of the host. A shared index must not be modified.
+
+        Returns:
+            FulltextIndex: the index, or None if it's missing, outdated, or
+                broken
+        """
+        file = cls.get_file(book)
+        try:
+            with open(file + cls.SIGNATURE_SUFFIX, 'rb') as fh:
+                tag, signature, fulltext_signature = marshal.loads(fh.read())
+            st = os.stat(file)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+        if (tag != cls.TAG or signature != (st.st_size, st.st_mtime_ns, st.st_ino)
+                or fulltext_signature != cls.get_fulltext_signature(book)):
+            return None
+
+        cache = book.host.tree_cache if cache else None
+        if cache is not None:
+            index = cache.get(file, signature)
+            if index is not None:
+                return index
+
+        try:
+            with open(file, 'rb') as fh:
+                ids, postings = marshal.loads(fh.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+        index = cls()
+        index.ids = ids
+        index.docs = {id: doc for doc, id in enumerate(ids) if id is not None}
+        index.postings = postings
+
+        if cache is not None:
+            cache.set(file, signature, index)
+
+        return index
+
+    def save(self, book):
+        """Save the index for the current fulltext files of the book.
+
+        Raises:
+            OSError: failed to write
+        """
+        file = self.get_file(book)
+        postings = {k: v.tobytes() if type(v) is array else v for k, v in self.postings.items()}
+        _write_marshal(file, (self.ids, postings))
+        self.save_signature(book)
+
+    def save_signature(self, book):
+        """Revalidate the saved index for the current fulltext files of the
+        book, which should have the same data as when the index is saved.
+
+        Raises:
+            OSError: failed to write
+        """
+        file = self.get_file(book)
+        st = os.stat(file)
+        signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+        _write_marshal(file + self.SIGNATURE_SUFFIX, (self.TAG, signature, self.get_fulltext_signature(book)))
+
+    @classmethod
+    def discard(cls, book):
+        """Remove the saved index of a book."""
+        file = cls.get_file(book)
+        for f in (file + cls.SIGNATURE_SUFFIX, file):
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+
+
+class BloomFilter:
+    """A Bloom filter of strings, which tells that a string is definitely
+    not added, or may be added with a small false positive rate.
+    """
+    HASHES = 6
+    BITS_PER_ITEM = 16
+    MIN_CAPACITY = 1024
+
+    def __init__(self, capacity=0):
+        self.capacity = max(capacity, self.MIN_CAPACITY)
+        self.size = self.capacity * self.BITS_PER_ITEM
+        self.bits = bytearray(self.size // 8)
+        self.count = 0
+
+    @classmethod
+    def build(cls, items):
+        items = set(items)
+        bloom = cls(len(items))
+        bloom.update(items)
+        return bloom
+
+    @property
+    def is_full(self):
+        """Whether too many items are added to keep a low false positive
+        rate (about 2% when twice the capacity).
+        """
+        return self.count > self.capacity * 2
+
+    def _get_positions(self, item):
+        digest = hashlib.blake2b(item.encode('UTF-8', 'surrogatepass'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.HASHES)]
+
+    def add(self, item):
+        bits = self.bits
+        for pos in self._get_positions(item):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._get_positions(item))
+
+    def dump(self):
+        return (self.capacity, bytes(self.bits), self.count)
+
+    @classmethod
+    def load(cls, data):
+        capacity, bits, count = data
+        bloom = cls.__new__(cls)
+        bloom.capacity = capacity
+        bloom.size = len(bits) * 8
+        bloom.bits = bytearray(bits)
+        bloom.count = count
+        return bloom
+
+
+class FulltextSummary:
+    """A summary of each fulltext file, for loading only the fulltext files
+    needed by a search.
+
+    The summary of a fulltext file has the items and their subfiles in it,
+    and a Bloom filter of the tokens of their content. It's taken with the
+    signature of the file (an entry of Book.get_tree_files_signature()) and
+    is not used once the file is changed.
+
+    The summary is stored as FILENAME under the tree directory when the
+    fulltext files are saved. The Bloom filters are built only if the book has
+    fulltext_index enabled, as tokenizing the content is much slower than
+    loading it.
+    """
+    FILENAME = 'fulltext.sum'
+    TAG = f'{sys.implementation.cache_tag}-{marshal.version}'
+
+    def __init__(self, shards=()):
+        # a list of (signature, files, bloom) for each fulltext file, where
+        # files maps each item ID to a list of its subfiles (or None if the
+        # item is deleted), and bloom is a BloomFilter or None
+        self.shards = list(shards)
+        self._shard_map = None
+
+    @property
+    def signature(self):
+        return tuple(signature for signature, _, _ in self.shards)
+
+    @property
+    def shard_map(self):
+        """A dict mapping each item to the index of the fulltext file it's
+        loaded from, in which a later file takes precedence.
+        """
+        if self._shard_map is None:
+            shard_map = {}
+            for i, (_, files, _) in enumerate(self.shards):
+                for id, subfiles in files.items():
+                    if subfiles is None:
+                        shard_map.pop(id, None)
+                    else:
+                        shard_map[id] = i
+            self._shard_map = shard_map
+        return self._shard_map
+
+    def get_files(self, id):
+        """Get the subfiles of an item.
+
+        Returns:
+            list: the subfiles, or None if the item is not in the fulltext
+                files
+        """
+        i = self.shard_map.get(id)
+        if i is None:
+            return None
+        return self.shards[i][1][id]
+
+    def get_candidates(self, tokens):
+        """Get IDs of the items whose content may have all the tokens.
+
+        Returns:
+            set: the item IDs
+        """
+        shards = set()
+        for i, (_, _, bloom) in enumerate(self.shards):
+            if bloom is None or all(token in bloom for token in tokens):
+                shards.add(i)
+        return {id for id, i in self.shard_map.items() if i in shards}
+
+    @staticmethod
+    def build_shard(signature, data, bloom=True):
+        """Take the summary of a fulltext file.
+
+        Args:
+            data: the data of the fulltext file
+            bloom: whether to build the Bloom filter
+
+        Returns:
+            tuple: (signature, files, bloom)
+        """
+        files = {id: None if subfiles is None else list(subfiles) for id, subfiles in data.items()}
+        if bloom:
+            bloom = BloomFilter.build(_iter_item_tokens(data.values()))
+        else:
+            bloom = None
+        return (signature, files, bloom)
+
+    @classmethod
+    def get_file(cls, book):
+        return os.path.join(book.tree_dir, cls.FILENAME)
+
+    @classmethod
+    def load(cls, book, *, cache=True):
+        """Load the saved summary of a book.
+
+        Args:
+            book: the Book
+            cache: whether to share the loaded summary through the tree cache
+                of the host. A shared summary must not be modified.
+
+        Returns:
+            FulltextSummary: the summary, which may be outdated or empty if
+                missing or broken
+        """
+        file = cls.get_file(book)
+        try:
+            st = os.stat(file)
+        except OSError:
+            return cls()
+
+        signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+        cache = book.host.tree_cache if cache else None
+        if cache is not None:
+            summary = cache.get(file, signature)
+            if summary is not None:
+                return summary
+
+        try:
+            with open(file, 'rb') as fh:
+                tag, shards = marshal.loads(fh.read())
+            assert tag == cls.TAG
+            summary = cls(
+                (sig, files, None if bloom is None else BloomFilter.load(bloom))
+                for sig, files, bloom in shards
+            )
+        except (OSError, EOFError, ValueError, TypeError, AssertionError):
+            return cls()
+
+        if cache is not None:
+            cache.set(file, signature, summary)
+
+        return summary
+
+    def save(self, book):
+        """Save the summary for the book.
+
+        Raises:
+            OSError: failed to write
+        """
+        shards = [(sig, files, None if bloom is None else bloom.dump())
+                  for sig, files, bloom in self.shards]
+        _write_marshal(self.get_file(book), (self.TAG, shards))
+
+    @classmethod
+    def update(cls, book, shards, changed, signature):
+        """Update the saved summary for the saved fulltext files of a book.
+
+        The Bloom filter of a rewritten fulltext file is updated with the
+        tokens of the changed items if the file keeps the other items it's
+        loaded with, or rebuilt otherwise. No Bloom filter is built unless the
+        book has fulltext_index enabled.
+
+        Args:
+            book: the Book, whose fulltext files are just saved from
+                book.fulltext
+            shards: a dict mapping the index of each rewritten fulltext file
+                to the data written
+            changed: IDs of the items changed since the fulltext files are
+                loaded
+            signature: the signature of the fulltext files when loaded, or
+                None if unknown
+
+        Raises:
+            OSError: failed to write
+        """
+        old = cls.load(book, cache=False).shards
+        bloom = book.fulltext_index
+        shard_map = getattr(book.fulltext, 'shard_map', None)
+        changed = set(changed or ())
+
+        summary = cls()
+        for i, sig in enumerate(book.get_tree_files_signature('fulltext')):
+            prev = old[i] if i < len(old) else None
+            data = shards.get(i)
+
+            if data is None:
+                if prev is not None and prev[0] == sig:
+                    summary.shards.append(prev)
+                    continue
+                if shard_map is None:
+                    cls.discard(book)
+                    return
+                data = {id: book.fulltext[id] for id, j in shard_map.items() if j == i}
+                summary.shards.append(cls.build_shard(sig, data, bloom=bloom))
+                continue
+
+            if (bloom and prev is not None and prev[2] is not None and signature is not None
+                    and i < len(signature) and prev[0] == signature[i]
+                    and all(id in changed or id in prev[1] for id in data)):
+                _, files, _ = cls.build_shard(sig, data, bloom=False)
+                prev_bloom = prev[2]
+                prev_bloom.update(set(_iter_item_tokens(data[id] for id in changed if id in data)))
+                if not prev_bloom.is_full:
+                    summary.shards.append((sig, files, prev_bloom))
+                    continue
+
+            summary.shards.append(cls.build_shard(sig, data, bloom=bloom))
+
+        summary.save(book)
+
+    @classmethod
+    def revalidate(cls, book, signature):
+        """Revalidate the saved summary for the current fulltext files of a
+        book, which have the same data as when signature is taken (e.g. only
+        touched).
+
+        Raises:
+            OSError: failed to write
+        """
+        if signature is None:
+            return
+
+        summary = cls.load(book, cache=False)
+        current = book.get_tree_files_signature('fulltext')
+        if len(current) != len(signature) or summary.signature != signature:
+            return
+
+        summary.shards = [(sig, files, bloom) for sig, (_, files, bloom) in zip(current, summary.shards)]
+        summary.save(book)
+
+    @classmethod
+    def discard(cls, book):
+        """Remove the saved summary of a book."""
+        try:
+            os.remove(cls.get_file(book))
+        except OSError:
+            pass
+
+
+class FulltextShards:
+    """The fulltext cache data of a book, whose fulltext files are loaded
+    lazily when an item in it is accessed, guided by the summary.
+
+    The loaded data may be shared with the tree cache and must not be
+    modified.
+    """
+    def __init__(self, book, summary, loaded=None):
+        self.book = book
+        self.summary = summary
+        self.loaded = loaded or {}
+
+    @classmethod
+    def load(cls, book):
+        """Get the lazily loaded fulltext cache data of a book.
+
+        The summary of a fulltext file changed since the summary is saved is
+        taken by loading the file. The taken summary is not saved, which is
+        done only when the fulltext files are saved.
+        """
+        signature = book.get_tree_files_signature('fulltext')
+        summary = FulltextSummary.load(book)
+        if summary.signature == signature:
+            return cls(book, summary)
+
+        old = summary.shards
+        summary = FulltextSummary()
+        loaded = {}
+        for i, sig in enumerate(signature):
+            prev = old[i] if i < len(old) else None
+            if prev is not None and prev[0] == sig:
+                summary.shards.append(prev)
+                continue
+            data = loaded[i] = book.load_fulltext_file(i)
+            summary.shards.append(summary.build_shard(sig, data, bloom=False))
+
+        return cls(book, summary, loaded)
+
+    def get(self, id, default=None):
+        """Get the subfiles of an item, loading the fulltext file it's in if
+        not yet.
+        """
+        i = self.summary.shard_map.get(id)
+        if i is None:
+            return default
+
+        try:
+            data = self.loaded[i]
+        except KeyError:
+            data = self.loaded[i] = self.book.load_fulltext_file(i)
+        return data.get(id, default)
+
+    def get_files(self, id):
+        """Get the subfiles of an item without loading the fulltext file.
+
+        Returns:
+            list: the subfiles, or None if the item is not in the fulltext
+                files
+        """
+        return self.summary.get_files(id)
+
+
+def _iter_item_tokens(items):
+    """Generate the tokens of the content of the items in the fulltext cache
+    data, possibly repeated.
+    """
+    for files in items:
+        if not files:
+            continue
+        for file in files.values():
+            content = file.get('content')
+            if content:
+                yield from get_tokens(content)
+
+
+def _write_marshal(file, data):
+    # write to a temp file and then replace, so that a concurrent load
+    # never gets a partially written file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(file))
+    try:
+        with open(fd, 'wb') as fh:
+            marshal.dump(data, fh)
+        os.replace(tmp, file)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class MetaIndex:
+    """Base class of an index of meta.
+
+    The index is not saved, but shared through the tree cache of the host
+    for the meta files it's built for. A shared index must not be modified,
+    and a copy of it is updated and cached instead when the meta files are
+    saved.
+    """
+    CACHE_NAME = None
+
+    def __init__(self):
+        self.signature = None
+
+    @classmethod
+    def build(cls, meta):
+        """Build an index for the meta data."""
+        raise NotImplementedError
+
+    def update(self, meta, ids):
+        """Update the index for changed items.
+
+        Returns:
+            MetaIndex: the updated index, which is a new one if rebuilt
+        """
+        raise NotImplementedError
+
+    def copy(self):
+        """Get a copy of the index that can be updated without affecting
+        this one."""
+        return copy.deepcopy(self)
+
+    @classmethod
+    def get_cache_key(cls, book):
+        return os.path.join(book.tree_dir, cls.CACHE_NAME)
+
+    @classmethod
+    def get_cached(cls, book):
+        """Get the cached index for the meta files book.meta is loaded from or
+        saved to.
+
+        Changes to book.meta since then (i.e. book.meta.dirty) are not
+        reflected in the index.
+
+        Returns:
+            MetaIndex: the index, or None if not cached
+        """
+        cache = book.host.tree_cache
+        signature = getattr(book.meta, 'files_signature', None)
+        if cache is None or signature is None:
+            return None
+
+        index = cache.get(cls.get_cache_key(book), cls._get_cache_signature(signature))
+        if index is None or index.signature != signature:
+            return None
+        return index
+
+    @classmethod
+    def load(cls, book):
+        """Get the index for book.meta, building and caching one if needed.
+
+        Changes to book.meta since it's loaded or saved (i.e. book.meta.dirty)
+        are not reflected in the index.
+
+        Returns:
+            MetaIndex: the index, or None if the host has no tree cache or
+                book.meta is not loaded from the tree files
+        """
+        index = cls.get_cached(book)
+        if index is not None:
+            return index
+
+        # an index can be built only if meta is the same as the files
+        meta = book.meta
+        if getattr(meta, 'files_signature', None) is None or meta.dirty or book.host.tree_cache is None:
+            return None
+
+        index = cls.build(meta)
+        index.set_cached(book, meta.files_signature)
+        return index
+
+    def set_cached(self, book, signature):
+        self.signature = signature
+        book.host.tree_cache.set(self.get_cache_key(book), self._get_cache_signature(signature), self)
+
+    @staticmethod
+    def _get_cache_signature(signature):
+        # TreeCache takes the first element as the size of the entry, which
+        # is approximated by the size of the meta files
+        return (sum(sig[1] for sig in signature), signature)
+
+
+class TrigramIndex(MetaIndex):
+    """An index mapping trigrams of the text fields of meta to the items
+    containing them.
+
+    Like FulltextIndex, each item is assigned a document number, and a
+    posting list is an array of document numbers for a field and a trigram.
+    """
+    CACHE_NAME = 'meta.trigrams'
+    FIELDS = ('title', 'comment', 'source')
+
+    # Max ratio of removed document numbers before the index is rebuilt.
+    COMPACT_RATIO = 0.5
+
+    def __init__(self):
+        super().__init__()
+        self.ids = []
+        self.docs = {}
+        self.postings = {field: {} for field in self.FIELDS}
+
+    @classmethod
+    def build(cls, meta):
+        """Build an index for the meta data."""
+        index = cls()
+        for id, item in meta.items():
+            index.add(id, item)
+        return index
+
+    def copy(self):
+        index = self.__class__()
+        index.ids = self.ids.copy()
+        index.docs = self.docs.copy()
+        index.postings = {field: {trigram: array('I', posting) for trigram, posting in postings.items()}
+                          for field, postings in self.postings.items()}
+        return index
+
+    def add(self, id, item):
+        """Add an item to the index.
+
+        Args:
+            id: the item ID
+            item: the meta of the item
+        """
+        self.remove(id)
+        if not item:
+            return
+
+        doc = None
+        for field, postings in self.postings.items():
+            text = item.get(field)
+            if not text or not isinstance(text, str):
+                continue
+
+            for trigram in get_trigrams(text):
+                if doc is None:
+                    doc = len(self.ids)
+                    self.ids.append(id)
+                    self.docs[id] = doc
+                try:
+                    postings[trigram].append(doc)
+                except KeyError:
+                    postings[trigram] = array('I', (doc,))
+
+    def remove(self, id):
+        """Remove an item from the index."""
+        try:
+            doc = self.docs.pop(id)
+        except KeyError:
+            return
+        self.ids[doc] = None
+
+    def update(self, meta, ids):
+        """Update the index for changed items.
+
+        Returns:
+            TrigramIndex: the updated index, which is a new one if rebuilt
+        """
+        for id in ids:
+            self.add(id, meta.get(id))
+
+        if len(self.ids) - len(self.docs) > len(self.ids) * self.COMPACT_RATIO:
+            return self.build(meta)
+
+        return self
+
+    def get_candidates(self, field, literals, ignorecase=True):
+        """Get IDs of the items whose field may contain all the literals.
+
+        Returns:
+            set: the item IDs, or None if the literals cannot be looked up
+        """
+        postings = self.postings[field]
+        lists = []
+        for literal in literals:
+            trigrams = get_literal_trigrams(literal, ignorecase)
+            if not trigrams:
+                continue
+            for trigram in trigrams:
+                posting = postings.get(trigram)
+                if posting is None:
+                    return set()
+                lists.append(posting)
+
+        if not lists:
+            return None
+
+        lists.sort(key=len)
+        docs = set(lists[0])
+        for posting in lists[1:]:
+            if not docs:
+                break
+            docs.intersection_update(posting)
+
+        ids = self.ids
+        return {ids[doc] for doc in docs if ids[doc] is not None}
+
+
+class DateIndex(MetaIndex):
+    """An index of the items sorted by each date field of meta, for looking
+    up the items within a date range by bisection.
+    """
+    CACHE_NAME = 'meta.dates'
+    FIELDS = ('create', 'modify')
+
+    # Max number of changed items to update in place before the index is
+    # rebuilt, as an in-place update takes a linear time for each item.
+    UPDATE_MAX = 64
+
+    def __init__(self):
+        super().__init__()
+        self.dates = {field: [] for field in self.FIELDS}
+        self.ids = {field: [] for field in self.FIELDS}
+
+    @classmethod
+    def build(cls, meta):
+        index = cls()
+        for field in cls.FIELDS:
+            pairs = []
+            for id, item in meta.items():
+                date = item.get(field) if item else None
+                if date and isinstance(date, str):
+                    pairs.append((date, id))
+            pairs.sort()
+            index.dates[field] = [date for date, _ in pairs]
+            index.ids[field] = [id for _, id in pairs]
+        return index
+
+    def copy(self):
+        index = self.__class__()
+        index.dates = {field: dates.copy() for field, dates in self.dates.items()}
+        index.ids = {field: ids.copy() for field, ids in self.ids.items()}
+        return index
+
+    def update(self, meta, ids):
+        if len(ids) > self.UPDATE_MAX:
+            return self.build(meta)
+
+        for id in ids:
+            item = meta.get(id)
+            for field in self.FIELDS:
+                dates = self.dates[field]
+                field_ids = self.ids[field]
+                try:
+                    i = field_ids.index(id)
+                except ValueError:
+                    pass
+                else:
+                    del dates[i]
+                    del field_ids[i]
+
+                date = item.get(field) if item else None
+                if date and isinstance(date, str):
+                    i = bisect_right(dates, date)
+                    dates.insert(i, date)
+                    field_ids.insert(i, id)
+
+        return self
+
+    def get_candidates(self, field, since, until):
+        """Get IDs of the items whose field is within since and until
+        (inclusive).
+
+        Returns:
+            set: the item IDs
+        """
+        dates = self.dates[field]
+        start = bisect_left(dates, since)
+        end = bisect_right(dates, until)
+        return set(self.ids[field][start:end])
+
+
+def split_site(url):
+    """Split a URL into the parts matched by a site rule.
+
+    Returns:
+        tuple: (scheme, host, path), in which scheme and host are lowercased
+            and path is the part after the authority (without the fragment),
+            or None if the URL cannot be parsed
+    """
+    try:
+        parts = urlsplit(url)
+        host = parts.hostname or ''
+    except ValueError:
+        return None
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    return (parts.scheme, host, path)
+
+
+class ExactIndex(MetaIndex):
+    """An index mapping the exact values of some fields of meta, or the keys
+    derived from them, to the items having them.
+
+    The keys are:
+    - id: each line of the folded ID
+    - type, charset: the value ('' if falsy), or None for a non-text value
+    - ext: the folded extension of the index file, or None for a non-text
+      index or one with a dot elsewhere, which may contain any text starting
+      with a dot
+    - host: the host of the source URL ('' if none)
+    """
+    CACHE_NAME = 'meta.exact'
+    FIELDS = ('id', 'type', 'charset', 'ext', 'host')
+
+    def __init__(self):
+        super().__init__()
+        self.keys = {}
+        self.values = {field: {} for field in self.FIELDS}
+
+    @classmethod
+    def build(cls, meta):
+        index = cls()
+        for id, item in meta.items():
+            index.add(id, item)
+        return index
+
+    def copy(self):
+        index = self.__class__()
+        index.keys = self.keys.copy()
+        index.values = {field: {key: ids.copy() for key, ids in values.items()}
+                        for field, values in self.values.items()}
+        return index
+
+    def add(self, id, item):
+        """Add an item to the index.
+
+        Args:
+            id: the item ID
+            item: the meta of the item
+        """
+        self.remove(id)
+        if not item:
+            return
+
+        keys = self.keys[id] = self.get_keys(id, item)
+        for field, key in keys:
+            try:
+                self.values[field][key].add(id)
+            except KeyError:
+                self.values[field][key] = {id}
+
+    def remove(self, id):
+        """Remove an item from the index."""
+        try:
+            keys = self.keys.pop(id)
+        except KeyError:
+            return
+
+        for field, key in keys:
+            ids = self.values[field][key]
+            ids.discard(id)
+            if not ids:
+                del self.values[field][key]
+
+    def update(self, meta, ids):
+        for id in ids:
+            self.add(id, meta.get(id))
+        return self
+
+    @classmethod
+    def get_keys(cls, id, item):
+        """Get the keys of an item.
+
+        Returns:
+            list: (field, key) for each key
+        """
+        keys = [('id', line) for line in dict.fromkeys(fold(id).split('\n'))]
+
+        for field in ('type', 'charset'):
+            value = item.get(field)
+            keys.append((field, cls._get_text_key(value)))
+
+        value = item.get('index')
+        if not value:
+            keys.append(('ext', ''))
+        elif isinstance(value, str):
+            folded = fold(value)
+            i = folded.rfind('.')
+            if i == -1:
+                keys.append(('ext', ''))
+            elif '.' in folded[:i] or '/' in folded[i:]:
+                keys.append(('ext', None))
+            else:
+                keys.append(('ext', folded[i:]))
+        else:
+            keys.append(('ext', None))
+
+        value = item.get('source')
+        site = split_site(value) if value and isinstance(value, str) else None
+        keys.append(('host', site[1] if site else ''))
+
+        return keys
+
+    @staticmethod
+    def _get_text_key(value):
+        if not value:
+            return ''
+        if isinstance(value, str):
+            return value
+        return None
+
+    def get_candidates(self, field, matcher):
+        """Get IDs of the items having a key that may match.
+
+        Args:
+            matcher: a function that takes a key and returns whether it
+                matches, which is called once for each key other than None
+
+        Returns:
+            set: the item IDs
+        """
+        rv = set()
+        for key, ids in self.values[field].items():
+            if key is None or matcher(key):
+                rv.update(ids)
+        return rv
+
+    def get_id_candidates(self, term):
+        """Get IDs of the items whose ID has a line equal to the term
+        case-insensitively.
+
+        Returns:
+            set: the item IDs, or None if the term cannot be looked up
+        """
+        if '\n' in term or not is_foldable(term):
+            return None
+        return set(self.values['id'].get(fold(term), ()))
+
+    def get_ext_candidates(self, term):
+        """Get IDs of the items whose index may contain the term starting
+        with a dot case-insensitively.
+
+        Returns:
+            set: the item IDs, or None if the term cannot be looked up
+        """
+        if not term.startswith('.') or not is_foldable(term):
+            return None
+        term = fold(term)
+        return self.get_candidates('ext', lambda ext: ext.startswith(term))
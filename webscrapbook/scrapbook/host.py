@@ -5,9 +5,9 @@ import os
 import shutil
 import stat
 import time
-from collections import UserDict
+from collections import OrderedDict, UserDict
 from secrets import token_urlsafe
-from threading import Thread
+from threading import Lock, Thread
 
 from .. import WSB_DIR, Config, util
 from ..locales import I18N
@@ -327,6 +327,85 @@ class FileLock:
             self.extend()
 
 
+class TreeCache:
+    """A size-limited cache of parsed tree files shared among Hosts.
+
+    An entry is keyed by the path of a tree file and is valid only if the
+    size, mtime, and inode of the file are unchanged. Least recently used
+    entries are evicted when the total size of the cached files exceeds
+    max_size.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def get_signature(file):
+        """Get the signature of a file for validating a cache entry.
+
+        Raises:
+            OSError: failed to stat the file
+        """
+        st = os.stat(file)
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def get(self, file, signature):
+        """Get the cached data of a file, or None if not cached or stale."""
+        with self._lock:
+            try:
+                sig, data, size = self._entries[file]
+            except KeyError:
+                return None
+
+            if sig != signature:
+                del self._entries[file]
+                self.size -= size
+                return None
+
+            self._entries.move_to_end(file)
+            return data
+
+    def set(self, file, signature, data):
+        """Cache the data of a file, evicting old entries if needed."""
+        size = signature[0]
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            try:
+                _, _, old_size = self._entries.pop(file)
+            except KeyError:
+                pass
+            else:
+                self.size -= old_size
+
+            self._entries[file] = (signature, data, size)
+            self.size += size
+
+            while self.size > self.max_size:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def discard(self, file):
+        """Remove the cached data of a file if it exists."""
+        with self._lock:
+            try:
+                _, _, size = self._entries.pop(file)
+            except KeyError:
+                return
+            self.size -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
 class BooksProxy(UserDict):
     """A proxied dict for Books.
 
@@ -351,7 +430,7 @@ class Host:
     """
     REPR_ATTRS = ('name', 'root')
 
-    def __init__(self, root, config=None):
+    def __init__(self, root, config=None, tree_cache=None):
         # use the same realpath during the process lifetime
         root = os.path.realpath(root)
 
@@ -380,6 +459,10 @@ class Host:
 
         self.books = BooksProxy(self)
 
+        # a TreeCache shared with other Hosts, or None to always load the
+        # tree files from disk
+        self.tree_cache = tree_cache
+
         self._auto_backup_dir = None  # directory for auto backup
 
     def __repr__(self):
@@ -40,8 +40,8 @@ class Importer():
         self.map_eid_to_info = {}
         self.map_id_to_new_id = {}
 
-        book_meta_orig = self.book.checksum(self.book.meta)
-        book_toc_orig = self.book.checksum(self.book.toc)
+        book_meta_orig = self.book.get_tree_state(self.book.meta)
+        book_toc_orig = self.book.get_tree_state(self.book.toc)
 
         # fix target_id
         if not self.rebuild_folders:
@@ -66,11 +66,11 @@ class Importer():
                     os.remove(file)
 
         # update files
-        if self.book.checksum(self.book.meta) != book_meta_orig:
+        if self.book.get_tree_state(self.book.meta) != book_meta_orig:
             yield Info('info', 'Saving changed meta files...')
             self.book.save_meta_files()
 
-        if self.book.checksum(self.book.toc) != book_toc_orig:
+        if self.book.get_tree_state(self.book.toc) != book_toc_orig:
             yield Info('info', 'Saving changed TOC files...')
             self.book.save_toc_files()
 
@@ -345,8 +345,9 @@ class Importer():
                 raise RuntimeError(f'file {dst!r} already exists')
 
             yield Info('debug', f'Extracting data files to {self.book.get_subpath(dst)!r}')
-            os.makedirs(os.path.dirname(dst), exist_ok=True)
-            util.fs.zip_extract(zh, dst, src)
+            with self.book.creating_data_file(dst):
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                util.fs.zip_extract(zh, dst, src)
 
         # import favicon
         for f in zh.namelist():
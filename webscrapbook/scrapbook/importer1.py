@@ -364,8 +364,9 @@ class Importer():
                 raise RuntimeError(f'file {dst!r} already exists')
 
             yield Info('debug', f'Extracting data files to {self.book.get_subpath(dst)!r}')
-            os.makedirs(os.path.dirname(dst), exist_ok=True)
-            util.fs.zip_extract(zh, dst, src)
+            with self.book.creating_data_file(dst):
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                util.fs.zip_extract(zh, dst, src)
 
         # import favicon
         for f in zh.namelist():
@@ -1,27 +1,170 @@
 """Search for items in book(s).
 """
+import copy
 import functools
+import heapq
 import html
+import itertools
 import re
-from collections import namedtuple
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import nullcontext
 from datetime import datetime, timedelta, timezone
+from threading import Lock, local
 
 from .. import util
-from .host import Host
+from .columns import MetaColumns, get_stats
+from .fulltext import (
+    DateIndex,
+    ExactIndex,
+    FulltextIndex,
+    FulltextShards,
+    TrigramIndex,
+    fold,
+    get_regex_literals,
+    get_term_tokens,
+    is_foldable,
+    split_site,
+)
+from .host import Host, TreeCache
 
 Item = namedtuple('Item', ('book_id', 'id', 'file', 'meta', 'fulltext', 'context'))
 Sort = namedtuple('Sort', ('key', 'subkey', 'order'), defaults=(None, None, 1))
 Date = namedtuple('Date', ('since', 'until'))
+Site = namedtuple('Site', ('scheme', 'host', 'path'))
 
 
 class QueryError(Exception):
     pass
 
 
+@functools.lru_cache(maxsize=1024)
+def _get_plain_term(key):
+    """Get the substring to find for a regex of a plain text term.
+
+    Returns:
+        tuple: (substring, whether to find it in the folded text), or None if
+            the regex is not a plain text term or cannot be found as a
+            substring
+    """
+    literals = get_regex_literals(key)
+    if not (literals and len(literals) == 1 and re.escape(literals[0]) == key.pattern):
+        return None
+
+    term = literals[0]
+    if not key.flags & re.I:
+        return (term, False)
+
+    if not is_foldable(term):
+        return None
+    return (fold(term), True)
+
+
+class _FoldMemo(local):
+    # a dict mapping each text to its folded form for the item being matched
+    # in the current thread, or None
+    value = None
+
+
+_fold_memo = _FoldMemo()
+
+
+def _fold(text):
+    memo = _fold_memo.value
+    if memo is None:
+        return fold(text)
+    try:
+        return memo[text]
+    except KeyError:
+        rv = memo[text] = fold(text)
+        return rv
+
+
+def _match_folding(memo, func, *args):
+    """Call a match function with folded texts memoized in memo.
+
+    The same text is usually searched for several rules and fields of an
+    item, and the memo is dropped with the item so that large texts are not
+    kept alive.
+    """
+    _fold_memo.value = memo
+    try:
+        return func(*args)
+    finally:
+        _fold_memo.value = None
+
+
+class _SearchCounter(local):
+    # [number of searches, number of chars searched] for the rule being
+    # explained in the current thread, or None
+    value = None
+
+
+_search_counter = _SearchCounter()
+
+# number of explaining searches, so that the counter is checked only if any
+_explaining = 0
+_explaining_lock = Lock()
+
+
+def _add_explaining(delta):
+    global _explaining
+    with _explaining_lock:
+        _explaining += delta
+
+
+def _count_search(text):
+    counter = _search_counter.value
+    if counter is not None:
+        counter[0] += 1
+        counter[1] += len(text)
+
+
+def _find_key(key, text, start=0):
+    """Find the first match of a regex in the text.
+
+    A plain text term is found with a substring search, which is much faster
+    than a regex search, especially a case-insensitive one.
+
+    Returns:
+        tuple: (start, end) of the match, or None if not found
+    """
+    if _explaining:
+        _count_search(text)
+
+    term = _get_plain_term(key)
+    if term is None:
+        m = key.search(text, start)
+        return m.span(0) if m else None
+
+    substr, folded = term
+    i = (_fold(text) if folded else text).find(substr, start)
+    return (i, i + len(substr)) if i != -1 else None
+
+
+class _SortKey:
+    """A composite sort key with an order for each value."""
+    __slots__ = ('values', 'orders')
+
+    def __init__(self, values, orders):
+        self.values = values
+        self.orders = orders
+
+    def __eq__(self, other):
+        return self.values == other.values
+
+    def __lt__(self, other):
+        for value, other_value, order in zip(self.values, other.values, self.orders):
+            if value == other_value:
+                continue
+            return (value < other_value) if order == 1 else (value > other_value)
+        return False
+
+
 class Query:
     """Represents a search query."""
-    REPR_FIELDS = ('books', 'roots', 'rules', 'sorts', 'limit', 'mc', 're', 'default')
+    REPR_FIELDS = ('books', 'roots', 'rules', 'sorts', 'limit', 'mc', 're', 'default', 'explain')
 
     ALLOWED_DEFAULT_FIELDS = {
         'id', 'type', 'file',
@@ -50,6 +193,31 @@ class Query:
 
     ELLIPSIS = '…'
 
+    # Estimated relative cost of evaluating a term of a rule. Rules are
+    # evaluated from the cheapest so that an item is rejected as early as
+    # possible.
+    RULE_COSTS = {
+        'marked': 1,
+        'locked': 1,
+        'location': 1,
+        'create': 2,
+        'modify': 2,
+        'id': 4,
+        'type': 4,
+        'charset': 4,
+        'index': 8,
+        'icon': 8,
+        'file': 8,
+        'title': 16,
+        'source': 16,
+        'site': 16,
+        'comment': 32,
+        'content': 1024,
+    }
+
+    # Fields that vary among the files of an item.
+    FILE_FIELDS = {'file', 'content'}
+
     def __init__(self, query_text):
         """Inatialize a new query.
 
@@ -59,15 +227,27 @@ class Query:
         self.default = ['title', 'comment', 'content']
         self.mc = False
         self.re = False
+        self.explain = False
         self.books = {}
         self.roots = {}
         self.rules = {}
         self.sorts = []
         self.limit = -1
 
+        # plain text of each compiled non-regex term
+        self.plain_terms = {}
+
+        # book ID => {field: {term regex: IDs of the items that may match}}
+        self.hints = {}
+
+        # rule label => stats of checking the rule, if explaining
+        self.rule_stats = None
+
         self.PARSE_TEXT_REGEX.sub(self._parse_query, query_text)
         self.roots.setdefault('include', ['root'])
 
+        self.item_rules, self.file_rules = self._plan_rules()
+
         self.markers = {
             'title': [
                 *(self.rules.get(None, {}).get('include', []) if 'title' in self.default else []),
@@ -96,6 +276,40 @@ class Query:
         attrs = ', '.join(f'{f}={getattr(self, f)!r}' for f in self.REPR_FIELDS)
         return f'{cls}({attrs})'
 
+    def copy(self):
+        """Get a copy for another search, sharing the parsed rules."""
+        query = copy.copy(self)
+        query.books = {k: list(v) for k, v in self.books.items()}
+        query.roots = {k: list(v) for k, v in self.roots.items()}
+        query.hints = {}
+        query.rule_stats = None
+        return query
+
+    def get_key(self):
+        """Get a hashable key of the parsed query.
+
+        Queries with the same key give the same results, even if the query
+        texts differ (e.g. in spacing or order of the rules).
+        """
+        rules = []
+        for cmd, rule in sorted(self.rules.items(), key=lambda x: str(x[0])):
+            for inclusion, keys in sorted(rule.items()):
+                if isinstance(keys, list):
+                    keys = tuple(
+                        (key.pattern, key.flags) if isinstance(key, re.Pattern) else key
+                        for key in keys
+                    )
+                rules.append((cmd, inclusion, keys))
+
+        return (
+            tuple(self.default),
+            tuple((k, tuple(v)) for k, v in sorted(self.books.items())),
+            tuple((k, tuple(v)) for k, v in sorted(self.roots.items())),
+            tuple(rules),
+            tuple(self.sorts),
+            self.limit,
+        )
+
     def _parse_query(self, match):
         cmd, qterm1, term1, qterm2, term2 = match.group('cmd', 'qterm1', 'term1', 'qterm2', 'term2')
         pos = True
@@ -120,6 +334,8 @@ class Query:
             self.mc = pos
         elif cmd == 're':
             self.re = pos
+        elif cmd == 'explain':
+            self.explain = pos
         elif cmd == 'book':
             inclusion = 'include' if pos else 'exclude'
             self.books.setdefault(inclusion, []).append(term)
@@ -155,6 +371,10 @@ class Query:
             inclusion = 'include' if pos else 'exclude'
             value = self._parse_str(term)
             self.rules.setdefault(cmd, {}).setdefault(inclusion, []).append(value)
+        elif cmd == 'site':
+            inclusion = 'include' if pos else 'exclude'
+            value = self._parse_site(term)
+            self.rules.setdefault(cmd, {}).setdefault(inclusion, []).append(value)
         elif cmd in ('create', 'modify'):
             inclusion = 'include' if pos else 'exclude'
             value = self._parse_date(term)
@@ -192,7 +412,16 @@ class Query:
             key = re.escape(term)
             if exact_match:
                 key = '^' + key + '$'
-            return re.compile(key, flags=flags)
+            regex = re.compile(key, flags=flags)
+            self.plain_terms[regex] = term
+            return regex
+
+    @staticmethod
+    def _parse_site(term):
+        site = split_site(term if '://' in term else f'//{term}')
+        if site is None:
+            raise ValueError(f'Invalid site: {term}')
+        return Site(*site)
 
     @classmethod
     def _parse_date(cls, term):
@@ -270,20 +499,140 @@ class Query:
                 f'{dt.hour:0>2}{dt.minute:0>2}{dt.second:0>2}'
                 f'{(dt.microsecond // 1000):0>3}')
 
+    @property
+    def needs_content(self):
+        """Whether the content of the fulltext cache is needed to match or
+        sort the items.
+        """
+        if 'content' in self.rules:
+            return True
+        if None in self.rules and 'content' in self.default:
+            return True
+        return any(sort.key == 'fulltext' for sort in self.sorts)
+
+    def get_field_terms(self, field):
+        """Get the terms to be searched in a text field.
+
+        Returns:
+            dict: term regex => plain text, or None for a regex term
+        """
+        rules = [self.rules.get(field, {})]
+        if field in self.default:
+            rules.append(self.rules.get(None, {}))
+
+        rv = {}
+        for rule in rules:
+            for key in itertools.chain(rule.get('include', []), rule.get('exclude', [])):
+                rv[key] = self.plain_terms.get(key)
+        return rv
+
+    def _plan_rules(self):
+        """Split the rules into those for an item and those for each file of
+        the item, each in the order of estimated cost.
+
+        Returns:
+            tuple: (item_rules, file_rules), each a list of (key, rule)
+        """
+        item_rules = []
+        file_rules = []
+        for key, rule in sorted(self.rules.items(), key=self._get_rule_cost):
+            fields = self.default if key is None else (key,)
+            if self.FILE_FIELDS.isdisjoint(fields):
+                item_rules.append((key, rule))
+            else:
+                file_rules.append((key, rule))
+        return item_rules, file_rules
+
+    def _get_rule_cost(self, rule_item):
+        key, rule = rule_item
+        if key is None:
+            cost = sum(self.RULE_COSTS.get(field, 0) for field in self.default)
+        else:
+            cost = self.RULE_COSTS.get(key, 0)
+        try:
+            count = len(rule.get('include', ())) + len(rule.get('exclude', ()))
+        except TypeError:
+            # a bool rule
+            count = 1
+        return cost * count
+
     def match_item(self, item):
-        for key, rule in self.rules.items():
-            if not getattr(self, f'_match_{key or "default"}')(rule, item):
+        return self.match_item_meta(item) and self.match_item_file(item)
+
+    def match_item_meta(self, item):
+        """Check the rules not depending on the file of the item."""
+        return self._match_rules(self.item_rules, item)
+
+    def match_item_file(self, item, hits=None):
+        """Check the rules depending on the file of the item.
+
+        Args:
+            hits: a dict to record the first match of each searched key in
+                the content, for generating the snippet without searching
+                again
+        """
+        return self._match_rules(self.file_rules, item, hits)
+
+    def _match_rules(self, rules, item, hits=None):
+        if self.rule_stats is not None:
+            return self._match_rules_explained(rules, item, hits)
+
+        hints = self.hints.get(item.book_id)
+        for key, rule in rules:
+            if hints and key in hints:
+                if not self._match_hinted(key, rule, item, hints[key], hits):
+                    return False
+                continue
+            args = (hits,) if hits is not None and key in (None, 'content') else ()
+            if not getattr(self, f'_match_{key or "default"}')(rule, item, *args):
                 return False
         return True
 
-    def _match_default(self, rule, item):
+    def _match_rules_explained(self, rules, item, hits=None):
+        """Same as _match_rules(), but record the stats of each rule."""
+        stats = self.rule_stats
+        self.rule_stats = None
+        try:
+            for key, rule in rules:
+                try:
+                    rule_stats = stats[key or 'default']
+                except KeyError:
+                    rule_stats = stats[key or 'default'] = {
+                        'checked': 0, 'passed': 0, 'searches': 0, 'scanned': 0, 'time': 0.0,
+                    }
+
+                counter = _search_counter.value = [0, 0]
+                start = time.perf_counter()
+                matched = self._match_rules(((key, rule),), item, hits)
+                rule_stats['time'] += time.perf_counter() - start
+                rule_stats['checked'] += 1
+                rule_stats['searches'] += counter[0]
+                rule_stats['scanned'] += counter[1]
+                if not matched:
+                    return False
+                rule_stats['passed'] += 1
+            return True
+        finally:
+            _search_counter.value = None
+            self.rule_stats = stats
+
+    def _match_default(self, rule, item, hits=None):
+        hints = self.hints.get(item.book_id)
         for field in self.default:
-            if field == 'id':
+            if hints and field in hints:
+                if self._match_hinted(field, rule, item, hints[field], hits):
+                    return True
+                continue
+            elif field == 'id':
                 value = item.id
             elif field == 'file':
                 value = item.file
             elif field == 'content':
                 value = item.fulltext.get('content')
+                if hits is not None:
+                    if self.match_text(rule, value, hits):
+                        return True
+                    continue
             else:
                 value = item.meta.get(field)
 
@@ -292,9 +641,20 @@ class Query:
 
         return False
 
+    def _match_hinted(self, field, rule, item, hints, hits=None):
+        if field == 'content':
+            value = item.fulltext.get('content')
+            if hits is not None:
+                return self.match_text_hinted(rule, value, hints, item.id, hits)
+        else:
+            value = item.meta.get(field)
+        return self.match_text_hinted(rule, value, hints, item.id)
+
     @classmethod
-    def _match_content(cls, rule, item):
+    def _match_content(cls, rule, item, hits=None):
         value = item.fulltext.get('content')
+        if hits is not None:
+            return cls.match_text(rule, value, hits)
         return cls.match_text(rule, value)
 
     @classmethod
@@ -342,6 +702,11 @@ class Query:
         value = item.meta.get('type')
         return cls.match_text_or(rule, value)
 
+    @classmethod
+    def _match_site(cls, rule, item):
+        value = item.meta.get('source')
+        return cls.match_site_or(rule, value)
+
     @classmethod
     def _match_create(cls, rule, item):
         value = item.meta.get('create')
@@ -377,14 +742,46 @@ class Query:
                 return False
         return True
 
+    @classmethod
+    def match_text(cls, rule, text, hits=None):
+        """Check whether the text matches the rule.
+
+        Args:
+            hits: a dict to record the first match of each searched include
+                key, or None to not record
+        """
+        return cls._match_text_keys(rule.get('exclude', []), rule.get('include', []), text, hits)
+
+    @classmethod
+    def match_text_hinted(cls, rule, text, hints, id, hits=None):
+        """Same as match_text(), but skip the search for a key if the ID is
+        not in its candidates.
+        """
+        exclude = []
+        for key in rule.get('exclude', []):
+            ids = hints.get(key)
+            if ids is None or id in ids:
+                exclude.append(key)
+        include = rule.get('include', [])
+        for key in include:
+            ids = hints.get(key)
+            if ids is not None and id not in ids:
+                if hits is not None:
+                    hits[key] = None
+                return False
+        return cls._match_text_keys(exclude, include, text, hits)
+
     @staticmethod
-    def match_text(rule, text):
+    def _match_text_keys(exclude, include, text, hits=None):
         text = text or ''
-        for key in rule.get('exclude', []):
-            if key.search(text):
+        for key in exclude:
+            if _find_key(key, text):
                 return False
-        for key in rule.get('include', []):
-            if not key.search(text):
+        for key in include:
+            span = _find_key(key, text)
+            if hits is not None:
+                hits[key] = span[0] if span else None
+            if not span:
                 return False
         return True
 
@@ -392,15 +789,48 @@ class Query:
     def match_text_or(rule, text):
         text = text or ''
         for key in rule.get('exclude', []):
+            if _explaining:
+                _count_search(text)
             if key.search(text):
                 return False
         if not rule.get('include'):
             return True
         for key in rule.get('include', []):
+            if _explaining:
+                _count_search(text)
             if key.search(text):
                 return True
         return False
 
+    @classmethod
+    def match_site_or(cls, rule, url):
+        site = (split_site(url) if url and isinstance(url, str) else None) or ('', '', '')
+        return cls.match_site_parts_or(rule, *site)
+
+    @staticmethod
+    def match_site_parts_or(rule, scheme, host, path):
+        """Check whether the split parts of a URL match the rule.
+
+        A site key matches a URL of the same host or a subdomain of it,
+        with the same scheme and a path starting with the key's if given.
+        """
+        def match(key):
+            if key.scheme and key.scheme != scheme:
+                return False
+            if host != key.host and not (key.host and host.endswith(f'.{key.host}')):
+                return False
+            return path.startswith(key.path)
+
+        for key in rule.get('exclude', []):
+            if match(key):
+                return False
+        if not rule.get('include'):
+            return True
+        for key in rule.get('include', []):
+            if match(key):
+                return True
+        return False
+
     @staticmethod
     def match_date_or(rule, date):
         if not date:
@@ -415,7 +845,14 @@ class Query:
                 return True
         return False
 
-    def get_snippet(self, text, marker_type=None, ln=-1):
+    def get_snippet(self, text, marker_type=None, ln=-1, hits=None):
+        """Get the marked snippet of the text.
+
+        Args:
+            ln: the max length of the snippet, or -1 for no limit
+            hits: the recorded first matches of the text keys, which are not
+                searched again
+        """
         if not text:
             return ''
 
@@ -424,25 +861,30 @@ class Query:
             if marker_type == 'source':
                 text, ellipsis = util.cropped(text, ln, self.ELLIPSIS)
             else:
-                text, ellipsis = self._crop_at_first_hit(text, regexes, ln)
+                text, ellipsis = self._crop_at_first_hit(text, regexes, ln, hits=hits)
         else:
             ellipsis = ''
         return ''.join(self._gen_marked_text(text, regexes)) + self._gen_marked_text_marker(ellipsis)
 
     @classmethod
-    def _crop_at_first_hit(cls, text, regexes, length, context_ratio=0.25):
+    def _crop_at_first_hit(cls, text, regexes, length, context_ratio=0.25, hits=None):
         min_hit = inf = float('inf')
         for regex in regexes:
-            m = regex.search(text)
-            if not m:
-                continue
-            start = m.start(0)
+            if hits and regex in hits:
+                start = hits[regex]
+                if start is None:
+                    continue
+            else:
+                span = _find_key(regex, text)
+                if not span:
+                    continue
+                start = span[0]
             if start < min_hit:
                 min_hit = start
-        if min_hit < inf:
-            start = max(int(min_hit - length * context_ratio), 0)
-            text = text[start:]
-        return util.cropped(text, length, cls.ELLIPSIS)
+        start = max(int(min_hit - length * context_ratio), 0) if min_hit < inf else 0
+
+        # take only the window to crop rather than copying the whole rest
+        return util.cropped(text[start:start + length + 1], length, cls.ELLIPSIS)
 
     @classmethod
     def _gen_marked_text(cls, text, regexes):
@@ -451,15 +893,15 @@ class Query:
         hits = []
         for idx, regex in enumerate(regexes):
             pos = 0
-            m = regex.search(text, pos)
-            while m:
-                start, end = m.span(0)
+            span = _find_key(regex, text, pos)
+            while span:
+                start, end = span
                 hit = (start, end, idx)
                 hits.append(hit)
                 pos = max(hit[1], pos + 1)
                 if pos > ln:
                     break
-                m = regex.search(text, pos)
+                span = _find_key(regex, text, pos)
 
         hits = sorted(hits, key=cls._gen_marked_text_sortkey)
 
@@ -493,31 +935,360 @@ class Query:
         return f'<mark class="kw{idx}">' + html.escape(text) + '</mark>'
 
 
+class SearchCache:
+    """A size-limited LRU cache of parsed queries and search results shared
+    among searches.
+
+    A result entry is keyed by the parsed query, the searched books, and the
+    signatures of their tree files, so that it's never used once a tree file
+    of the books is changed. The results are cached as a list of
+    (book_id, id, file) of the found items, which are looked up in the books
+    again when used, so that the cache doesn't keep the loaded tree data.
+    Results of more than max_items items are not cached, and least recently
+    used results are evicted when there are more than max_size items in
+    total.
+
+    The leading results of an incomplete search are also cached, which serve
+    the later requests needing no more results, such as for a next page.
+    """
+    def __init__(self, max_entries, max_items, max_size=None):
+        self.max_entries = max_entries
+        self.max_items = max_items
+        self.max_size = max_size
+        self.size = 0
+        self._queries = OrderedDict()
+        self._results = OrderedDict()
+        self._lock = Lock()
+
+    def get_query(self, query_text):
+        """Get a parsed query.
+
+        Raises:
+            ValueError: if the query cannot be parsed correctly
+        """
+        with self._lock:
+            query = self._queries.get(query_text)
+            if query is not None:
+                self._queries.move_to_end(query_text)
+                return query.copy()
+
+        query = Query(query_text)
+
+        with self._lock:
+            self._set(self._queries, query_text, query)
+
+        return query.copy()
+
+    def get(self, key, count=None):
+        """Get the cached results.
+
+        Args:
+            count: the number of leading results needed, or None for all
+
+        Returns:
+            list: the cached results, or None if not cached or not enough
+        """
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return None
+
+            items, complete = entry
+            if not complete and (count is None or len(items) < count):
+                return None
+
+            self._results.move_to_end(key)
+            return items
+
+    def set(self, key, items, complete=True):
+        """Cache the results.
+
+        Args:
+            complete: False if items are only the leading results
+        """
+        if len(items) > self.max_items:
+            return
+
+        if self.max_size is not None and len(items) > self.max_size:
+            return
+
+        with self._lock:
+            entry = self._results.pop(key, None)
+            if entry is not None:
+                if not complete and (entry[1] or len(entry[0]) >= len(items)):
+                    # don't replace the cached results with less
+                    items, complete = entry
+                self.size -= len(entry[0])
+
+            self._results[key] = (items, complete)
+            self.size += len(items)
+
+            while (len(self._results) > self.max_entries
+                    or self.max_size is not None and self.size > self.max_size):
+                _, (evicted, _) = self._results.popitem(last=False)
+                self.size -= len(evicted)
+
+    def _set(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._queries.clear()
+            self._results.clear()
+            self.size = 0
+
+
+class SearchExplain:
+    """The breakdown of a search, for finding out where the time goes.
+
+    The report (see get_report()) has:
+    - time: the total time of the search, in seconds
+    - phases: the time of each phase in PHASES, in seconds, which are:
+      - lock: waiting for the tree lock of the books
+      - load: loading the tree files
+      - index: looking up the indexes for the candidate items
+      - roots: getting the items reachable from the roots
+      - match: checking the rules for the items
+      - sort: sorting the results
+      - context: generating the context snippets of the results
+    - results: the number of results
+    - books: book ID => the breakdown of the book, with:
+      - items: the number of items reachable from the roots
+      - candidates: a list of [index, count] for the number of candidate
+        items after looking up each index, in which index is "columns",
+        "exact", a date field for the date index, or a text field for the
+        hints of its terms
+      - rules: a list of the stats of each checked rule in the order of
+        checking, each with the rule ("default" for keywords without a
+        command), the number of items checked and passed, the number of
+        text searches (regex or substring), the number of chars searched
+        (scanned), and the time in seconds
+      - fulltext_files: the number of fulltext files loaded, or None if
+        all are loaded
+      - results: the number of results
+    """
+    PHASES = ('lock', 'load', 'index', 'roots', 'match', 'sort', 'context')
+
+    def __init__(self):
+        self.time = 0.0
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.books = {}
+
+        # book ID => the lazily loaded FulltextShards
+        self.fulltexts = {}
+
+    def get_book(self, book_id):
+        try:
+            return self.books[book_id]
+        except KeyError:
+            pass
+
+        rv = self.books[book_id] = {
+            'items': 0,
+            'candidates': [],
+            'rules': {},
+            'fulltext_files': None,
+            'results': 0,
+        }
+        return rv
+
+    def measure(self, phase):
+        """Get a context manager that adds the elapsed time to a phase."""
+        return _ExplainTimer(self.phases, phase)
+
+    def get_report(self):
+        books = {}
+        for book_id, book in self.books.items():
+            book = books[book_id] = dict(book)
+            book['rules'] = [{'rule': rule, **stats} for rule, stats in book['rules'].items()]
+            fulltext = self.fulltexts.get(book_id)
+            if fulltext is not None:
+                book['fulltext_files'] = len(fulltext.loaded)
+
+        phases = dict(self.phases)
+        phases['match'] = sum(rule['time'] for book in books.values() for rule in book['rules'])
+
+        return {
+            'time': self.time,
+            'phases': phases,
+            'results': sum(book['results'] for book in books.values()),
+            'books': books,
+        }
+
+
+class _ExplainTimer:
+    __slots__ = ('phases', 'phase', 'start')
+
+    def __init__(self, phases, phase):
+        self.phases = phases
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.phases[self.phase] += time.perf_counter() - self.start
+
+
 class SearchEngine:
-    def __init__(self, host, query_text, *, lock=True, context=None):
+    TREE_NAMES = ('meta', 'toc', 'fulltext')
+
+    # fields whose rules can be looked up from the exact index
+    EXACT_RULE_FIELDS = frozenset({'id', 'type', 'charset', 'index', 'site'})
+
+    def __init__(self, host, query_text, *, lock=True, context=None, cache=None,
+                 executor=None):
         """Inatialize a new search for the host.
 
+        A search with the "explain:" option records its breakdown in
+        self.explain (a SearchExplain). It doesn't use the cached results,
+        and searches the books in turn to measure each phase.
+
+        Args:
+            cache: a SearchCache to reuse the parsed query and results, or
+                None to always search
+            executor: an executor from create_executor() for the host to
+                search the books in parallel, or None to search them in turn
+
         Raises:
             QueryError: if the query cannot be parsed correctly
         """
         self.host = host
         self.query_text = query_text
         try:
-            self.query = Query(query_text)
+            self.query = Query(query_text) if cache is None else cache.get_query(query_text)
         except ValueError as exc:
             raise QueryError(str(exc)) from exc
         self.lock = lock
         self.context = context or {}
+        self.cache = cache
+        self.executor = executor
+
+        # the fulltext files are loaded only if the content is needed
+        self.needs_content = self.query.needs_content or isinstance(self.context.get('fulltext'), int)
 
-    def run(self):
+        # (book ID, item ID, file) => the recorded first matches in the
+        # content of a found item, popped when generating its snippet
+        self.hits = {}
+
+        self.explain = SearchExplain() if self.query.explain else None
+
+    def run(self, offset=0, size=-1):
         """Start the search and yields result items.
 
+        Args:
+            offset: the number of leading results to skip
+            size: the max number of results to yield, or -1 for no limit
+
         Yields:
             Item: a found item
         """
-        for item in self.search():
-            self._generate_context(item)
-            yield item
+        explain = self.explain
+        if explain is not None:
+            _add_explaining(1)
+            start = time.perf_counter()
+
+        stop = offset + size if size >= 0 else None
+        results = self.search_cached(stop)
+        try:
+            # context is generated only for the yielded items
+            for item in itertools.islice(results, offset, stop):
+                if explain is None:
+                    self._generate_context(item)
+                else:
+                    with explain.measure('context'):
+                        self._generate_context(item)
+                    explain.get_book(item.book_id)['results'] += 1
+                yield item
+        finally:
+            results.close()
+            if explain is not None:
+                explain.time += time.perf_counter() - start
+                _add_explaining(-1)
+
+    def _measure(self, phase):
+        if self.explain is None:
+            return nullcontext()
+        return self.explain.measure(phase)
+
+    def search_cached(self, count=None):
+        """Search with the results cache.
+
+        Args:
+            count: the number of leading results needed, or None for all.
+                Cached leading results are used if there are enough.
+        """
+        if self.cache is None or self.explain is not None:
+            yield from self.search()
+            return
+
+        key = self._get_cache_key()
+        items = self.cache.get(key, count)
+        if items is not None:
+            yield from self._load_cached_items(items)
+            return
+
+        items = []
+        complete = False
+        try:
+            for item in self.search():
+                if items is not None:
+                    items.append((item.book_id, item.id, item.file))
+                    if len(items) > self.cache.max_items:
+                        items = None
+                yield item
+            complete = True
+        finally:
+            if items is not None:
+                self.cache.set(key, items, complete)
+
+    def _load_cached_items(self, items):
+        """Generate the items from the cached (book_id, id, file) of the
+        results.
+        """
+        for book_id, group in itertools.groupby(items, key=lambda item: item[0]):
+            book = self.host.books[book_id]
+            lh = book.get_tree_lock(persist=self.lock).acquire() if self.lock else nullcontext()
+            with lh:
+                book.load_meta_files()
+                if not self.needs_content:
+                    fulltext = None
+                elif book.fulltext is not None:
+                    fulltext = book.fulltext
+                else:
+                    fulltext = FulltextShards.load(book)
+
+                results = []
+                for _, id, file in group:
+                    meta = book.meta.get(id)
+                    if meta is None:
+                        continue
+
+                    subfiles = fulltext.get(id) if fulltext is not None else None
+                    results.append(Item(
+                        book_id=book_id,
+                        id=id,
+                        file=file,
+                        meta=meta,
+                        fulltext=subfiles.get(file, {}) if subfiles else {},
+                        context={},
+                    ))
+
+            yield from results
+
+    def _get_cache_key(self):
+        books = []
+        for book_id in self._get_book_ids():
+            book = self.host.books[book_id]
+            if book.no_tree:
+                stamp = None
+            else:
+                stamp = tuple(book.get_tree_files_signature(name) for name in self.TREE_NAMES)
+            books.append((book_id, stamp))
+        return (self.query.get_key(), self.needs_content, tuple(books))
 
     def search(self):
         results = self.search_books()
@@ -541,50 +1312,177 @@ class SearchEngine:
 
         yield from results
 
-    def search_books(self):
+    def _get_book_ids(self):
         if self.query.books.setdefault('include', []):
             book_ids = {id: None for id in self.query.books['include'] if id in self.host.books}
         else:
             book_ids = self.host.books
 
+        excludes = self.query.books.setdefault('exclude', [])
+        return [book_id for book_id in book_ids if book_id not in excludes]
+
+    def search_books(self):
+        book_ids = self._get_book_ids()
+        if self.executor is not None and len(book_ids) > 1 and self.explain is None:
+            yield from self.search_books_parallel(book_ids)
+            return
+
+        limit = self.query.limit
+        count = 0
         for book_id in book_ids:
-            if book_id in self.query.books.setdefault('exclude', []):
-                continue
+            if 0 <= limit <= count:
+                return
 
-            lh = self.host.books[book_id].get_tree_lock(persist=self.lock).acquire() if self.lock else nullcontext()
+            if self.lock:
+                lock = self.host.books[book_id].get_tree_lock(persist=self.lock)
+                with self._measure('lock'):
+                    lh = lock.acquire()
+            else:
+                lh = nullcontext()
             with lh:
-                for item in self.search_book_sorted(book_id):
+                # push the remaining limit down to the book
+                if limit >= 0:
+                    results = self.search_book_sorted(book_id, limit - count)
+                else:
+                    results = self.search_book_sorted(book_id)
+                for item in results:
+                    count += 1
                     yield item
 
-    def search_book_sorted(self, book_id):
+    def search_books_parallel(self, book_ids):
+        """Search the books in the worker processes of the executor.
+
+        The results of a book are yielded once it's searched, in the order of
+        the books, while the later books are still being searched.
+        """
+        limit = self.query.limit
+        count = 0
+        futures = [
+            self.executor.submit(
+                _search_book_worker, self.query_text, book_id, self.lock,
+                limit if limit >= 0 else None, self.context,
+            )
+            for book_id in book_ids
+        ]
+        try:
+            for future in futures:
+                for item in future.result():
+                    if 0 <= limit <= count:
+                        return
+                    count += 1
+                    yield item
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def search_book_sorted(self, book_id, limit=None):
+        """Search a book and sort the results.
+
+        Args:
+            limit: the max number of results needed, or None for all. Only
+                the top results are kept when sorting.
+        """
         results = self.search_book(book_id)
-        for sort in self.query.sorts:
-            keyfunc = functools.partial(self._search_book_sortkey, sort)
-            results = sorted(results, key=keyfunc, reverse=sort.order == -1)
+        if not self.query.sorts:
+            yield from results
+            return
+
+        if self.explain is not None:
+            # search before sorting to measure them separately
+            results = list(results)
+
+        with self._measure('sort'):
+            keyfunc, reverse = self._get_sortkey()
+            if limit is None:
+                results = sorted(results, key=keyfunc, reverse=reverse)
+            elif reverse:
+                results = heapq.nlargest(limit, results, key=keyfunc)
+            else:
+                results = heapq.nsmallest(limit, results, key=keyfunc)
         yield from results
 
+    def _get_sortkey(self):
+        """Get a composite sort key for all sorts.
+
+        A later sort takes precedence, as if the results were stably sorted
+        by each sort in turn.
+
+        Returns:
+            tuple: (keyfunc, reverse)
+        """
+        sorts = self.query.sorts[::-1]
+        orders = tuple(sort.order for sort in sorts)
+
+        def get_values(item):
+            return tuple(self._search_book_sortkey(sort, item) for sort in sorts)
+
+        if len(set(orders)) == 1:
+            return get_values, orders[0] == -1
+
+        def keyfunc(item):
+            return _SortKey(get_values(item), orders)
+
+        return keyfunc, False
+
     def search_book(self, book_id):
         book = self.host.books[book_id]
         if book.no_tree:
             return
 
-        book.load_meta_files()
-        book.load_toc_files()
-        book.load_fulltext_files()
+        with self._measure('load'):
+            book.load_meta_files()
+            book.load_toc_files()
+            fulltext = book.fulltext if book.fulltext is not None else FulltextShards.load(book)
 
-        id_pool = book.get_reachable_items(self.query.roots['include'])
-        for id in book.get_reachable_items(self.query.roots.setdefault('exclude', [])):
-            try:
-                del id_pool[id]
-            except KeyError:
-                pass
+        with self._measure('index'):
+            hints = self.query.hints[book_id] = self._get_hints(book, fulltext)
+            candidates = self._get_candidates(book, hints)
+
+        with self._measure('roots'):
+            id_pool = book.get_reachable_items(self.query.roots['include'])
+            for id in book.get_reachable_items(self.query.roots.setdefault('exclude', [])):
+                try:
+                    del id_pool[id]
+                except KeyError:
+                    pass
+
+        explain = self.explain
+        if explain is not None:
+            explain.get_book(book_id)['items'] = len(id_pool)
+            self.query.rule_stats = explain.get_book(book_id)['rules']
+            if isinstance(fulltext, FulltextShards):
+                explain.fulltexts[book_id] = fulltext
 
         for id in id_pool:
+            if candidates is not None and id not in candidates:
+                continue
+
             meta = book.meta.get(id)
             if meta is None:
                 continue
 
-            subfiles = book.fulltext.get(id)
+            fold_memo = {}
+
+            # check the rules for the item once rather than for each file
+            item = Item(
+                book_id=book_id,
+                id=id,
+                file='',
+                meta=meta,
+                fulltext={},
+                context={},
+            )
+            if not _match_folding(fold_memo, self.query.match_item_meta, item):
+                continue
+
+            if self.needs_content or not isinstance(fulltext, FulltextShards):
+                if explain is None:
+                    subfiles = fulltext.get(id)
+                else:
+                    with explain.measure('load'):
+                        subfiles = fulltext.get(id)
+            else:
+                subfiles = {file: {} for file in fulltext.get_files(id) or ()}
             if not subfiles:
                 subfiles = {'': {}}
 
@@ -597,9 +1495,249 @@ class SearchEngine:
                     fulltext=subfiles[file],
                     context={},
                 )
-                if self.query.match_item(item):
+                hits = {}
+                if _match_folding(fold_memo, self.query.match_item_file, item, hits):
+                    if hits:
+                        self.hits[(book_id, id, file)] = hits
                     yield item
 
+    def _get_hints(self, book, fulltext):
+        """Get the candidate items of the text terms from the indexes.
+
+        Returns:
+            dict: field => {term regex => set of item IDs}
+        """
+        rv = {}
+
+        hints = self._get_content_hints(book, fulltext)
+        if hints:
+            rv['content'] = hints
+
+        index = None
+        for field in TrigramIndex.FIELDS:
+            terms = self.query.get_field_terms(field)
+            if not terms:
+                continue
+
+            if index is None:
+                index = TrigramIndex.load(book)
+                if index is None:
+                    break
+
+            hints = {}
+            for key, term in terms.items():
+                literals = [term] if term is not None else get_regex_literals(key)
+                if not literals:
+                    continue
+                ids = index.get_candidates(field, literals, bool(key.flags & re.I))
+                if ids is not None:
+                    # items changed since the index is built may match
+                    ids.update(book.meta.dirty)
+                    hints[key] = ids
+            if hints:
+                rv[field] = hints
+
+        return rv
+
+    def _get_candidates(self, book, hints):
+        """Get the items that may match all the rules.
+
+        The candidates of the non-text fields (from the column snapshot, or
+        the included dates from the date index if not available), the exact
+        value fields (from the exact index), and the included text terms
+        (from the hints) of each rule are intersected.
+
+        Returns:
+            set: the item IDs, or None if any item may match
+        """
+        rv = None
+
+        columns = None
+        if not MetaColumns.RULE_FIELDS.isdisjoint(self.query.rules):
+            columns = MetaColumns.load(book)
+            if columns is not None:
+                rv = self._get_column_candidates(book, columns)
+                self._explain_candidates(book, 'columns', rv)
+
+        fields = self.EXACT_RULE_FIELDS
+        if columns is not None:
+            fields = fields - MetaColumns.RULE_FIELDS
+        if not fields.isdisjoint(self.query.rules):
+            exact_index = ExactIndex.load(book)
+            if exact_index is not None:
+                ids = self._get_exact_candidates(book, exact_index, fields)
+                if ids is not None:
+                    rv = ids if rv is None else rv & ids
+                    self._explain_candidates(book, 'exact', rv)
+
+        date_index = None
+        for field, rule in self.query.rules.items():
+            include = rule.get('include')
+            if not include:
+                continue
+
+            if field in DateIndex.FIELDS:
+                if columns is not None:
+                    continue
+
+                if date_index is None:
+                    date_index = DateIndex.load(book)
+                    if date_index is None:
+                        continue
+
+                # dates of a rule are ORed
+                ids = set()
+                for date in include:
+                    ids.update(date_index.get_candidates(field, date.since, date.until))
+
+                # items changed since the index is built may match
+                ids.update(book.meta.dirty)
+
+                rv = ids if rv is None else rv & ids
+                self._explain_candidates(book, field, rv)
+
+            elif field in hints:
+                # terms of a rule are ANDed
+                for key in include:
+                    ids = hints[field].get(key)
+                    if ids is not None:
+                        rv = set(ids) if rv is None else rv & ids
+                self._explain_candidates(book, field, rv)
+
+        return rv
+
+    def _explain_candidates(self, book, index, ids):
+        if self.explain is not None and ids is not None:
+            self.explain.get_book(book.id)['candidates'].append([index, len(ids)])
+
+    def _get_column_candidates(self, book, columns):
+        """Get the items that may match the rules of the non-text fields, by
+        evaluating the rules as vectorized masks over the column snapshot.
+
+        Returns:
+            set: the item IDs
+        """
+        mask = None
+        for field, rule in self.query.rules.items():
+            if field in columns.DATE_FIELDS:
+                m = columns.get_date_mask(field, rule.get('include', []), rule.get('exclude', []))
+            elif field in columns.FLAG_FIELDS:
+                m = columns.get_flag_mask(field, rule.get('include'), rule.get('exclude'))
+            elif field == 'type':
+                m = columns.get_category_mask(field, functools.partial(self.query.match_text_or, rule))
+            elif field == 'charset':
+                m = columns.get_category_mask(field, functools.partial(self.query.match_text, rule))
+            else:
+                continue
+            mask = m if mask is None else mask & m
+
+        ids = columns.get_ids(mask)
+
+        # items changed since the snapshot is built may match
+        ids.update(book.meta.dirty)
+
+        return ids
+
+    def _get_exact_candidates(self, book, index, fields):
+        """Get the items that may match the rules of the fields, by looking
+        up the exact index rather than matching each item.
+
+        Returns:
+            set: the item IDs, or None if any item may match
+        """
+        query = self.query
+        rv = None
+        for field, rule in query.rules.items():
+            if field not in fields:
+                continue
+
+            if field == 'type':
+                ids = index.get_candidates(field, functools.partial(query.match_text_or, rule))
+            elif field == 'charset':
+                ids = index.get_candidates(field, functools.partial(query.match_text, rule))
+            elif field == 'site':
+                # match the hosts only, and exclude by a key of the host only
+                host_rule = {
+                    'include': [Site('', key.host, '') for key in rule.get('include', [])],
+                    'exclude': [key for key in rule.get('exclude', []) if not (key.scheme or key.path)],
+                }
+                ids = index.get_candidates('host', functools.partial(
+                    query.match_site_parts_or, host_rule, '', path=''))
+            else:
+                ids = None
+                for key in rule.get('include', []):
+                    term = query.plain_terms.get(key)
+                    d = None
+                    if term is not None:
+                        if field == 'id':
+                            d = index.get_id_candidates(term)
+                        else:
+                            d = index.get_ext_candidates(term)
+
+                    if field == 'id':
+                        # terms of an id rule are ORed
+                        if d is None:
+                            ids = None
+                            break
+                        ids = d if ids is None else ids | d
+                    elif d is not None:
+                        # terms of an index rule are ANDed
+                        ids = d if ids is None else ids & d
+
+            if ids is not None:
+                rv = ids if rv is None else rv & ids
+
+        if rv is not None:
+            # items changed since the index is built may match
+            rv.update(book.meta.dirty)
+
+        return rv
+
+    def _get_content_hints(self, book, fulltext):
+        terms = self.query.get_field_terms('content')
+        if not terms:
+            return None
+
+        index = FulltextIndex.load(book) if book.fulltext_index else None
+        if index is None:
+            if isinstance(fulltext, FulltextShards):
+                return self._get_content_hints_summary(fulltext.summary, terms)
+            return None
+
+        hints = {}
+        for key, term in terms.items():
+            if term is not None:
+                ids = index.get_candidates(term)
+            else:
+                ids = None
+                for literal in get_regex_literals(key) or ():
+                    d = index.get_candidates(literal)
+                    if d is not None:
+                        ids = d if ids is None else ids & d
+            if ids is not None:
+                hints[key] = ids
+        return hints
+
+    @staticmethod
+    def _get_content_hints_summary(summary, terms):
+        """Get the candidate items of the content terms from the Bloom
+        filters of the fulltext files, which rule out the items in a file
+        lacking any token of a term.
+        """
+        hints = {}
+        for key, term in terms.items():
+            if term is not None:
+                tokens = get_term_tokens(term)
+            else:
+                tokens = None
+                for literal in get_regex_literals(key) or ():
+                    t = get_term_tokens(literal)
+                    if t is not None:
+                        tokens = t if tokens is None else tokens | t
+            if tokens:
+                hints[key] = summary.get_candidates(tokens)
+        return hints
+
     @staticmethod
     def _search_book_sortkey(sort, item):
         value = getattr(item, sort.key)
@@ -652,12 +1790,59 @@ class SearchEngine:
             pass
         else:
             value = item.fulltext.get('content', '')
-            item.context['fulltext'] = self.query.get_snippet(value, 'content', ln)
+            hits = self.hits.pop((item.book_id, item.id, item.file), None)
+            item.context['fulltext'] = self.query.get_snippet(value, 'content', ln, hits=hits)
+
+
+_worker_args = None
+
+
+def _init_worker(root, config, tree_cache_size):
+    global _worker_args
+    tree_cache = TreeCache(tree_cache_size) if tree_cache_size else None
+    _worker_args = (root, config, tree_cache)
+
+
+def _search_book_worker(query_text, book_id, lock, limit, context=None):
+    # use a new Host for each search so that the tree files are revalidated
+    # and no loaded tree is kept other than in the size-limited TreeCache
+    host = Host(*_worker_args)
+    engine = SearchEngine(host, query_text, lock=lock, context=context)
+    book = host.books[book_id]
+    lh = book.get_tree_lock(persist=lock).acquire() if lock else nullcontext()
+    with lh:
+        return list(engine.search_book_sorted(book_id, limit))
+
+
+def create_executor(host, max_workers, tree_cache_size=None):
+    """Create a process pool to search the books of the host in parallel.
+
+    Each worker process searches with a new Host of the same root and config
+    for each search, which shares the loaded tree files across searches with
+    a TreeCache of tree_cache_size, so that the unchanged tree files are not
+    reloaded for each search.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(host.root, host.config, tree_cache_size),
+    )
 
 
-def search(host, query, *, lock=True, context=None):
+def search(host, query, *, lock=True, context=None, cache=None, jobs=None,
+           executor=None, offset=0, size=-1, explain=None):
     """Shorthand to perform a search at given path.
 
+    Args:
+        offset: the number of leading results to skip, for paging
+        size: the max number of results to yield, or -1 for no limit
+        jobs: the number of worker processes to search the books in
+            parallel, or None to search them in the current process
+        executor: an executor from create_executor() to search the books in
+            parallel, which takes precedence over jobs
+        explain: a dict to be filled with the report of SearchExplain when
+            the search ends, if the query has the "explain:" option
+
     Raises:
         QueryError: if the query cannot be parsed correctly
     """
@@ -668,5 +1853,44 @@ def search(host, query, *, lock=True, context=None):
     else:
         host = Host(*host)
 
-    engine = SearchEngine(host, query, lock=lock, context=context)
-    yield from engine.run()
+    if executor is not None or not jobs or jobs <= 1:
+        engine = SearchEngine(host, query, lock=lock, context=context, cache=cache,
+                              executor=executor)
+        yield from _run_search(engine, offset, size, explain)
+        return
+
+    with create_executor(host, jobs) as executor:
+        engine = SearchEngine(host, query, lock=lock, context=context, cache=cache,
+                              executor=executor)
+        yield from _run_search(engine, offset, size, explain)
+
+
+def _run_search(engine, offset, size, explain):
+    try:
+        yield from engine.run(offset, size)
+    finally:
+        if explain is not None and engine.explain is not None:
+            explain.update(engine.explain.get_report())
+
+
+def stats(host, book_id='', *, lock=True):
+    """Shorthand to get the aggregated counts of the items of a book at
+    given path.
+
+    Returns:
+        dict: see columns.get_stats()
+
+    Raises:
+        KeyError: if the book does not exist
+    """
+    if isinstance(host, Host):
+        pass
+    elif isinstance(host, str):
+        host = Host(host)
+    else:
+        host = Host(*host)
+
+    book = host.books[book_id]
+    lh = book.get_tree_lock(persist=lock).acquire() if lock else nullcontext()
+    with lh:
+        return get_stats(book)
@@ -1,12 +1,24 @@
 """Miscellaneous Scrapbook book handler.
 """
 from collections import defaultdict, deque
+from collections.abc import Mapping
 from contextlib import nullcontext
 
 from . import cache as wsb_cache
 from .host import Host
 
 
+def json_default(obj):
+    """Serialize a mapping that is not a dict for json.dumps().
+
+    An item of a CompactMetaData is a mapping, which may be returned by a
+    query or taken by other handlers as the metadata of an item.
+    """
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f'Object of type {obj.__class__.__name__} is not JSON serializable')
+
+
 class HostQuery:
     """A utility to perform a series of query on a scrapbook host."""
     def __init__(self, host, query, auto_cache=None, *, lock=True):
@@ -91,19 +103,19 @@ class HostQuery:
                 book.load_toc_files()
 
             if 'meta' in self.changes[book_id]:
-                book_meta_orig = book.checksum(book.meta)
+                book_meta_orig = book.get_tree_state(book.meta)
 
             if 'toc' in self.changes[book_id]:
-                book_toc_orig = book.checksum(book.toc)
+                book_toc_orig = book.get_tree_state(book.toc)
 
             self._with_next_book(book_ids)
 
             if 'meta' in self.changes[book_id]:
-                if book.checksum(book.meta) != book_meta_orig:
+                if book.get_tree_state(book.meta) != book_meta_orig:
                     book.save_meta_files()
 
             if 'toc' in self.changes[book_id]:
-                if book.checksum(book.toc) != book_toc_orig:
+                if book.get_tree_state(book.toc) != book_toc_orig:
                     book.save_toc_files()
 
     def _run_tasks(self):
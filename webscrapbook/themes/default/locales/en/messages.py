@@ -122,6 +122,7 @@ cache_search_help_desc = """\
   • comment: items whose comment contains the keyword.
   • index: items whose index file path contains the keyword.
   • source: items whose source URL contains the keyword.
+  • site: items whose source URL is on the host or a subdomain of it, optionally with the scheme and a prefix of the path. Multiple values are “or”-connected. For example, “site:example.com” means items whose source URL is on example.com, www.example.com, etc.; “site:https://example.com/docs/” means items whose source URL starts with “https://” and whose path starts with “/docs/” on such hosts.
   • icon: items whose icon URL contains the keyword.
   • charset: items whose charset contains the keyword.
   • create: items whose create time matches the condition. Multiple values are “or”-connected. The time condition is an interval with 0-17 digits, followed by a minus sign optionally, and then followed by 0-17 digits. The two 17-digit numbers means the year (4 digits), month (01-12), day (01-31), hours (00-59), minutes (00-59), seconds (00-59), and milliseconds (000-999) in local datetime. Each omitted digit is assumed to be a “0”, except that “999...” is assumed if the end datetime is totally omitted. For example, “create:2014-2015” means since 2014 until 2015; “create:-201309” means before Sep 2013; and “create:20110825” means after Aug 25, 2011.
@@ -133,7 +134,8 @@ cache_search_help_desc = """\
   • root: items under the item of ID. Multiple values are “or”-connected.
   • book: items in the specific scrapbook (by ID). Multiple values are “or”-connected.
   • sort: sort search results using the specific condition, which can be id, title, comment, file, content, source, type, create, or modify. For example, “sort:id -sort:modify” means sorting by ID in acending order and then sorting by modify time in descending order.
-  • limit: set a limit on the search result number. For example, “limit:10” means showing the first 10 results. “-limit:” means unsetting the limit."""
+  • limit: set a limit on the search result number. For example, “limit:10” means showing the first 10 results. “-limit:” means unsetting the limit.
+  • explain: report where the search spends its time, such as the time of each phase and the items checked and text scanned for each condition, alongside the results from the server."""
 cache_search_result = 'Found %length% results:'
 cache_search_result_named = '(%name%) Found %length% results:'
 cache_search_sort_last_created = 'Last Created'
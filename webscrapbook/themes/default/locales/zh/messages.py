@@ -122,6 +122,7 @@ cache_search_help_desc = """\
   • comment：搜尋評註含有關鍵詞的項目。
   • index：搜尋索引檔含有關鍵詞的項目。
   • source：搜尋原始網址含有關鍵詞的項目。
+  • site：搜尋原始網址位於指定主機或其子網域的項目，可選擇加上協定及路徑前綴。多次指定時以「或」連接。例如「site:example.com」表示搜尋原始網址位於 example.com、www.example.com 等主機的項目；「site:https://example.com/docs/」表示搜尋原始網址以「https://」開頭，且位於上述主機、路徑以「/docs/」開頭的項目。
   • icon：搜尋圖示網址含有關鍵詞的項目。
   • charset：搜尋字集含有關鍵詞的項目。
   • create：搜尋建立時間符合條件的項目。多次指定時以「或」連接。時間格式為 0-17 位數字，後面接負號（可略），再接 0-17 位數字，表示時間範圍的起始與結束。兩個 17 位數字表示本地時間的年（4 位數）、月（01-12）、日（01-31）、時（00-59）、分（00-59）、秒（00-59）、毫秒（000-999），省略的部分視為 0，唯結束時間全省略時視為「999...」。例如「create:2014-2015」表示 2014 年到 2015 年，「create:-201309」表示 2013 年九月以前，「create:20110825」表示 2011 年八月 25 日以後。
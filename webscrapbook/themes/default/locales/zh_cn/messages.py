@@ -122,6 +122,7 @@ cache_search_help_desc = """\
   • comment：搜索评注含有关键词的项目。
   • index：搜索索引文件含有关键词的项目。
   • source：搜索原始网址含有关键词的项目。
+  • site：搜索原始网址位于指定主机或其子域名的项目，可选择加上协议及路径前缀。多次指定时以“或”连接。例如“site:example.com”表示搜索原始网址位于 example.com、www.example.com 等主机的项目；“site:https://example.com/docs/”表示搜索原始网址以“https://”开头，且位于上述主机、路径以“/docs/”开头的项目。
   • icon：搜索图示网址含有关键词的项目。
   • charset：搜索字元集含有关键词的项目。
   • create：搜索建立时间匹配条件的项目。多次指定时以“或”连接。时间格式为 0-17 位数字，后面接负号（可略），再接 0-17 位数字，表示时间范围的起始与结束。两个 17 位数字表示本地时间的年（4 位数）、月（01-12）、日（01-31）、时（00-59）、分（00-59）、秒（00-59）、毫秒（000-999），省略的部分视为补 0，唯结束时间全省略时视为“999...”。例如“create:2014-2015”表示 2014 年到 2015 年，“create:-201309”表示 2013 年九月以前，“create:20110825”表示 2011 年八月 25 日以后。